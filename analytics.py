@@ -0,0 +1,301 @@
+import io, os, csv, sys, json, time, fcntl, atexit, threading
+from pathlib import Path
+
+from csv_export import snapshot, _Bounded
+from record_archive import SUFFIX, ArchiveReader, history
+
+SNAPSHOT_SECONDS = float(os.environ.get("ANALYTICS_SNAPSHOT_SECONDS", "30"))
+UNSPECIFIED = "(unspecified)"
+FOLD_COLUMNS = ("timestamp", "score", "category", "employment", "debt_to_income_ratio_pct", "credit_utilization_ratio_pct")
+
+def _float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+# ---------- Running aggregates over saved assessments ----------
+class Aggregates:
+    def __init__(self):
+        self.rows = 0
+        self.score_sum = 0
+        self.scores = {}       # score -> count
+        self.categories = {}   # category -> count
+        self.days = {}         # "YYYY-MM-DD" -> [count, score sum, {category: count}]
+        self.employment = {}   # employment -> [count, dti n, dti sum, util n, util sum, score sum]
+
+    def add(self, day, score, category, employment, dti, util):
+        self.rows += 1
+        self.score_sum += score
+        self.scores[score] = self.scores.get(score, 0) + 1
+        self.categories[category] = self.categories.get(category, 0) + 1
+        d = self.days.get(day)
+        if d is None: d = self.days[day] = [0, 0, {}]
+        d[0] += 1; d[1] += score
+        d[2][category] = d[2].get(category, 0) + 1
+        e = self.employment.get(employment)
+        if e is None: e = self.employment[employment] = [0, 0, 0.0, 0, 0.0, 0]
+        e[0] += 1; e[5] += score
+        if dti is not None: e[1] += 1; e[2] += dti
+        if util is not None: e[3] += 1; e[4] += util
+
+    def to_json(self):
+        return {"rows": self.rows, "score_sum": self.score_sum, "scores": [[s, n] for s, n in self.scores.items()],
+                "categories": self.categories, "days": self.days, "employment": self.employment}
+
+    @classmethod
+    def from_json(cls, d):
+        agg = cls()
+        agg.rows, agg.score_sum = d["rows"], d["score_sum"]
+        agg.scores = {int(s): n for s, n in d["scores"]}
+        agg.categories, agg.days, agg.employment = d["categories"], d["days"], d["employment"]
+        return agg
+
+    def summary(self, bin_width=10, since=None, until=None):
+        # Cost depends on the number of distinct scores/days/employment types, not on the row count.
+        # since/until (saved timestamps, see csv_export.timestamp_bound) select the days overlapping
+        # [since, until); only the day list is kept per day, the other aggregates cover every record.
+        bin_width = max(1, int(bin_width))
+        bins = {}
+        for s, n in self.scores.items():
+            lo = s - s % bin_width
+            bins[lo] = bins.get(lo, 0) + n
+        days = []
+        for day in sorted(self.days):
+            if since is not None and day < since[:10]: continue
+            if until is not None and day + "T00:00:00" >= until: continue
+            n, total, cats = self.days[day]
+            days.append({"day": day, "count": n, "mean_score": round(total / n, 2), "categories": cats})
+        return {
+            "records": self.rows,
+            "mean_score": round(self.score_sum / self.rows, 2) if self.rows else None,
+            "categories": dict(self.categories),
+            "score_histogram": {"bin_width": bin_width,
+                                "bins": [{"from": lo, "to": lo + bin_width - 1, "count": bins[lo]} for lo in sorted(bins)]},
+            "employment": {emp: {"count": n,
+                                 "mean_dti": round(dti / dti_n, 2) if dti_n else None,
+                                 "mean_utilization": round(util / util_n, 2) if util_n else None,
+                                 "mean_score": round(score / n, 2)}
+                           for emp, (n, dti_n, dti, util_n, util, score) in sorted(self.employment.items())},
+            "days": days,
+        }
+
+# ---------- Tail of the append-only records file, folded into Aggregates ----------
+class Analytics:
+    """Aggregates over records.csv plus its closed segments (rotated CSV or compacted archives).
+
+    Every worker tails the file from its last offset, so rows saved by any worker are counted
+    exactly once and nothing is ever rescanned. Progress is checkpointed to `state_path`, so a
+    restart resumes from the checkpoint; without a usable one, a single streaming pass rebuilds.
+    """
+    def __init__(self, csv_path, state_path, snapshot_seconds=SNAPSHOT_SECONDS):
+        self.path = Path(csv_path)
+        self.state_path = Path(state_path)
+        self.snapshot_seconds = snapshot_seconds
+        self.agg = Aggregates()
+        self.rebuilt_at = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._f = None
+        self._ino = None
+        self._offset = 0
+        self._cols = None
+        self._file_rows = 0  # rows of the current records file (not counting rotated segments)
+        self._saved = (None, None)
+        self._saved_at = 0.0
+
+    def start(self):
+        # Load (or rebuild) in the background so worker start-up is not delayed.
+        threading.Thread(target=self.refresh, name="analytics-load", daemon=True).start()
+
+    def on_rows(self, rows):
+        # record-store listener: the batch is on disk, pick it up (and any other worker's rows)
+        self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            try:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+                self._tail()
+                self._maybe_save()
+            except (OSError, ValueError) as e:
+                print("[analytics] refresh failed: %s" % e, file=sys.stderr)
+
+    def summary(self, **kw):
+        self.refresh()
+        with self._lock:
+            out = self.agg.summary(**kw)
+            out["as_of"] = {"offset": self._offset, "rebuilt_at": self.rebuilt_at}
+            return out
+
+    def stats(self):
+        # what has been folded in so far; no I/O
+        return {"rows": self.agg.rows, "file_rows": self._file_rows, "file_offset": self._offset,
+                "loaded": self._loaded, "rebuilt_at": self.rebuilt_at}
+
+    # -- state --
+    def _load(self):
+        lock_fd = _lock_file(self.state_path)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)  # one worker rebuilds, the rest reuse its checkpoint
+            state = self._read_state()
+            if state is not None and self._resume(state): return
+            self._rebuild()
+            self._save()
+        finally:
+            os.close(lock_fd)
+
+    def _read_state(self):
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print("[analytics] ignoring unreadable %s: %s" % (self.state_path, e), file=sys.stderr)
+            return None
+
+    def _resume(self, state):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if state["ino"] is not None: return False
+            self.agg = Aggregates.from_json(state["aggregates"])
+            self.rebuilt_at = state.get("rebuilt_at")
+            return True
+        st = os.fstat(f.fileno())
+        if st.st_ino != state["ino"] or st.st_size < state["offset"]:
+            f.close()
+            return False
+        self.agg = Aggregates.from_json(state["aggregates"])
+        self.rebuilt_at = state.get("rebuilt_at")
+        self._f, self._ino, self._offset = f, st.st_ino, state["offset"]
+        self._file_rows = state.get("file_rows", 0)
+        self._cols = _columns(state["header"]) if state.get("header") else None
+        self._saved = (self._ino, self._offset)
+        return True
+
+    def _rebuild(self):
+        t0 = time.monotonic()
+        self.agg = Aggregates()
+        self._f, self._ino, self._offset, self._cols, self._file_rows = None, None, 0, None, 0
+        # closed segments (rotated CSV or compacted archives), oldest first; the archive when a segment has both
+        for seg in history(self.path):
+            if seg.suffix == ".csv":
+                try:
+                    f = open(seg, "rb")
+                except FileNotFoundError:
+                    seg = seg.with_suffix(SUFFIX)  # compacted since it was listed
+                else:
+                    with f:
+                        self._consume(f, 0, os.fstat(f.fileno()).st_size, None)
+                    continue
+            with ArchiveReader(seg) as r:
+                # decode only the columns aggregated here
+                names = [c for c in FOLD_COLUMNS if c in r.columns]
+                self._fold(_columns(names), r.iter_rows(names))
+        self._tail()
+        self.rebuilt_at = time.time()
+        print("[analytics] rebuilt from %s: %d rows in %.2fs" % (self.path.parent, self.agg.rows, time.monotonic() - t0),
+              file=sys.stderr)
+
+    def _save(self):
+        state = {"ino": self._ino, "offset": self._offset, "file_rows": self._file_rows, "rebuilt_at": self.rebuilt_at,
+                 "header": self._cols[0] if self._cols else None, "aggregates": self.agg.to_json()}
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".%d.tmp" % os.getpid())
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+        self._saved = (self._ino, self._offset)
+        self._saved_at = time.monotonic()
+
+    def _maybe_save(self, force=False):
+        if self._saved == (self._ino, self._offset): return
+        if force or time.monotonic() - self._saved_at >= self.snapshot_seconds: self._save()
+
+    def close(self):
+        with self._lock:
+            if self._loaded:
+                try:
+                    self._maybe_save(force=True)
+                except OSError as e:
+                    print("[analytics] checkpoint failed: %s" % e, file=sys.stderr)
+
+    # -- tailing --
+    def _tail(self):
+        try:
+            ino, size = snapshot(self.path)
+        except FileNotFoundError:
+            return
+        if self._f is not None and ino != self._ino:
+            # rotated: nothing is appended to the old inode any more, finish it through our handle
+            self._offset = self._consume(self._f, self._offset, os.fstat(self._f.fileno()).st_size, self._cols)
+            self._f.close()
+            self._f = None
+        if self._f is None:
+            f = open(self.path, "rb")
+            if os.fstat(f.fileno()).st_ino != ino:
+                f.close()
+                return  # rotated again meanwhile; next refresh
+            self._f, self._ino, self._offset, self._cols, self._file_rows = f, ino, 0, None, 0
+        self._offset = self._consume(self._f, self._offset, size, self._cols)
+
+    def _consume(self, f, start, stop, cols):
+        # Fold rows in bytes [start, stop) of f; returns the new offset. stop is a batch boundary.
+        if stop <= start: return start
+        raw = open(os.dup(f.fileno()), "rb")
+        raw.seek(start)
+        with io.TextIOWrapper(io.BufferedReader(_Bounded(raw, stop - start)), encoding="utf-8", newline="") as text:
+            reader = csv.reader(text)
+            if cols is None:
+                header = next(reader, None)
+                if header is None: return stop
+                cols = _columns(header)
+                if f is self._f: self._cols = cols
+            before = self.agg.rows
+            self._fold(cols, reader)
+        if f is self._f: self._file_rows += self.agg.rows - before
+        return stop
+
+    def _fold(self, cols, rows):
+        header, ts_i, score_i, cat_i, emp_i, dti_i, util_i = cols
+        add = self.agg.add
+        for row in rows:
+            if len(row) < len(header): continue
+            try:
+                score = int(float(row[score_i]))
+            except (TypeError, ValueError):
+                continue
+            add(row[ts_i][:10] if ts_i is not None else "",
+                score,
+                row[cat_i] if cat_i is not None else "",
+                (row[emp_i].strip() if emp_i is not None else "") or UNSPECIFIED,
+                _float(row[dti_i]) if dti_i is not None else None,
+                _float(row[util_i]) if util_i is not None else None)
+
+def _columns(header):
+    pos = {name: i for i, name in enumerate(header)}
+    if "score" not in pos: raise ValueError("records file has no score column")
+    return (header, pos.get("timestamp"), pos["score"], pos.get("category"), pos.get("employment"),
+            pos.get("debt_to_income_ratio_pct"), pos.get("credit_utilization_ratio_pct"))
+
+def _lock_file(path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return os.open(path.with_name(path.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_analytics(csv_path, state_path):
+    key = str(Path(csv_path).resolve())
+    with _instances_lock:
+        a = _instances.get(key)
+        if a is None:
+            a = _instances[key] = Analytics(csv_path, state_path)
+        return a
+
+@atexit.register
+def close_all():
+    for a in list(_instances.values()): a.close()
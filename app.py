@@ -1,19 +1,39 @@
 
-import os, csv, sys, io, datetime
+import os, re, csv, sys, json, time, codecs, datetime, tempfile, threading
+from concurrent.futures import Future, wait
 from pathlib import Path
-from flask import Flask, render_template, request, send_file, Response, jsonify
-from jinja2 import TemplateNotFound
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.lib.utils import simpleSplit, ImageReader
-from reportlab.lib import colors
+from flask import Flask, render_template, request, send_file, redirect, Response, jsonify, stream_with_context, g
+from jinja2 import TemplateNotFound, ChoiceLoader, FileSystemLoader, DictLoader, FileSystemBytecodeCache
+
+from scoring import get_model, registry as model_registry
+from score_cache import ScoreCache
+from pdf_report import render_pdf, reset_template, template_ready, report_cache
+from record_store import CSV_HEADER, get_store
+from record_index import RecordIndex
+from analytics import get_analytics
+from recent_saves import get_recent_saves, save_keys, IdempotencyConflict, SavePending
+from applicant import parse as parse_applicant
+import report_batch
+from report_jobs import JobQueue, QueueFull
+from csv_export import snapshot, snapshot_etag, timestamp_bound, read_header, iter_bytes, encode_rows, gzip_chunks
+from record_archive import history, iter_history
+import metrics
+import profiler
+import diagnostics
 
 ROOT_DIR = Path(__file__).resolve().parent
 TEMPLATES_DIR = ROOT_DIR / "templates"
 STATIC_DIR = ROOT_DIR / "static"
-DATA_DIR = ROOT_DIR / "data"
+DATA_DIR = Path(os.environ.get("DATA_DIR", ROOT_DIR / "data"))
 CSV_PATH = DATA_DIR / "records.csv"
+RECORDS_DB = Path(os.environ.get("RECORDS_DB", DATA_DIR / "records.db"))
+RECORD_INDEX = os.environ.get("RECORD_INDEX", "1") not in {"0", "false", "no"}
+ANALYTICS_STATE = Path(os.environ.get("ANALYTICS_STATE", DATA_DIR / "analytics.json"))
+SAVE_DEDUP_INDEX = Path(os.environ.get("SAVE_DEDUP_INDEX", DATA_DIR / "recent_saves.idx"))
+SAVE_TIMEOUT = float(os.environ.get("SAVE_TIMEOUT", "10"))
+# A waiting poll holds a request thread, so ?wait= stays short; clients poll again after Retry-After.
+REPORT_MAX_WAIT = min(2.0, float(os.environ.get("REPORT_MAX_WAIT", "2")))
+THREADS = max(1, int(os.environ.get("THREADS", "2")))  # gunicorn --threads, see Procfile
 
 # ---------- Failsafe templates (pretty HTML + auto-calc) ----------
 FALLBACK_FORM = """<!doctype html>
@@ -36,6 +56,8 @@ FALLBACK_FORM = """<!doctype html>
     .logo img { max-height: 60px; }
     .hint { color:#555; font-size:12px }
     .subgrid { display:grid; grid-template-columns: repeat(3,1fr); gap: 8px 12px; background:#fafbff; padding:12px; border:1px dashed #cbd2e6; border-radius:8px; }
+    .errors { background:#f8d7da; padding:12px 16px; border-radius:8px; margin-bottom:16px; }
+    .invalid { border-color:#d9534f; background:#fdf2f2; }
   </style>
 </head>
 <body>
@@ -44,38 +66,45 @@ FALLBACK_FORM = """<!doctype html>
       <img src="{{ url_for('static', filename='logo.png') }}" alt="Logo" onerror="this.style.display='none'">
     </div>
     <h1>Credit Scoring - Data Entry</h1>
+    {# after a 400, form holds the submitted values and errors the rejected fields #}
+    {% set form = form or {} %}
+    {% set errors = errors or {} %}
+    {% macro bad(name) %}{% if name in errors %} class="invalid" aria-invalid="true"{% endif %}{% endmacro %}
+    {% if errors %}
+    <div class="errors">
+      <strong>Please correct these fields:</strong>
+      <ul>{% for name, msg in errors.items() %}<li>{{ name }}: {{ msg }}</li>{% endfor %}</ul>
+    </div>
+    {% endif %}
     <form method="POST" id="credit-form">
       <h3>Identity</h3>
       <div class="grid">
-        <div><label>Full Name</label><input name="full_name" required></div>
-        <div><label>Date of Birth</label><input type="date" name="dob" required></div>
-        <div><label>National ID</label><input name="national_id" required></div>
-        <div><label>Phone Number</label><input name="phone_number" required></div>
-        <div style="grid-column:1 / -1"><label>Current Address</label><input name="current_address" required></div>
+        <div><label>Full Name</label><input name="full_name" required value="{{ form.get('full_name', '') }}"{{ bad('full_name') }}></div>
+        <div><label>Date of Birth</label><input type="date" name="dob" required value="{{ form.get('dob', '') }}"{{ bad('dob') }}></div>
+        <div><label>National ID</label><input name="national_id" required value="{{ form.get('national_id', '') }}"{{ bad('national_id') }}></div>
+        <div><label>Phone Number</label><input name="phone_number" required value="{{ form.get('phone_number', '') }}"{{ bad('phone_number') }}></div>
+        <div style="grid-column:1 / -1"><label>Current Address</label><input name="current_address" required value="{{ form.get('current_address', '') }}"{{ bad('current_address') }}></div>
       </div>
 
       <h3>Employment and Income</h3>
       <div class="grid">
         <div>
           <label>Employment</label>
-          <select name="employment">
+          <select name="employment"{{ bad('employment') }}>
             <option value="">-- select --</option>
-            <option>Full-time</option>
-            <option>Part-time</option>
-            <option>Self-employed</option>
-            <option>Contract</option>
-            <option>Informal</option>
-            <option>Unemployed</option>
+            {% for o in ["Full-time", "Part-time", "Self-employed", "Contract", "Informal", "Unemployed"] %}
+            <option{% if form.get('employment') == o %} selected{% endif %}>{{ o }}</option>
+            {% endfor %}
           </select>
         </div>
-        <div><label>Employer</label><input name="employer"></div>
+        <div><label>Employer</label><input name="employer" value="{{ form.get('employer', '') }}"{{ bad('employer') }}></div>
         <div>
           <label>Income Level</label>
-          <select name="income_level">
+          <select name="income_level"{{ bad('income_level') }}>
             <option value="">-- select --</option>
-            <option>Low</option>
-            <option>Medium</option>
-            <option>High</option>
+            {% for o in ["Low", "Medium", "High"] %}
+            <option{% if form.get('income_level') == o %} selected{% endif %}>{{ o }}</option>
+            {% endfor %}
           </select>
         </div>
       </div>
@@ -83,35 +112,35 @@ FALLBACK_FORM = """<!doctype html>
       <h3>Auto-calculated Metrics (for new customers)</h3>
       <p class="hint">Enter raw figures; the three percentages will be calculated automatically.</p>
       <div class="subgrid">
-        <div><label>Total Revolving Credit Limit</label><input name="total_credit_limit" type="number" step="0.01" min="0" placeholder="e.g., 1000"></div>
-        <div><label>Total Revolving Balances</label><input name="total_credit_balance" type="number" step="0.01" min="0" placeholder="e.g., 720"></div>
+        <div><label>Total Revolving Credit Limit</label><input name="total_credit_limit" type="number" step="0.01" min="0" placeholder="e.g., 1000" value="{{ form.get('total_credit_limit', '') }}"{{ bad('total_credit_limit') }}></div>
+        <div><label>Total Revolving Balances</label><input name="total_credit_balance" type="number" step="0.01" min="0" placeholder="e.g., 720" value="{{ form.get('total_credit_balance', '') }}"{{ bad('total_credit_balance') }}></div>
         <div><label>Credit Utilization Ratio (%)</label><input name="credit_utilization_ratio" type="number" step="0.1" min="0" max="100" readonly></div>
 
-        <div><label>On-time Payments (count)</label><input name="on_time_payments" type="number" min="0" placeholder="e.g., 58"></div>
-        <div><label>Total Payments (count)</label><input name="total_payments" type="number" min="0" placeholder="e.g., 100"></div>
+        <div><label>On-time Payments (count)</label><input name="on_time_payments" type="number" min="0" placeholder="e.g., 58" value="{{ form.get('on_time_payments', '') }}"{{ bad('on_time_payments') }}></div>
+        <div><label>Total Payments (count)</label><input name="total_payments" type="number" min="0" placeholder="e.g., 100" value="{{ form.get('total_payments', '') }}"{{ bad('total_payments') }}></div>
         <div><label>Payment History Score (%)</label><input name="payment_history_score" type="number" step="0.1" min="0" max="100" readonly></div>
 
-        <div><label>Monthly Debt Payments</label><input name="monthly_debt_payments" type="number" step="0.01" min="0" placeholder="e.g., 650"></div>
-        <div><label>Gross Monthly Income</label><input name="gross_monthly_income" type="number" step="0.01" min="0" placeholder="e.g., 1000"></div>
+        <div><label>Monthly Debt Payments</label><input name="monthly_debt_payments" type="number" step="0.01" min="0" placeholder="e.g., 650" value="{{ form.get('monthly_debt_payments', '') }}"{{ bad('monthly_debt_payments') }}></div>
+        <div><label>Gross Monthly Income</label><input name="gross_monthly_income" type="number" step="0.01" min="0" placeholder="e.g., 1000" value="{{ form.get('gross_monthly_income', '') }}"{{ bad('gross_monthly_income') }}></div>
         <div><label>Debt-to-Income Ratio (%)</label><input name="debt_to_income_ratio" type="number" step="0.1" min="0" max="100" readonly></div>
       </div>
 
       <h3>Credit File Details</h3>
       <div class="grid">
-        <div><label>Open Credit Lines</label><input name="open_credit_lines" type="number" min="0" required></div>
-        <div><label>Past Due Accounts</label><input name="past_due_accounts" type="number" min="0" required></div>
-        <div><label>Length of Credit History (years)</label><input name="length_credit_history" type="number" min="0" required></div>
-        <div><label>Recent Credit Inquiries (12m)</label><input name="recent_inquiries" type="number" min="0" placeholder="e.g., 3" required></div>
-        <div><label>Collateral Provided</label><input name="collateral_provided" placeholder="None"></div>
+        <div><label>Open Credit Lines</label><input name="open_credit_lines" type="number" min="0" required value="{{ form.get('open_credit_lines', '') }}"{{ bad('open_credit_lines') }}></div>
+        <div><label>Past Due Accounts</label><input name="past_due_accounts" type="number" min="0" required value="{{ form.get('past_due_accounts', '') }}"{{ bad('past_due_accounts') }}></div>
+        <div><label>Length of Credit History (years)</label><input name="length_credit_history" type="number" min="0" required value="{{ form.get('length_credit_history', '') }}"{{ bad('length_credit_history') }}></div>
+        <div><label>Recent Credit Inquiries (12m)</label><input name="recent_inquiries" type="number" min="0" placeholder="e.g., 3" required value="{{ form.get('recent_inquiries', '') }}"{{ bad('recent_inquiries') }}></div>
+        <div><label>Collateral Provided</label><input name="collateral_provided" placeholder="None" value="{{ form.get('collateral_provided', '') }}"{{ bad('collateral_provided') }}></div>
         <div style="grid-column:1 / -1">
-          <label>Account Types</label><input name="account_types" placeholder="e.g., Mobile Money Loan, Local Store Credit">
+          <label>Account Types</label><input name="account_types" placeholder="e.g., Mobile Money Loan, Local Store Credit" value="{{ form.get('account_types', '') }}"{{ bad('account_types') }}>
         </div>
         <div>
           <label>Macroeconomic Risk Adjustment</label>
-          <select name="macroeconomic_risk">
-            <option>Low</option>
-            <option>Medium</option>
-            <option selected>High</option>
+          <select name="macroeconomic_risk"{{ bad('macroeconomic_risk') }}>
+            {% for o in ["Low", "Medium", "High"] %}
+            <option{% if form.get('macroeconomic_risk', 'High') == o %} selected{% endif %}>{{ o }}</option>
+            {% endfor %}
           </select>
         </div>
       </div>
@@ -154,6 +183,7 @@ FALLBACK_FORM = """<!doctype html>
         el.addEventListener('input', compute);
         el.addEventListener('change', compute);
       });
+    compute();
   </script>
 </body>
 </html>"""
@@ -230,6 +260,79 @@ def ensure_templates():
 
 app = Flask(__name__, template_folder=str(TEMPLATES_DIR))
 
+# ---------- Startup bootstrap (once per worker process) ----------
+JINJA_CACHE_DIR = Path(os.environ.get("JINJA_CACHE_DIR", Path(tempfile.gettempdir()) / "credit-jinja-cache"))
+
+def _bytecode_cache():
+    # Compiled template bytecode shared by all workers on the host.
+    try:
+        JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        return FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+    except OSError as e:
+        print("[bootstrap] bytecode cache disabled: %s" % e, file=sys.stderr)
+        return None
+
+def bootstrap():
+    # Templates on disk win; the built-in fallbacks are served from memory if they are missing,
+    # so rendering never needs a filesystem check on the request path.
+    ensure_templates()
+    app.jinja_loader = ChoiceLoader([
+        FileSystemLoader(str(TEMPLATES_DIR)),
+        DictLoader({"form.html": FALLBACK_FORM, "result.html": FALLBACK_RESULT}),
+    ])
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": _bytecode_cache()}
+    with app.app_context():
+        for name in ("form.html", "result.html"):
+            app.jinja_env.get_template(name)
+
+bootstrap()
+
+record_index = RecordIndex(RECORDS_DB, CSV_HEADER)
+report_queue = JobQueue()
+score_cache = ScoreCache()
+model_registry.listeners.append(score_cache.clear)
+if RECORD_INDEX:
+    get_store(CSV_PATH, CSV_HEADER).listeners.append(record_index.insert_rows)
+analytics = get_analytics(CSV_PATH, ANALYTICS_STATE)
+get_store(CSV_PATH, CSV_HEADER).listeners.append(analytics.on_rows)
+analytics.start()
+
+# ---------- Metrics (summed across workers on /metrics) ----------
+ACTIONS = ("preview", "download_pdf", "save_csv")
+STAGE = {s: metrics.histogram("credit_stage_seconds", "Time per stage of a form submission", stage=s)
+         for s in ("parse", "score", "pdf", "csv", "render")}
+ACTION_COUNT = {a: metrics.counter("credit_actions_total", "Form submissions by action", action=a) for a in ACTIONS}
+INFLIGHT = metrics.gauge("credit_worker_inflight_requests", "Requests currently handled by this worker")
+metrics.gauge("credit_worker_threads", "Request threads per worker", fn=lambda: THREADS)
+metrics.gauge("credit_worker_saturation", "In-flight requests per request thread", fn=lambda: INFLIGHT.value / THREADS)
+metrics.gauge("credit_store_pending_rows", "Saved rows waiting for the CSV writer",
+              fn=lambda: get_store(CSV_PATH, CSV_HEADER).pending())
+metrics.gauge("credit_report_jobs_queued", "PDF jobs waiting in this worker", fn=lambda: report_queue.stats()["queued"])
+metrics.gauge("credit_report_jobs_running", "PDF jobs rendering in this worker", fn=lambda: report_queue.stats()["running"])
+
+def _count_category(category):
+    metrics.counter("credit_scores_total", "Scored applications by category", category=category).inc()
+
+@app.before_request
+def _metrics_start():
+    metrics.registry.start()
+    INFLIGHT.inc()
+    g.t0 = time.perf_counter()
+
+@app.after_request
+def _metrics_status(resp):
+    metrics.counter("credit_requests_total", "Responses by endpoint and status",
+                    endpoint=request.endpoint or "unmatched", status=resp.status_code).inc()
+    return resp
+
+@app.teardown_request
+def _metrics_end(exc):
+    t0 = g.pop("t0", None)
+    if t0 is None: return
+    INFLIGHT.dec()
+    metrics.histogram("credit_request_seconds", "Request handling time by endpoint (until the response is returned)",
+                      endpoint=request.endpoint or "unmatched").observe(time.perf_counter() - t0)
+
 def _pct(num, den):
     try:
         num = float(num); den = float(den)
@@ -238,191 +341,66 @@ def _pct(num, den):
     except Exception:
         return 0.0
 
-def calculate_credit_score(data):
-    score = 300
-    score += (data["payment_history_score"]/100.0)*185
-    util_good = max(0.0, 100.0 - data["credit_utilization_ratio"])
-    score += (util_good/100.0)*165
-    years = data["length_credit_history_years"]
-    if years >= 10: score += 80
-    elif years >= 5: score += 55
-    elif years >= 2: score += 35
-    else: score += 15
-    inquiries = max(0, data["recent_inquiries_12m"])
-    score += max(0, 60 - min(60, inquiries*12))
-    dti_good = max(0.0, 100.0 - data["debt_to_income_ratio"])
-    score += (dti_good/100.0)*55
-    past_due = max(0, data["past_due_accounts"])
-    score -= min(80, past_due*20)
-    lines = max(0, data["open_credit_lines"])
-    if lines == 0: score -= 20
-    elif 1 <= lines <= 8: score += 20
-    elif lines > 12: score -= 10
-    collat = (data["collateral_provided"] or "").strip().lower()
-    if collat and collat not in {"none","n/a","na"}: score += 15
-    employment = (data["employment"] or "").strip().lower()
-    income = (data["income_level"] or "").strip().lower()
-    if employment in {"self-employed","contract","informal"}: score -= 10
-    if any(k in income for k in ["high","upper",">$","above"]): score += 10
-    elif any(k in income for k in ["low","minimum","<$"]): score -= 10
-    risk = (data["macroeconomic_risk"] or "").strip().lower()
-    if "high" in risk: score -= 25
-    elif "medium" in risk: score -= 10
-    score = int(max(300, min(850, round(score))))
-    if score < 580: category = "Poor"
-    elif score < 670: category = "Fair"
-    elif score < 740: category = "Good"
-    else: category = "Excellent"
-    return score, category
-
-def _wrap(c, text, x, y, width, leading=14, font="Helvetica", size=11):
-    c.setFont(font, size)
-    lines = simpleSplit(text, font, size, width)
-    for line in lines:
-        c.drawString(x, y, line)
-        y -= leading
-    return y
-
-def _kv_pair(c, label, value, x, y, w_label, w_value, leading=13):
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(x, y, f"{label}:")
-    c.setFont("Helvetica", 11)
-    return _wrap(c, str(value), x + w_label, y, w_value, leading=leading, font="Helvetica", size=11)
-
-def generate_pdf(form_data, score, category):
-    buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-    margin = 18*mm
-    x_left = margin
-    x_right = w - margin
-    y = h - margin
-
-    # Logo (optional)
-    logo_path = STATIC_DIR / "logo.png"
-    if logo_path.exists():
-        try:
-            img = ImageReader(str(logo_path))
-            box_w = 50*mm; box_h = 18*mm
-            iw, ih = img.getSize()
-            ratio = min(box_w/iw, box_h/ih)
-            lw = iw * ratio; lh = ih * ratio
-            c.drawImage(img, (w - lw)/2, y - lh, lw, lh, preserveAspectRatio=True, mask='auto')
-            y -= lh + 6*mm
-        except Exception:
-            y -= 2*mm
-
-    # Title
-    c.setFont("Helvetica-Bold", 16)
-    c.drawCentredString(w/2, y, "Credit Scoring Report")
-    y -= 10*mm
-
-    # Score banner
-    c.setFillColor(colors.HexColor("#2f6fed"))
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(x_left, y, f"Score: {score}  ({category})    Range: 300–850")
-    c.setFillColor(colors.black)
-    y -= 7*mm
-
-    # Sections
-    def section(title):
-        nonlocal y
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(x_left, y, title)
-        y -= 1*mm
-        c.setStrokeColor(colors.HexColor("#cbd2e6"))
-        c.line(x_left, y, x_right, y)
-        c.setStrokeColor(colors.black)
-        y -= 5*mm
-
-    col_gap = 12
-    col_w = (x_right - x_left - col_gap)/2.0
-    label_w = 52*mm
-    value_w = col_w - label_w
-
-    # Identity
-    section("Identity")
-    y0 = y
-    y = _kv_pair(c, "Full Name", form_data["full_name"], x_left, y, label_w, value_w)
-    y = _kv_pair(c, "Date of Birth", form_data["dob"], x_left, y, label_w, value_w)
-    y = _kv_pair(c, "National ID", form_data["national_id"], x_left, y, label_w, value_w)
-    y = _kv_pair(c, "Phone Number", form_data["phone_number"], x_left, y, label_w, value_w)
-    y_r = y0
-    y_r = _kv_pair(c, "Current Address", form_data["current_address"], x_left + col_w + col_gap, y_r, label_w, value_w)
-    y = min(y, y_r) - 6*mm
-
-    # Employment & Income
-    section("Employment & Income")
-    y0 = y
-    y = _kv_pair(c, "Employment", form_data["employment"], x_left, y, label_w, value_w)
-    y = _kv_pair(c, "Employer", form_data["employer"], x_left, y, label_w, value_w)
-    y_r = y0
-    y_r = _kv_pair(c, "Income Level", form_data["income_level"], x_left + col_w + col_gap, y_r, label_w, value_w)
-    y = min(y, y_r) - 6*mm
-
-    # Calculated Metrics
-    section("Calculated Metrics")
-    y0 = y
-    y = _kv_pair(c, "Credit Utilization Ratio (%)", f'{form_data["credit_utilization_ratio"]:.1f}', x_left, y, label_w, value_w)
-    y = _kv_pair(c, "Payment History Score (%)", f'{form_data["payment_history_score"]:.1f}', x_left, y, label_w, value_w)
-    y_r = y0
-    y_r = _kv_pair(c, "Debt-to-Income Ratio (%)", f'{form_data["debt_to_income_ratio"]:.1f}', x_left + col_w + col_gap, y_r, label_w, value_w)
-    y = min(y, y_r) - 6*mm
-
-    # Credit File Details
-    section("Credit File Details")
-    y0 = y
-    y = _kv_pair(c, "Open Credit Lines", form_data["open_credit_lines"], x_left, y, label_w, value_w)
-    y = _kv_pair(c, "Past Due Accounts", form_data["past_due_accounts"], x_left, y, label_w, value_w)
-    y = _kv_pair(c, "Length of Credit History (years)", form_data["length_credit_history_years"], x_left, y, label_w, value_w)
-    y_r = y0
-    y_r = _kv_pair(c, "Recent Credit Inquiries (12m)", form_data["recent_inquiries_12m"], x_left + col_w + col_gap, y_r, label_w, value_w)
-    y_r = _kv_pair(c, "Collateral Provided", form_data["collateral_provided"], x_left + col_w + col_gap, y_r, label_w, value_w)
-    y_r = _kv_pair(c, "Account Types", form_data["account_types"], x_left + col_w + col_gap, y_r, label_w, value_w)
-    y = min(y, y_r) - 6*mm
-
-    # Macroeconomic
-    section("Macroeconomic Risk")
-    y = _kv_pair(c, "Adjustment", form_data["macroeconomic_risk"], x_left, y, label_w, value_w) - 4*mm
-
-    # Footer / timestamp
-    c.setFont("Helvetica", 9)
-    c.setFillColor(colors.HexColor("#666666"))
-    c.drawRightString(x_right, margin, "Generated: " + datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"))
-    c.setFillColor(colors.black)
-
-    c.showPage()
-    c.save()
-    buf.seek(0)
-    return buf
-
-def _ensure_csv_header(path: Path):
-    if not path.exists():
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "timestamp","full_name","dob","national_id","current_address","phone_number",
-                "employment","employer","income_level",
-                "credit_utilization_ratio_pct","payment_history_score_pct","debt_to_income_ratio_pct",
-                "open_credit_lines","past_due_accounts","length_credit_history_years","recent_inquiries_12m",
-                "collateral_provided","account_types","macroeconomic_risk",
-                "score","category"
-            ])
-
-def _append_csv(path: Path, fd: dict, score: int, category: str):
-    _ensure_csv_header(path)
-    with path.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            datetime.datetime.utcnow().isoformat(),
-            fd["full_name"], fd["dob"], fd["national_id"], fd["current_address"], fd["phone_number"],
-            fd["employment"], fd["employer"], fd["income_level"],
-            f'{fd["credit_utilization_ratio"]:.1f}', f'{fd["payment_history_score"]:.1f}', f'{fd["debt_to_income_ratio"]:.1f}',
-            fd["open_credit_lines"], fd["past_due_accounts"], fd["length_credit_history_years"], fd["recent_inquiries_12m"],
-            fd["collateral_provided"], fd["account_types"], fd["macroeconomic_risk"],
-            score, category
-        ])
+def _csv_row(fd: dict, score: int, category: str, model_version: str):
+    return [
+        datetime.datetime.utcnow().isoformat(),
+        fd["full_name"], fd["dob"], fd["national_id"], fd["current_address"], fd["phone_number"],
+        fd["employment"], fd["employer"], fd["income_level"],
+        f'{fd["credit_utilization_ratio"]:.1f}', f'{fd["payment_history_score"]:.1f}', f'{fd["debt_to_income_ratio"]:.1f}',
+        fd["open_credit_lines"], fd["past_due_accounts"], fd["length_credit_history_years"], fd["recent_inquiries_12m"],
+        fd["collateral_provided"], fd["account_types"], fd["macroeconomic_risk"],
+        score, category, model_version
+    ]
+
+def _append_csv(path: Path, fd: dict, score: int, category: str, model_version: str, idempotency_key=None):
+    # Enqueues the row; the store's writer thread group-commits to disk under a file lock. The
+    # returned Future resolves to None once the row is durable, or fails with the write error.
+    # A repeat of a save from the last SAVE_DEDUP_WINDOW seconds (same row or same key) is not
+    # written; its Future resolves to the earlier save time instead. The keys count as saved
+    # only once the write is durable: a repeat that arrives while it is in flight waits for the
+    # outcome (up to SAVE_TIMEOUT, then SavePending), and is written itself if that write failed.
+    row = _csv_row(fd, score, category, model_version)
+    dedup = get_recent_saves(SAVE_DEDUP_INDEX)
+    keys = save_keys(fd["national_id"], row[1:], idempotency_key)
+    fut = Future()
+    deadline = time.monotonic() + SAVE_TIMEOUT
+    while True:
+        now = time.time()
+        saved_at = dedup.seen(keys, now)
+        if saved_at is None: break
+        if saved_at > 0:
+            fut.set_result(saved_at)
+            return fut
+        if time.monotonic() >= deadline:
+            fut.set_exception(SavePending("An identical save is still being written; check /records before retrying."))
+            return fut
+        time.sleep(0.005)
+    try:
+        fut = get_store(path, CSV_HEADER).append(row)
+    except BaseException:
+        dedup.forget(keys, now)
+        raise
+    def settle(f):
+        if f.cancelled() or f.exception() is not None: dedup.forget(keys, now)
+        else: dedup.confirm(keys, now)
+    fut.add_done_callback(settle)
+    return fut
+
+def _save_result(fut):
+    # (status, message) for a save once its Future resolved or SAVE_TIMEOUT passed
+    if not fut.done():
+        if fut.cancel(): return 503, "Save timed out and was not written; please retry."
+        return 503, "Save not confirmed within %gs; check /records before retrying." % SAVE_TIMEOUT
+    try:
+        saved_at = fut.result()
+    except IdempotencyConflict as e:
+        return 409, str(e)
+    except SavePending as e:
+        return 503, str(e)
+    except Exception as e:
+        return 500, f"Failed to write CSV: {e}"
+    if saved_at is None: return 200, "Saved to CSV. Download latest at /csv"
+    return 200, "Already saved at %s UTC; not written again." % datetime.datetime.utcfromtimestamp(saved_at).strftime("%Y-%m-%d %H:%M:%S")
 
 @app.route("/health", methods=["GET","HEAD"])
 def health():
@@ -430,30 +408,122 @@ def health():
         return Response(status=200)
     return {"status": "ok"}, 200
 
-@app.route("/debug")
-def debug():
-    tree = []
-    for root, dirs, files in os.walk(".", topdown=True):
-        depth = root.count(os.sep)
-        if depth > 2: continue
-        tree.append({"root": root, "dirs": dirs, "files": files})
-    return jsonify({
+def _debug_info():
+    # Built at most once per DEBUG_TTL per worker, with bounded listings.
+    try:
+        st = CSV_PATH.stat()
+        csv_size = st.st_size
+    except OSError:
+        csv_size = None
+    jinja_cache = app.jinja_env.cache
+    bcc = app.jinja_env.bytecode_cache
+    static, data, tree = diagnostics.list_dir(STATIC_DIR), diagnostics.list_dir(DATA_DIR), diagnostics.tree(ROOT_DIR)
+    # the original keys keep their shapes (name lists, list of nodes); sizes and truncation flags sit alongside
+    return {
         "cwd": os.getcwd(),
         "root_dir": str(ROOT_DIR),
         "templates_dir": str(TEMPLATES_DIR),
         "has_templates_dir": TEMPLATES_DIR.is_dir(),
-        "templates_list": os.listdir(TEMPLATES_DIR) if TEMPLATES_DIR.is_dir() else [],
+        "templates_list": [e["name"] for e in diagnostics.list_dir(TEMPLATES_DIR)["entries"]],
         "static_dir": str(STATIC_DIR),
-        "static_list": os.listdir(STATIC_DIR) if STATIC_DIR.is_dir() else [],
+        "static_list": [e["name"] for e in static["entries"]],
+        "static": static,
         "data_dir": str(DATA_DIR),
-        "data_list": os.listdir(DATA_DIR) if DATA_DIR.is_dir() else [],
-        "csv_path": str(CSV_PATH) if CSV_PATH.exists() else None,
-        "tree": tree
-    })
+        "data_list": [e["name"] for e in data["entries"]],
+        "data": data,
+        "csv_path": str(CSV_PATH) if csv_size is not None else None,
+        "records": {"size_bytes": csv_size, "pending_rows": get_store(CSV_PATH, CSV_HEADER).pending(),
+                    **analytics.stats()},
+        "templates": {
+            "loaded": sorted(name for _, name in (jinja_cache.keys() if jinja_cache is not None else [])),
+            "cache_capacity": getattr(jinja_cache, "capacity", None),
+            "bytecode_cache_dir": str(JINJA_CACHE_DIR) if bcc is not None else None,
+            "pdf_template_ready": template_ready(),
+        },
+        "caches": {"score": score_cache.stats(), "pdf": report_cache.stats()},
+        "process": diagnostics.process_info(),
+        "scoring_model": model_registry.info(),
+        "tree": tree["nodes"],
+        "tree_truncated": tree["truncated"],
+    }
+
+debug_snapshot = diagnostics.Snapshot(_debug_info)
+
+@app.route("/debug")
+def debug():
+    info, age = debug_snapshot.get()
+    return jsonify({**info, "snapshot_age_seconds": age})
+
+# ---------- Admin profiling (disabled unless ADMIN_TOKEN is set) ----------
+def _admin_token():
+    auth = request.headers.get("Authorization", "")
+    return request.headers.get("X-Admin-Token") or (auth[7:] if auth.startswith("Bearer ") else None)
+
+def _admin_denied():
+    if not profiler.ADMIN_TOKEN: return "Not found", 404
+    if not profiler.authorized(_admin_token()): return "Forbidden", 403
+    return None
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    # Samples every thread of the worker that answers; run it a few times to cover all workers.
+    denied = _admin_denied()
+    if denied: return denied
+    args = request.args
+    try:
+        sampler = profiler.profile(_arg_float(args.get("seconds")) or 10.0,
+                                   (_arg_float(args.get("interval_ms")) or 5.0) / 1000.0,
+                                   include_idle=args.get("idle","") in {"1","true","yes"})
+    except profiler.ProfilerBusy as e:
+        return str(e), 409
+    info = sampler.info()
+    if args.get("format") == "json":
+        return jsonify({**info, "stacks": dict(sampler.stacks.most_common())})
+    return Response(sampler.collapsed(), mimetype="text/plain",
+                    headers={"Content-Disposition": "attachment; filename=profile-%d.folded" % info["pid"],
+                             "X-Profile-Pid": str(info["pid"]), "X-Profile-Samples": str(info["samples"])})
+
+@app.route("/debug/profile/<profile_id>", methods=["GET"])
+def debug_profile_saved(profile_id):
+    denied = _admin_denied()
+    if denied: return denied
+    path = profiler.load_path(profile_id)
+    if path is None:
+        return "unknown or expired profile", 404
+    return send_file(str(path), mimetype="text/plain", as_attachment=True, download_name="profile-%s.folded" % profile_id)
+
+@app.before_request
+def _profile_request_start():
+    # Opt-in: "X-Profile: 1" plus the admin token samples just this request's thread.
+    if request.headers.get("X-Profile") != "1" or not profiler.authorized(_admin_token()): return
+    g.profile = profiler.Sampler(profiler.REQUEST_INTERVAL, thread_ids={threading.get_ident()}, include_idle=True).start()
+
+@app.after_request
+def _profile_request_end(resp):
+    sampler = g.pop("profile", None)
+    if sampler is None: return resp
+    sampler.stop()
+    profile_id = profiler.save(sampler.collapsed())
+    if profile_id:
+        resp.headers["X-Profile-Id"] = profile_id
+        resp.headers["X-Profile-Url"] = "/debug/profile/%s" % profile_id
+    resp.headers["X-Profile-Samples"] = str(sampler.samples)
+    return resp
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"score": score_cache.stats(), "pdf": report_cache.stats()})
 
 @app.route("/repair", methods=["GET"])
 def repair():
     ensure_templates()
+    app.jinja_env.cache.clear()
+    reset_template()
+    debug_snapshot.invalidate()
     return jsonify({
         "repaired": True,
         "templates_dir": str(TEMPLATES_DIR),
@@ -461,87 +531,379 @@ def repair():
         "templates_list": os.listdir(TEMPLATES_DIR) if TEMPLATES_DIR.is_dir() else [],
     })
 
-def _parse_float_form(name):
+# Lenient query-string numbers (seconds, bin, wait, pages_per_file): anything unparseable is 0.
+# Form and JSON fields go through applicant.py instead.
+def _arg_float(v):
     try:
-        return float(request.form.get(name,"") or 0)
+        return float(v or 0)
     except Exception:
         return 0.0
 
-def _parse_int_form(name):
+def _arg_int(v):
     try:
-        return int(request.form.get(name,"") or 0)
+        return int(v or 0)
     except Exception:
         return 0
 
+def _apply_ratios(fd):
+    # server-side auto-calc
+    util = _pct(fd["total_credit_balance"], max(0.0, fd["total_credit_limit"]))
+    ph = _pct(fd["on_time_payments"], max(0.0, fd["total_payments"]))
+    dti = _pct(fd["monthly_debt_payments"], max(0.0, fd["gross_monthly_income"]))
+    if fd["total_credit_limit"] > 0: fd["credit_utilization_ratio"] = util
+    if fd["total_payments"] > 0: fd["payment_history_score"] = ph
+    if fd["gross_monthly_income"] > 0: fd["debt_to_income_ratio"] = dti
+
+def _score_fd(fd, model):
+    # Ratios + score for an interactive request, memoized across preview/download/save.
+    key = score_cache.key(fd, model.version)
+    hit = score_cache.get(key)
+    if hit is not None:
+        util, ph, dti, score, category = hit
+        fd["credit_utilization_ratio"], fd["payment_history_score"], fd["debt_to_income_ratio"] = util, ph, dti
+        return score, category
+    _apply_ratios(fd)
+    score, category = model.score(fd)
+    score_cache.put(key, (fd["credit_utilization_ratio"], fd["payment_history_score"], fd["debt_to_income_ratio"], score, category))
+    return score, category
+
+def handle_form(get, idempotency_key=None):
+    """Parse, score and count one form submission, and queue its save for save_csv; index() and
+    asgi.index_post both go through here and differ only in how they wait and render.
+
+    Returns (fd, errors, score, category, action, saved): errors is {field: message} or None (and
+    then nothing else is filled in); saved is the save's Future, or None when not saving.
+    """
+    with STAGE["parse"].time():
+        fd, errors = parse_applicant(get)
+    if errors: return fd, errors, None, None, None, None
+    model = get_model()
+    with STAGE["score"].time():
+        score, category = _score_fd(fd, model)
+    action = get("action") or "preview"
+    ACTION_COUNT.get(action, ACTION_COUNT["preview"]).inc()
+    _count_category(category)
+    saved = None
+    if action == "save_csv":
+        t0 = time.perf_counter()
+        try:
+            saved = _append_csv(CSV_PATH, fd, score, category, model.version, idempotency_key)
+        except Exception as e:
+            saved = Future()
+            saved.set_exception(e)
+        # enqueue to durable (or failed, or given up on); the same however the caller waits
+        saved.add_done_callback(lambda f: STAGE["csv"].observe(time.perf_counter() - t0))
+    return fd, errors, score, category, action, saved
+
 @app.route("/", methods=["GET","POST","HEAD"])
 def index():
     if request.method == "HEAD":
         return Response(status=200)
-    ensure_templates()
     if request.method == "GET":
         try:
             return render_template("form.html")
         except TemplateNotFound as e:
             return f"Template not found: {e}. Expected at: {TEMPLATES_DIR}", 500
 
-    fd = {
-        "full_name": request.form.get("full_name","").strip(),
-        "dob": request.form.get("dob","").strip(),
-        "national_id": request.form.get("national_id","").strip(),
-        "current_address": request.form.get("current_address","").strip(),
-        "phone_number": request.form.get("phone_number","").strip(),
-        "employment": request.form.get("employment","").strip(),
-        "employer": request.form.get("employer","").strip(),
-        "income_level": request.form.get("income_level","").strip(),
-        "total_credit_limit": _parse_float_form("total_credit_limit"),
-        "total_credit_balance": _parse_float_form("total_credit_balance"),
-        "on_time_payments": _parse_float_form("on_time_payments"),
-        "total_payments": _parse_float_form("total_payments"),
-        "monthly_debt_payments": _parse_float_form("monthly_debt_payments"),
-        "gross_monthly_income": _parse_float_form("gross_monthly_income"),
-        "credit_utilization_ratio": _parse_float_form("credit_utilization_ratio"),
-        "payment_history_score": _parse_float_form("payment_history_score"),
-        "debt_to_income_ratio": _parse_float_form("debt_to_income_ratio"),
-        "open_credit_lines": _parse_int_form("open_credit_lines"),
-        "past_due_accounts": _parse_int_form("past_due_accounts"),
-        "length_credit_history_years": _parse_int_form("length_credit_history"),
-        "recent_inquiries_12m": _parse_int_form("recent_inquiries"),
-        "collateral_provided": request.form.get("collateral_provided","").strip(),
-        "account_types": request.form.get("account_types","").strip(),
-        "macroeconomic_risk": request.form.get("macroeconomic_risk","").strip(),
-    }
-
-    # server-side auto-calc
-    util = _pct(fd["total_credit_balance"], max(0.0, fd["total_credit_limit"]))
-    ph = _pct(fd["on_time_payments"], max(0.0, fd["total_payments"]))
-    dti = _pct(fd["monthly_debt_payments"], max(0.0, fd["gross_monthly_income"]))
-    if fd["total_credit_limit"] > 0: fd["credit_utilization_ratio"] = util
-    if fd["total_payments"] > 0: fd["payment_history_score"] = ph
-    if fd["gross_monthly_income"] > 0: fd["debt_to_income_ratio"] = dti
-
-    score, category = calculate_credit_score(fd)
-    action = request.form.get("action","preview")
+    fd, errors, score, category, action, saved = handle_form(
+        request.form.get, request.headers.get("Idempotency-Key") or request.form.get("idempotency_key"))
+    if errors:
+        return render_template("form.html", errors=errors, form=request.form), 400
 
     if action == "download_pdf":
-        pdf = generate_pdf(fd, score, category)
-        return send_file(pdf, as_attachment=True, download_name="credit_report.pdf", mimetype="application/pdf")
-
-    if action == "save_csv":
+        # rendered by the report job workers, like POST /reports; a slow render continues at /reports/<id>
         try:
-            _append_csv(CSV_PATH, fd, score, category)
-            fd["message"] = "Saved to CSV. Download latest at /csv"
-        except Exception as e:
-            fd["message"] = f"Failed to write CSV: {e}"
+            job_id = report_queue.submit(render_pdf, fd, score, category)
+        except QueueFull as e:
+            return str(e), 429, {"Retry-After": "5"}
+        with STAGE["pdf"].time():
+            st = report_queue.wait(job_id, REPORT_MAX_WAIT)
+        if st is not None and st["status"] == "done":
+            return send_file(str(report_queue.result_path(job_id)), as_attachment=True,
+                             download_name="credit_report.pdf", mimetype="application/pdf")
+        if st is not None and st["status"] == "failed":
+            return "PDF generation failed: %s" % st.get("error", ""), 500
+        return redirect(f"/reports/{job_id}?wait={REPORT_MAX_WAIT:g}", 303)
+
+    status = 200
+    if saved is not None:
+        wait([saved], SAVE_TIMEOUT)
+        status, fd["message"] = _save_result(saved)
+
+    with STAGE["render"].time():
+        return render_template("result.html", data=fd, score=score, category=category), status
+
+# ---------- JSON / NDJSON bulk scoring ----------
+API_READ_CHUNK = 64 * 1024
+API_MAX_RECORD_BYTES = 1024 * 1024
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+
+class _JsonRecords:
+    """Incremental decoder for a JSON array or NDJSON body; holds at most one record in memory."""
+    def __init__(self):
+        self.dec = json.JSONDecoder()
+        self.buf = ""
+        self.in_array = None
+        self.after_value = False  # array: the last token was a record, so ',' or ']' comes next
+        self.after_comma = False
+        self.closed = False  # array: ']' seen, only whitespace may follow
+        self.done = False
+
+    def feed(self, text, eof=False):
+        # Yields the records completed by `text`; pass eof=True with the last chunk.
+        # Works from an offset into the buffer and drops the consumed part once, at the end.
+        buf = self.buf + text if self.buf else text
+        pos = 0
+        try:
+            while not self.done:
+                pos = _JSON_WS.match(buf, pos).end()
+                if pos == len(buf):
+                    if eof:
+                        if self.in_array and not self.closed: raise ValueError("unterminated JSON array")
+                        self.done = True
+                    break
+                if self.closed: raise ValueError("unexpected data after the closing ']' near: %r" % buf[pos:pos + 80])
+                c = buf[pos]
+                if self.in_array is None:
+                    self.in_array = c == "["
+                    if self.in_array: pos += 1; continue
+                if self.in_array:
+                    if c == "]":
+                        if self.after_comma: raise ValueError("trailing ',' before ']'")
+                        self.closed = True
+                        pos += 1
+                        continue
+                    if c == ",":
+                        if not self.after_value: raise ValueError("unexpected ',' near: %r" % buf[pos:pos + 80])
+                        self.after_value, self.after_comma = False, True
+                        pos += 1
+                        continue
+                    if self.after_value: raise ValueError("missing ',' between records near: %r" % buf[pos:pos + 80])
+                try:
+                    obj, end = self.dec.raw_decode(buf, pos)
+                except ValueError:
+                    if eof: raise ValueError("malformed JSON near: %r" % buf[pos:pos + 80])
+                    if len(buf) - pos > API_MAX_RECORD_BYTES: raise ValueError("record exceeds %d bytes" % API_MAX_RECORD_BYTES)
+                    break
+                # a bare number at the chunk edge may be truncated; wait for a delimiter
+                if end == len(buf) and not eof and not isinstance(obj, (dict, list, str)): break
+                pos = end
+                self.after_value, self.after_comma = True, False
+                yield obj
+        finally:
+            self.buf = buf[pos:]
+
+def _iter_json_records(stream, parser=None):
+    parser = parser or _JsonRecords()
+    while not parser.done:
+        chunk = stream.read(API_READ_CHUNK)
+        if isinstance(chunk, bytes): chunk = chunk.decode("utf-8")
+        yield from parser.feed(chunk or "", eof=not chunk)
+
+def _score_api_record(rec):
+    fd, errors = parse_applicant(rec.get)
+    if errors: return {"national_id": fd["national_id"], "errors": errors}
+    _apply_ratios(fd)
+    model = get_model()
+    score, category = model.score(fd)
+    _count_category(category)
+    return {
+        "national_id": fd["national_id"],
+        "credit_utilization_ratio": fd["credit_utilization_ratio"],
+        "payment_history_score": fd["payment_history_score"],
+        "debt_to_income_ratio": fd["debt_to_income_ratio"],
+        "score": score,
+        "category": category,
+        "model_version": model.version,
+    }
 
-    return render_template("result.html", data=fd, score=score, category=category)
+def _api_line(n, rec):
+    if not isinstance(rec, dict): return json.dumps({"index": n, "error": "expected a JSON object"}) + "\n"
+    return json.dumps({"index": n, **_score_api_record(rec)}) + "\n"
+
+@app.route("/api/score", methods=["POST"])
+def api_score():
+    # The first API_READ_CHUNK bytes (or the whole body, if shorter) are decoded before the status
+    # goes out, so a malformed body of that size gets a 400; past it, an error can only be the last
+    # NDJSON line.
+    stream = codecs.getreader("utf-8")(request.stream)
+    parser = _JsonRecords()
+    first, received = [], 0
+    try:
+        while received < API_READ_CHUNK and not parser.done:
+            chunk = stream.read(API_READ_CHUNK - received)
+            received += len(chunk)
+            first += parser.feed(chunk, eof=not chunk)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        for n, rec in enumerate(first):
+            yield _api_line(n, rec)
+        try:
+            for n, rec in enumerate(_iter_json_records(stream, parser), len(first)):
+                yield _api_line(n, rec)
+        except ValueError as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def _time_bounds(args):
+    # from/to as saved timestamps, the same for CSV, SQLite and archive readers; ValueError when unparseable
+    return timestamp_bound(args.get("from") or None), timestamp_bound(args.get("to") or None)
+
+@app.route("/records", methods=["GET"])
+def records_query():
+    args = request.args
+    def opt_int(name):
+        v = args.get(name)
+        return int(v) if v not in (None, "") else None
+    try:
+        since, until = _time_bounds(args)
+        get_store(CSV_PATH, CSV_HEADER).flush(timeout=5)
+        rows, next_cursor = record_index.query(
+            national_id=args.get("national_id") or None,
+            category=args.get("category") or None,
+            since=since,
+            until=until,
+            min_score=opt_int("min_score"),
+            max_score=opt_int("max_score"),
+            cursor=args.get("cursor") or None,
+            limit=opt_int("limit") or 100,
+            descending=args.get("order", "asc") == "desc",
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"records": rows, "next_cursor": next_cursor})
+
+@app.route("/analytics", methods=["GET"])
+def analytics_summary():
+    args = request.args
+    try:
+        since, until = _time_bounds(args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid from/to: {e}"}), 400
+    return jsonify(analytics.summary(bin_width=_arg_int(args.get("bin")) or 10, since=since, until=until))
+
+@app.route("/reports", methods=["POST"])
+def reports_submit():
+    payload = request.get_json(silent=True) if request.is_json else None
+    fd, errors = parse_applicant(payload.get if isinstance(payload, dict) else request.form.get)
+    if errors:
+        return jsonify({"errors": errors}), 400
+    score, category = _score_fd(fd, get_model())
+    try:
+        job_id = report_queue.submit(render_pdf, fd, score, category)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "5"}
+    return jsonify({"job_id": job_id, "status": "queued", "url": f"/reports/{job_id}"}), 202, {"Location": f"/reports/{job_id}"}
+
+@app.route("/reports/<job_id>", methods=["GET"])
+def reports_status(job_id):
+    wait = min(REPORT_MAX_WAIT, max(0.0, _arg_float(request.args.get("wait"))))
+    st = report_queue.wait(job_id, wait) if wait else report_queue.status(job_id)
+    if st is None:
+        return jsonify({"error": "unknown or expired job"}), 404
+    if st["status"] == "done":
+        path = report_queue.result_path(job_id)
+        if path.exists():
+            return send_file(str(path), as_attachment=True, download_name="credit_report.pdf", mimetype="application/pdf")
+        return jsonify({"error": "unknown or expired job"}), 404
+    if st["status"] == "failed":
+        return jsonify({"job_id": job_id, **st}), 500
+    return jsonify({"job_id": job_id, **st}), 202, {"Retry-After": "1"}
+
+@app.route("/reports/batch", methods=["GET"])
+def reports_batch():
+    get_store(CSV_PATH, CSV_HEADER).flush(timeout=5)
+    if not CSV_PATH.exists() and not history(CSV_PATH):
+        return "No CSV yet. Use 'Save to CSV' first.", 404
+    args = request.args
+    fmt = args.get("format", "zip")
+    if fmt not in {"zip", "pdf"}:
+        return "format must be zip or pdf", 400
+    try:
+        since, until = _time_bounds(args)
+    except ValueError as e:
+        return f"Invalid from/to: {e}", 400
+    categories = {c.strip() for c in args.get("category","").split(",") if c.strip()} or None
+    rows = report_batch.iter_saved_records(CSV_PATH, since, until, categories, args.get("national_id") or None)
+    if not report_batch.job_slot.acquire(blocking=False):
+        return "A batch report job is already running in this worker; retry later.", 429
+    pages = max(1, _arg_int(args.get("pages_per_file")) or 1)
+    try:
+        fmt, body = report_batch.batch_report(rows, fmt, pages)
+    except BaseException:
+        report_batch.job_slot.release()
+        raise
+    resp = Response(body, mimetype="application/" + fmt,
+                    headers={"Content-Disposition": "attachment; filename=credit_reports." + fmt})
+    resp.call_on_close(report_batch.job_slot.release)
+    return resp
 
 @app.route("/csv", methods=["GET"])
 def csv_download():
-    if not CSV_PATH.exists():
+    get_store(CSV_PATH, CSV_HEADER).flush(timeout=5)
+    closed = history(CSV_PATH)
+    if not CSV_PATH.exists() and not closed:
         return "No CSV yet. Use 'Save to CSV' first.", 404
-    return send_file(str(CSV_PATH), as_attachment=True, download_name="records.csv", mimetype="text/csv")
+    args = request.args
+    try:
+        since, until = _time_bounds(args)
+    except ValueError as e:
+        return f"Invalid from/to: {e}", 400
+    categories = {c.strip() for c in args.get("category","").split(",") if c.strip()} or None
+    columns = [c.strip() for c in args.get("columns","").split(",") if c.strip()] or None
+    use_gzip = args.get("gzip","") in {"1","true","yes"}
+    try:
+        ino, size = snapshot(CSV_PATH)
+    except FileNotFoundError:
+        ino, size = 0, 0  # rotated and not written to since
+    header = (read_header(CSV_PATH) if size else None) or CSV_HEADER
+    if columns:
+        unknown = [c for c in columns if c not in header]
+        if unknown:
+            return f"Unknown columns: {', '.join(unknown)}", 400
+
+    # Closed segments and archives never change, so their names plus the live snapshot pin the content.
+    filtered = bool(since or until or categories or columns)
+    merged = filtered or bool(closed)
+    variant = repr((since, until, sorted(categories or ()), columns, use_gzip, [p.name for p in closed])) \
+        if (merged or use_gzip) else ""
+    etag = snapshot_etag(ino, size, variant)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    name = "records.csv.gz" if use_gzip else "records.csv"
+    headers = {"Content-Disposition": f"attachment; filename={name}", "Cache-Control": "no-cache"}
+    if merged or use_gzip:
+        # rows from every source, in the live file's columns (older segments get "" for newer columns)
+        cols = columns or header
+        body = encode_rows(cols, iter_history(CSV_PATH, cols, since, until, categories, size)) if merged \
+            else iter_bytes(CSV_PATH, 0, size)
+        if use_gzip: body = gzip_chunks(body)
+        resp = Response(body, mimetype="application/gzip" if use_gzip else "text/csv", headers=headers)
+        resp.set_etag(etag)
+        return resp
+
+    # Unfiltered, nothing rotated away: byte-exact snapshot of the file, resumable with Range / If-Range.
+    start, stop, status = 0, size, 200
+    rng = request.range
+    if rng is not None and (request.if_range.etag is None or request.if_range.etag == etag) and request.if_range.date is None:
+        bounds = rng.range_for_length(size)
+        if bounds is None and len(rng.ranges) == 1:
+            return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        if bounds is not None:
+            start, stop = bounds
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{stop-1}/{size}"
+    headers["Accept-Ranges"] = "bytes"
+    headers["Content-Length"] = str(stop - start)
+    resp = Response(iter_bytes(CSV_PATH, start, stop), status=status, mimetype="text/csv", headers=headers)
+    resp.set_etag(etag)
+    return resp
 
 if __name__ == "__main__":
-    # Ensure templates exist even if mispackaged
-    ensure_templates()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,169 @@
+import math
+
+TEXT_MAX_LENGTH = 500
+
+# (attribute, form/JSON field name, type); the attribute names are the keys scoring, the PDF and the CSV use
+FIELDS = (
+    ("full_name", "full_name", str),
+    ("dob", "dob", str),
+    ("national_id", "national_id", str),
+    ("current_address", "current_address", str),
+    ("phone_number", "phone_number", str),
+    ("employment", "employment", str),
+    ("employer", "employer", str),
+    ("income_level", "income_level", str),
+    ("total_credit_limit", "total_credit_limit", float),
+    ("total_credit_balance", "total_credit_balance", float),
+    ("on_time_payments", "on_time_payments", float),
+    ("total_payments", "total_payments", float),
+    ("monthly_debt_payments", "monthly_debt_payments", float),
+    ("gross_monthly_income", "gross_monthly_income", float),
+    ("credit_utilization_ratio", "credit_utilization_ratio", float),
+    ("payment_history_score", "payment_history_score", float),
+    ("debt_to_income_ratio", "debt_to_income_ratio", float),
+    ("open_credit_lines", "open_credit_lines", int),
+    ("past_due_accounts", "past_due_accounts", int),
+    ("length_credit_history_years", "length_credit_history", int),
+    ("recent_inquiries_12m", "recent_inquiries", int),
+    ("collateral_provided", "collateral_provided", str),
+    ("account_types", "account_types", str),
+    ("macroeconomic_risk", "macroeconomic_risk", str),
+)
+
+# records.csv column for attributes stored under another name (the ratios are saved as *_pct)
+RECORD_COLUMNS = {
+    "credit_utilization_ratio": "credit_utilization_ratio_pct",
+    "payment_history_score": "payment_history_score_pct",
+    "debt_to_income_ratio": "debt_to_income_ratio_pct",
+}
+
+class Applicant:
+    """One parsed application. Reads like the old form dict (a["employment"], a.get, a.items()),
+    so scoring, the PDF, the CSV row and the templates take it unchanged."""
+    __slots__ = tuple(attr for attr, _, _ in FIELDS) + ("message",)
+
+    __setitem__ = object.__setattr__
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def keys(self):
+        return [k for k in self.__slots__ if hasattr(self, k)]
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.__slots__ if hasattr(self, k)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __repr__(self):
+        return "Applicant(%s)" % ", ".join("%s=%r" % kv for kv in self.items())
+
+# ---------- Field parsers: empty means the default, anything else must be valid ----------
+def _text(raw):
+    if raw is None: return ""
+    if isinstance(raw, (dict, list)): raise ValueError("must be text")
+    v = (raw if raw.__class__ is str else str(raw)).strip()
+    if len(v) > TEXT_MAX_LENGTH: raise ValueError("longer than %d characters" % TEXT_MAX_LENGTH)
+    return v
+
+def _float(raw):
+    if raw is None or raw == "": return 0.0
+    if raw.__class__ is bool: raise ValueError("must be a number")
+    try:
+        v = float(raw)
+    except (TypeError, ValueError):
+        raise ValueError("must be a number") from None
+    if not math.isfinite(v): raise ValueError("must be a finite number")
+    if v < 0: raise ValueError("must not be negative")
+    return v
+
+def _int(raw):
+    if raw is None or raw == "": return 0
+    if raw.__class__ is int: v = raw
+    else:
+        v = _float(raw)
+        if v != int(v): raise ValueError("must be a whole number")
+        v = int(v)
+    if v < 0: raise ValueError("must not be negative")
+    return v
+
+_PARSERS = {str: _text, float: _float, int: _int}
+_DEFAULTS = {str: "", float: 0.0, int: 0}
+_INF = float("inf")
+
+def _slow(a, attr, name, kind, raw, errors):
+    # Full parser for whatever the fast path did not take; collects the error message.
+    try:
+        setattr(a, attr, _PARSERS[kind](raw))
+    except ValueError as e:
+        setattr(a, attr, _DEFAULTS[kind])
+        if errors is None: errors = {}
+        errors[name] = str(e)
+    return errors
+
+_TEMPLATES = {
+    str: """
+    raw = get({name!r})
+    v = raw.strip() if raw.__class__ is str else None
+    if v is not None and len(v) <= TEXT_MAX_LENGTH: a.{attr} = v
+    else: errors = _slow(a, {attr!r}, {name!r}, str, raw, errors)""",
+    int: """
+    raw = get({name!r})
+    if raw.__class__ is str and raw.isdecimal(): a.{attr} = int(raw)
+    elif raw.__class__ is int and raw >= 0: a.{attr} = raw
+    elif raw == "" or raw is None: a.{attr} = 0
+    else: errors = _slow(a, {attr!r}, {name!r}, int, raw, errors)""",
+    float: """
+    raw = get({name!r})
+    if raw.__class__ is str and raw:
+        try:
+            v = float(raw)
+        except ValueError:
+            v = -1.0
+        if 0.0 <= v < _INF: a.{attr} = v
+        else: errors = _slow(a, {attr!r}, {name!r}, float, raw, errors)
+    elif (raw.__class__ is float or raw.__class__ is int) and 0 <= raw < _INF: a.{attr} = float(raw)
+    elif raw is None or raw == "": a.{attr} = 0.0
+    else: errors = _slow(a, {attr!r}, {name!r}, float, raw, errors)""",
+}
+
+def compile_parser(names=None):
+    """Build parse(get) -> (Applicant, errors) for one naming of the fields (names: attribute -> input name).
+
+    The schema is compiled into straight-line code, one block per field, like namedtuple and
+    dataclasses do: well-formed strings take a short fast path, anything else goes through
+    _slow, which applies the full validation and records {input name: message}.
+    """
+    names = names or {}
+    body = "".join(_TEMPLATES[kind].format(attr=attr, name=names.get(attr, name)) for attr, name, kind in FIELDS)
+    src = "def parse(get):\n    a = _new(Applicant)\n    errors = None%s\n    return a, errors\n" % body
+    ns = {"_new": object.__new__, "Applicant": Applicant, "_slow": _slow, "_INF": _INF, "TEXT_MAX_LENGTH": TEXT_MAX_LENGTH}
+    exec(compile(src, "<applicant schema>", "exec"), ns)
+    return ns["parse"]
+
+# parse(get) -> (Applicant, errors): one pass over the fields; errors is {input name: message} or
+# None. get(name) returns the raw value or None (request.form.get, dict.get). Invalid fields are
+# set to their default so the record is complete either way.
+parse = compile_parser()
+_parse_record = compile_parser({attr: RECORD_COLUMNS.get(attr, attr) for attr, _, _ in FIELDS})
+
+def parse_record(row):
+    # a saved records.csv row (dict)
+    return _parse_record(row.get)
+
+def record_number(v, kind):
+    # a saved numeric column such as score: written by the app, so a damaged value just reads as 0
+    try:
+        return kind(float(v or 0)) if kind is int else float(v or 0)
+    except ValueError:
+        return kind(0)
@@ -0,0 +1,300 @@
+"""ASGI entry point: SERVER_MODE=async in the Procfile serves this with uvicorn workers.
+
+Health checks, the scoring form and /api/score are read and answered on the worker's event loop,
+so slow clients and long PDF renders no longer hold request threads. Scoring, PDF rendering and
+CSV writes go to small bounded thread pools; every other route is the Flask app, called through a
+bounded pool of THREADS threads with its request body capped before it is buffered.
+"""
+import io, os, sys, json, time, codecs, asyncio, functools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from flask import render_template
+
+import app as wsgi
+import metrics
+from pdf_report import generate_pdf
+from report_jobs import QueueFull
+
+PDF_THREADS = max(1, int(os.environ.get("ASYNC_PDF_THREADS", "2")))
+PDF_QUEUE = int(os.environ.get("ASYNC_PDF_QUEUE", "32"))
+CSV_THREADS = max(1, int(os.environ.get("ASYNC_CSV_THREADS", "1")))
+SCORE_THREADS = max(1, int(os.environ.get("ASYNC_SCORE_THREADS", "2")))
+SCORE_QUEUE = int(os.environ.get("ASYNC_SCORE_QUEUE", "64"))
+MAX_BODY_BYTES = int(os.environ.get("ASYNC_MAX_BODY_BYTES", str(16 * 1024 * 1024)))  # buffered Flask requests
+WSGI_QUEUE = int(os.environ.get("ASYNC_WSGI_QUEUE", "64"))
+MAX_FORM_BYTES = 500 * 1024
+STREAM_CHUNK = 64 * 1024
+
+# ---------- Bounded executors ----------
+class Offload:
+    """Thread pool with a cap on running + waiting calls; past the cap, run() raises QueueFull.
+
+    Only touched from the event loop, so the counter needs no lock.
+    """
+    def __init__(self, name, threads, queue):
+        self.name = name
+        self.threads = threads
+        self.limit = threads + max(0, queue)
+        self.pending = 0
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="async-" + name)
+        metrics.gauge("credit_async_pending_calls", "Calls running or waiting in an async-mode thread pool",
+                      fn=lambda: self.pending, pool=name)
+
+    async def run(self, fn, *args):
+        if self.pending >= self.limit: raise QueueFull("%s pool is full (%d calls)" % (self.name, self.limit))
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+pdf_pool = Offload("pdf", PDF_THREADS, PDF_QUEUE)
+csv_pool = Offload("csv", CSV_THREADS, 256)
+score_pool = Offload("score", SCORE_THREADS, SCORE_QUEUE)
+wsgi_pool = Offload("wsgi", wsgi.THREADS, WSGI_QUEUE)
+
+# ---------- ASGI plumbing ----------
+async def _read_body(receive, limit=None):
+    chunks, size = [], 0
+    while True:
+        msg = await receive()
+        if msg["type"] == "http.disconnect": return None
+        body = msg.get("body", b"")
+        size += len(body)
+        if limit is not None and size > limit: raise ValueError("request body exceeds %d bytes" % limit)
+        chunks.append(body)
+        if not msg.get("more_body"): return b"".join(chunks)
+
+async def _respond(send, status, body=b"", content_type="text/plain; charset=utf-8", headers=(), head=False):
+    hdrs = [(b"content-type", content_type.encode("latin-1")), (b"content-length", str(len(body)).encode())]
+    hdrs += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+    await send({"type": "http.response.start", "status": status, "headers": hdrs})
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+def _json(obj):
+    return (json.dumps(obj) + "\n").encode("utf-8")
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]), "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": "HTTP/%s" % scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0], "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0), "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True, "wsgi.multiprocess": True, "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH": continue  # the body is already buffered
+        key = name if name == "CONTENT_TYPE" else "HTTP_" + name
+        if key in environ: value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+# ---------- Flask, through the bounded pool ----------
+def _wsgi_start(environ):
+    # In the pool: run the view until the status is known and the first chunk is ready.
+    started = {}
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+    result = wsgi.app(environ, start_response)
+    it = iter(result)
+    first, done = _wsgi_next(it)
+    return started, result, it, first, done
+
+def _wsgi_next(it):
+    # Up to STREAM_CHUNK bytes per hop to the pool.
+    out, size = [], 0
+    for chunk in it:
+        if chunk:
+            out.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK: return b"".join(out), False
+    return b"".join(out), True
+
+def _close(result):
+    close = getattr(result, "close", None)
+    if close is not None: close()
+
+async def _call_flask(scope, receive, send):
+    # the body is buffered before the view runs, so it is capped like Flask's MAX_CONTENT_LENGTH would
+    limit = wsgi.app.config.get("MAX_CONTENT_LENGTH") or MAX_BODY_BYTES
+    declared = _header(scope, b"content-length")
+    if declared is not None and declared.isdigit() and int(declared) > limit:
+        return await _respond(send, 413, b"request body exceeds %d bytes" % limit)
+    try:
+        body = await _read_body(receive, limit)
+    except ValueError as e:
+        return await _respond(send, 413, str(e).encode())
+    if body is None: return
+    try:
+        started, result, it, chunk, done = await wsgi_pool.run(_wsgi_start, _environ(scope, body))
+    except QueueFull as e:
+        return await _respond(send, 503, str(e).encode(), headers=[("Retry-After", "1")])
+    gone = asyncio.Event()
+    async def watch():
+        while (await receive())["type"] != "http.disconnect": pass
+        gone.set()
+    watcher = asyncio.create_task(watch())
+    loop = asyncio.get_running_loop()
+    try:
+        code = int(started["status"].split(" ", 1)[0])
+        await send({"type": "http.response.start", "status": code,
+                    "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in started["headers"]]})
+        while True:
+            if scope["method"] != "HEAD" and chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            if done or gone.is_set(): break
+            # a slow reader only delays this coroutine; the pool thread is free between chunks.
+            # Admitted responses are never cut off, so these hops skip the queue cap.
+            chunk, done = await loop.run_in_executor(wsgi_pool.pool, _wsgi_next, it)
+        if not gone.is_set(): await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        await loop.run_in_executor(wsgi_pool.pool, _close, result)
+
+# ---------- Native routes (on the event loop) ----------
+async def health(scope, receive, send):
+    head = scope["method"] == "HEAD"
+    await _respond(send, 200, b"" if head else b'{"status":"ok"}\n', "application/json")
+    return 200
+
+def _score_chunk(parser, text, eof, n):
+    # In the score pool: decode the records `text` completes and score them, numbering from n.
+    return [wsgi._api_line(n + i, rec) for i, rec in enumerate(parser.feed(text, eof=eof))]
+
+async def api_score(scope, receive, send):
+    # As in app.api_score, the status waits until the first API_READ_CHUNK bytes are decoded,
+    # so a malformed small body gets a 400 rather than an error line after a 200.
+    parser = wsgi._JsonRecords()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    n = received = 0
+    held, started = [], False
+    start = {"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]}
+    try:
+        while not parser.done:
+            msg = await receive()
+            if msg["type"] == "http.disconnect": return 200
+            eof = not msg.get("more_body")
+            body = msg.get("body", b"")
+            received += len(body)
+            lines = await score_pool.run(_score_chunk, parser, decoder.decode(body, final=eof), eof, n)
+            n += len(lines)
+            if not started:
+                held += lines
+                if received < wsgi.API_READ_CHUNK and not parser.done: continue
+                await send(start)
+                started, lines = True, held
+            if lines: await send({"type": "http.response.body", "body": "".join(lines).encode("utf-8"), "more_body": True})
+    except QueueFull as e:
+        if not started:
+            await _respond(send, 503, _json({"error": str(e)}), "application/json", headers=[("Retry-After", "1")])
+            return 503
+        await send({"type": "http.response.body", "body": _json({"error": str(e)}), "more_body": True})
+    except ValueError as e:
+        if not started:
+            await _respond(send, 400, _json({"error": str(e)}), "application/json")
+            return 400
+        await send({"type": "http.response.body", "body": _json({"error": str(e)}), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+    return 200
+
+async def index_post(scope, receive, send, body):
+    form = dict(reversed(parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True)))  # first value wins
+    # the save's append blocks while the writer is backed up, so saves take the CSV pool
+    pool = csv_pool if form.get("action") == "save_csv" else score_pool
+    try:
+        fd, errors, score, category, action, saved = await pool.run(
+            wsgi.handle_form, form.get, _header(scope, b"idempotency-key") or form.get("idempotency_key"))
+    except QueueFull as e:
+        await _respond(send, 503, str(e).encode(), headers=[("Retry-After", "1")])
+        return 503
+    if errors:
+        with wsgi.app.request_context(_environ(scope, b"")):
+            html = render_template("form.html", errors=errors, form=form)
+        await _respond(send, 400, html.encode("utf-8"), "text/html; charset=utf-8")
+        return 400
+
+    if action == "download_pdf":
+        try:
+            with wsgi.STAGE["pdf"].time():
+                pdf = await pdf_pool.run(generate_pdf, fd, score, category)
+        except QueueFull as e:
+            await _respond(send, 429, str(e).encode(), headers=[("Retry-After", "5")])
+            return 429
+        await _respond(send, 200, pdf.getvalue(), "application/pdf",
+                       headers=[("Content-Disposition", "attachment; filename=credit_report.pdf")])
+        return 200
+
+    status = 200
+    if saved is not None:
+        await asyncio.wait([asyncio.wrap_future(saved)], timeout=wsgi.SAVE_TIMEOUT)
+        status, fd["message"] = wsgi._save_result(saved)
+
+    with wsgi.STAGE["render"].time():
+        with wsgi.app.request_context(_environ(scope, b"")):
+            html = render_template("result.html", data=fd, score=score, category=category)
+    await _respond(send, status, html.encode("utf-8"), "text/html; charset=utf-8")
+    return status
+
+def _header(scope, name):
+    for k, v in scope.get("headers", ()):
+        if k == name: return v.decode("latin-1")
+    return None
+
+def _form_post(scope):
+    ctype = _header(scope, b"content-type") or ""
+    return ctype.split(";", 1)[0].strip().lower() == "application/x-www-form-urlencoded"
+
+# ---------- Application ----------
+async def _lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            metrics.registry.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            for pool in (pdf_pool, csv_pool, score_pool, wsgi_pool): pool.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan": return await _lifespan(receive, send)
+    if scope["type"] != "http": return
+    path, method = scope["path"], scope["method"]
+    if path == "/health" and method in ("GET", "HEAD"):
+        route, endpoint = health, "health"
+    elif path == "/api/score" and method == "POST":
+        route, endpoint = api_score, "api_score"
+    elif path == "/" and method == "POST" and _form_post(scope):
+        try:
+            body = await _read_body(receive, MAX_FORM_BYTES)
+        except ValueError as e:
+            return await _respond(send, 413, str(e).encode())
+        if body is None: return
+        route, endpoint = functools.partial(index_post, body=body), "index"
+    else:
+        # Flask's own hooks do the metrics for these
+        return await _call_flask(scope, receive, send)
+    metrics.registry.start()
+    wsgi.INFLIGHT.inc()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        status = await route(scope, receive, send)
+    finally:
+        wsgi.INFLIGHT.dec()
+        metrics.counter("credit_requests_total", "Responses by endpoint and status", endpoint=endpoint, status=status).inc()
+        metrics.histogram("credit_request_seconds", "Request handling time by endpoint (until the response is returned)",
+                          endpoint=endpoint).observe(time.perf_counter() - t0)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from scoring import (
+    SCORE_FIELDS, get_model, collateral_points, employment_points, income_points, macro_points,
+)
+
+# ---------- Vectorized scoring (bit-identical to scoring.evaluate_rules) ----------
+NUMERIC_FIELDS = {
+    "payment_history_score": np.float64,
+    "credit_utilization_ratio": np.float64,
+    "debt_to_income_ratio": np.float64,
+    "length_credit_history_years": np.int64,
+    "recent_inquiries_12m": np.int64,
+    "past_due_accounts": np.int64,
+    "open_credit_lines": np.int64,
+}
+TEXT_FIELDS = ("collateral_provided", "employment", "income_level", "macroeconomic_risk")
+
+def _text_lookup(values, fn, rules):
+    # Evaluate the keyword rule once per distinct string, then broadcast back.
+    values = np.asarray(values, dtype=object)
+    values = np.where(np.equal(values, None), "", values).astype(str)
+    uniq, inverse = np.unique(values, return_inverse=True)
+    table = np.array([fn(u, rules) for u in uniq], dtype=np.float64)
+    return table[inverse.reshape(values.shape)]
+
+def _history(years, rules):
+    tiers = rules["history_tiers"]
+    conds = [years >= lo for lo, _ in tiers]
+    return np.select(conds, [pts for _, pts in tiers], default=tiers[-1][1]).astype(np.float64)
+
+def _open_lines(lines, rules):
+    conds = [(lines >= lo) & ((lines <= hi) if hi is not None else True) for lo, hi, _ in rules["open_lines"]]
+    return np.select(conds, [pts for _, _, pts in rules["open_lines"]], default=0).astype(np.float64)
+
+def columns_from_records(records):
+    # records: iterable of dicts shaped like the `fd` dict built in app.index()
+    records = list(records)
+    cols = {}
+    for name, dtype in NUMERIC_FIELDS.items():
+        cols[name] = np.fromiter((r[name] for r in records), dtype=dtype, count=len(records))
+    for name in TEXT_FIELDS:
+        cols[name] = np.array([r[name] or "" for r in records], dtype=object)
+    return cols
+
+def score_batch(cols, rules=None):
+    """Score columnar input: a mapping of arrays or a structured array with SCORE_FIELDS.
+
+    Returns (scores: int64 array, categories: object array). Each step mirrors the
+    scalar path in the same order so floating-point results are identical. Uses the
+    current scoring model's rules unless a rule table is given.
+    """
+    if rules is None: rules = get_model().rules
+    names = cols.dtype.names if isinstance(cols, np.ndarray) else cols
+    missing = [f for f in SCORE_FIELDS if f not in names]
+    if missing:
+        raise KeyError("missing score fields: %s" % ", ".join(missing))
+    w = rules["weights"]
+    ph = np.asarray(cols["payment_history_score"], dtype=np.float64)
+    util = np.asarray(cols["credit_utilization_ratio"], dtype=np.float64)
+    dti = np.asarray(cols["debt_to_income_ratio"], dtype=np.float64)
+    years = np.asarray(cols["length_credit_history_years"])
+    inquiries = np.maximum(0, np.asarray(cols["recent_inquiries_12m"]))
+    past_due = np.maximum(0, np.asarray(cols["past_due_accounts"]))
+    lines = np.maximum(0, np.asarray(cols["open_credit_lines"]))
+
+    score = np.full(ph.shape, float(rules["base"]))
+    score += (ph/100.0)*w["payment_history"]
+    score += (np.fmax(0.0, 100.0 - util)/100.0)*w["utilization"]
+    score += _history(years, rules)
+    inq = rules["inquiries"]
+    score += np.maximum(0, inq["cap"] - np.minimum(inq["cap"], inquiries*inq["per"]))
+    score += (np.fmax(0.0, 100.0 - dti)/100.0)*w["dti"]
+    pd = rules["past_due"]
+    score -= np.minimum(pd["cap"], past_due*pd["per"])
+    score += _open_lines(lines, rules)
+    score += _text_lookup(cols["collateral_provided"], collateral_points, rules)
+    score += _text_lookup(cols["employment"], employment_points, rules)
+    score += _text_lookup(cols["income_level"], income_points, rules)
+    score += _text_lookup(cols["macroeconomic_risk"], macro_points, rules)
+
+    lo, hi = rules["bounds"]
+    scores = np.clip(np.round(score), lo, hi).astype(np.int64)
+    cutoffs = [upper for upper, _ in rules["categories"] if upper is not None]
+    names = np.array([c for _, c in rules["categories"]], dtype=object)
+    return scores, names[np.searchsorted(cutoffs, scores, side="right")]
@@ -0,0 +1,330 @@
+"""Benchmarks and load driver for the scoring, PDF and persistence paths.
+
+    python bench.py                          # micro-benchmarks + test-client load run, JSON to stdout
+    python bench.py --quick --out bench.json
+    python bench.py --gunicorn 1x1,2x2,2x4   # also load a local gunicorn per WORKERSxTHREADS config
+    python bench.py --gunicorn 2x2,2x2async --slow-clients 8   # sync vs SERVER_MODE=async, with slow uploaders
+
+All writes go to a temporary DATA_DIR, removed on exit; the real data/ directory is never touched.
+"""
+import os, sys, json, time, atexit, random, shutil, socket, argparse, platform, resource, tempfile, threading, subprocess, tracemalloc
+import http.client, urllib.parse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+EMPLOYMENTS = ["", "Full-time", "Part-time", "Self-employed", "Contract", "Informal", "Unemployed"]
+INCOMES = ["", "Low", "Medium", "High", "Upper middle", "<$500", ">$5000", "minimum wage", "above average"]
+MACROS = ["Low", "Medium", "High", ""]
+COLLATERALS = ["", "None", "N/A", "na", "House", "Vehicle"]
+
+# ---------- Synthetic applicants ----------
+def synthetic_applicants(n, seed=42):
+    """Yield n form dicts (raw strings, as the HTML form posts them).
+
+    Employment x income x macro combinations are cycled so every keyword branch is hit;
+    numerics cover all history tiers, open-line bands and the zero-denominator cases.
+    """
+    rnd = random.Random(seed)
+    combos = [(e, i, m) for e in EMPLOYMENTS for i in INCOMES for m in MACROS]
+    for k in range(n):
+        emp, inc, macro = combos[k % len(combos)]
+        limit = rnd.choice([0, 500, 1000, 5000, 20000])
+        payments = rnd.choice([0, 12, 60, 100])
+        income = rnd.choice([0, 800, 2500, 10000])
+        yield {
+            "full_name": "Applicant %d" % k,
+            "dob": "19%02d-%02d-%02d" % (rnd.randint(50, 99), rnd.randint(1, 12), rnd.randint(1, 28)),
+            "national_id": "ID%08d" % rnd.randint(0, 99999999),
+            "current_address": "%d Example Street, District %d, Some City" % (rnd.randint(1, 999), rnd.randint(1, 40)),
+            "phone_number": "+1555%07d" % rnd.randint(0, 9999999),
+            "employment": emp,
+            "employer": rnd.choice(["", "Acme Ltd", "Self", "Gov"]),
+            "income_level": inc,
+            "total_credit_limit": str(limit),
+            "total_credit_balance": str(round(limit * rnd.uniform(0, 1.3), 2)),
+            "on_time_payments": str(rnd.randint(0, payments)),
+            "total_payments": str(payments),
+            "monthly_debt_payments": str(round(income * rnd.uniform(0, 0.9), 2)),
+            "gross_monthly_income": str(income),
+            "open_credit_lines": str(rnd.choice([0, 1, 4, 8, 10, 12, 13, 20])),
+            "past_due_accounts": str(rnd.choice([0, 0, 1, 2, 5])),
+            "length_credit_history": str(rnd.choice([0, 1, 2, 4, 5, 9, 10, 25])),
+            "recent_inquiries": str(rnd.choice([0, 1, 3, 5, 8])),
+            "collateral_provided": rnd.choice(COLLATERALS),
+            "account_types": rnd.choice(["", "Mobile Money Loan", "Mobile Money Loan, Local Store Credit, Credit Card"]),
+            "macroeconomic_risk": macro,
+        }
+
+# ---------- Measurement helpers ----------
+def _pct(sorted_vals, p):
+    if not sorted_vals: return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+def summarize(latencies, elapsed):
+    lat = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000.0, 4)
+    return {
+        "n": len(lat),
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(len(lat) / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+        "p50_ms": ms(_pct(lat, 50)), "p95_ms": ms(_pct(lat, 95)), "p99_ms": ms(_pct(lat, 99)),
+        "max_ms": ms(lat[-1]) if lat else None,
+    }
+
+def maxrss_kb(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss  # KiB on Linux
+
+def timed(fn, items, repeat=1):
+    lats = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for it in items:
+            s = time.perf_counter()
+            fn(it)
+            lats.append(time.perf_counter() - s)
+    out = summarize(lats, time.perf_counter() - t0)
+    out["maxrss_kb"] = maxrss_kb()
+    return out
+
+def _retained_bytes(fn, items):
+    # Memory held by the results of fn over items, per item (tracemalloc).
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [fn(it) for it in items]
+    grown = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    del kept
+    return round(grown / max(1, len(items)), 1)
+
+# ---------- Micro-benchmarks ----------
+def micro(app, n):
+    import scoring, pdf_report, record_store, applicant
+    forms = list(synthetic_applicants(n))
+    fds = []
+    for f in forms:
+        fd, _ = applicant.parse(f.get)
+        app._apply_ratios(fd)
+        fds.append(fd)
+    model = scoring.get_model()
+    results = {}
+    results["parse_applicant"] = timed(lambda f: applicant.parse(f.get), forms, repeat=5)
+    results["parse_applicant"]["bytes_per_record"] = _retained_bytes(lambda f: applicant.parse(f.get), forms)
+    results["apply_ratios"] = timed(lambda fd: app._apply_ratios(dict(fd)), fds, repeat=5)
+    results["calculate_credit_score"] = timed(model.score, fds, repeat=5)
+    results["evaluate_rules_reference"] = timed(lambda fd: scoring.evaluate_rules(fd, model.rules), fds, repeat=5)
+    try:
+        import batch_scoring
+        cols = batch_scoring.columns_from_records(fds)
+        t0 = time.perf_counter()
+        batch_scoring.score_batch(cols)
+        el = time.perf_counter() - t0
+        results["score_batch"] = {"n": len(fds), "seconds": round(el, 6), "rows_per_sec": round(len(fds) / el, 1) if el else None,
+                                  "maxrss_kb": maxrss_kb()}
+    except ImportError as e:
+        results["score_batch"] = {"skipped": str(e)}
+    scored = [(fd,) + tuple(model.score(fd)) for fd in fds]
+    tpl = pdf_report.get_template()
+    pdf_n = scored[:max(1, min(len(scored), 200))]
+    results["generate_pdf_uncached"] = timed(lambda r: tpl.render(r[0], r[1], r[2], "2025-01-01 00:00 UTC"), pdf_n)
+    pdf_report.report_cache.clear()
+    warm = pdf_n[:max(1, min(len(pdf_n), pdf_report.report_cache.max_entries // 2))]
+    for r in warm: pdf_report.render_pdf(*r)
+    results["generate_pdf_cached"] = timed(lambda r: pdf_report.render_pdf(*r), warm, repeat=5)
+    store = record_store.get_store(app.CSV_PATH, app.CSV_HEADER)
+    row_n = scored * max(1, 20000 // len(scored))
+    results["append_csv_enqueue"] = timed(lambda r: app._append_csv(app.CSV_PATH, r[0], r[1], r[2], model.version), row_n)
+    t0 = time.perf_counter()
+    store.flush()
+    results["append_csv_drain"] = {"rows": len(row_n), "seconds": round(time.perf_counter() - t0, 4)}
+    import recent_saves
+    dedup = recent_saves.RecentSaves(Path(app.DATA_DIR) / "bench_saves.idx", window=600)
+    keys = [recent_saves.save_keys(r[0]["national_id"], app._csv_row(*r, model.version)[1:]) for r in scored]
+    results["save_dedup_seen"] = timed(dedup.seen, keys, repeat=5)  # first pass records, the rest are duplicates
+    dedup.close()
+    return results
+
+# ---------- End-to-end load ----------
+ACTIONS = ("preview", "download_pdf", "save_csv")
+
+def _run_load(send, forms, requests, concurrency, actions):
+    lats = {a: [] for a in actions}
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    def worker():
+        conn_state = {}
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None: return
+            action = actions[i % len(actions)]
+            form = dict(forms[i % len(forms)], action=action)
+            s = time.perf_counter()
+            ok = send(conn_state, form)
+            el = time.perf_counter() - s
+            with lock:
+                lats[action].append(el)
+                if not ok: errors[0] += 1
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - t0
+    out = {"requests": requests, "concurrency": concurrency, "errors": errors[0],
+           "overall": summarize([v for a in actions for v in lats[a]], elapsed)}
+    out["by_action"] = {a: summarize(lats[a], elapsed) for a in actions}
+    return out
+
+def load_test_client(app, requests, concurrency):
+    forms = list(synthetic_applicants(256, seed=7))
+    client = app.app.test_client()
+    def send(_state, form):
+        r = client.post("/", data=form)
+        r.close()
+        return r.status_code == 200
+    out = _run_load(send, forms, requests, concurrency, ACTIONS)
+    out["driver"] = "flask-test-client"
+    out["maxrss_kb"] = maxrss_kb()
+    return out
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _children_hwm_kb(pid):
+    # Peak RSS (VmHWM) of gunicorn's worker processes, Linux only.
+    total = []
+    try:
+        for task in os.listdir("/proc/%d/task" % pid):
+            with open("/proc/%d/task/%s/children" % (pid, task)) as f:
+                for child in f.read().split():
+                    with open("/proc/%s/status" % child) as st:
+                        for line in st:
+                            if line.startswith("VmHWM:"): total.append(int(line.split()[1]))
+    except OSError:
+        return None
+    return total
+
+def _slow_uploader(port, stop):
+    # Streams an NDJSON body to /api/score one record per second, like a client on a poor link.
+    record = (json.dumps(dict(next(synthetic_applicants(1, seed=3)))) + "\n").encode("utf-8")
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=120) as s:
+            s.sendall(b"POST /api/score HTTP/1.1\r\nHost: bench\r\nContent-Type: application/x-ndjson\r\n"
+                      b"Transfer-Encoding: chunked\r\n\r\n")
+            while not stop.wait(1.0):
+                s.sendall(b"%x\r\n%s\r\n" % (len(record), record))
+            s.sendall(b"0\r\n\r\n")
+            s.settimeout(5)
+            s.recv(65536)
+    except OSError:
+        pass
+
+def load_gunicorn(workers, threads, requests, concurrency, env, asgi=False, slow_clients=0):
+    port = _free_port()
+    target = ["asgi:app", "--worker-class", "uvicorn_worker.UvicornWorker"] if asgi else ["app:app"]
+    cmd = [sys.executable, "-m", "gunicorn"] + target + ["--bind", "127.0.0.1:%d" % port,
+           "--workers", str(workers), "--threads", str(threads), "--timeout", "120", "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=str(ROOT_DIR), env=env)
+    stop = threading.Event()
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                c = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+                c.request("GET", "/health"); c.getresponse().read(); c.close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            return {"error": "gunicorn did not start"}
+        slow = [threading.Thread(target=_slow_uploader, args=(port, stop), daemon=True) for _ in range(slow_clients)]
+        for t in slow: t.start()
+        time.sleep(0.5 if slow else 0)
+        forms = list(synthetic_applicants(256, seed=7))
+        def send(state, form):
+            conn = state.get("c")
+            if conn is None:
+                conn = state["c"] = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            body = urllib.parse.urlencode(form)
+            try:
+                conn.request("POST", "/", body=body, headers={"Content-Type": "application/x-www-form-urlencoded"})
+                r = conn.getresponse()
+                r.read()
+                return r.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close(); state.pop("c", None)
+                return False
+        out = _run_load(send, forms, requests, concurrency, ACTIONS)
+        out.update({"driver": "gunicorn", "mode": "async" if asgi else "sync", "workers": workers, "threads": threads,
+                    "slow_clients": slow_clients, "worker_vmhwm_kb": _children_hwm_kb(proc.pid)})
+        return out
+    finally:
+        stop.set()
+        proc.terminate()
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=str(ROOT_DIR), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--quick", action="store_true", help="smaller sample sizes")
+    ap.add_argument("--n", type=int, help="applicants for micro-benchmarks")
+    ap.add_argument("--requests", type=int, help="requests per load run")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--gunicorn", default="", help="comma-separated WORKERSxTHREADS configs, e.g. 2x2,4x2; "
+                    "append 'async' (2x2async) to serve asgi:app with uvicorn workers")
+    ap.add_argument("--slow-clients", type=int, default=0, help="slow /api/score uploaders kept open during gunicorn runs")
+    ap.add_argument("--skip-micro", action="store_true")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+    n = args.n or (500 if args.quick else 5000)
+    requests = args.requests or (150 if args.quick else 1500)
+
+    tmp = tempfile.mkdtemp(prefix="credit-bench-")
+    # registered before app is imported, so it runs after app's own exit hooks (store, metrics, analytics)
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    env = dict(os.environ, DATA_DIR=tmp, RECORDS_DB=os.path.join(tmp, "records.db"),
+               REPORT_SPOOL_DIR=os.path.join(tmp, "spool"), METRICS_DIR=os.path.join(tmp, "metrics"),
+               SAVE_DEDUP_WINDOW="0")  # the load cycles through 256 applicants; write every save
+    os.environ.update(env)
+    sys.path.insert(0, str(ROOT_DIR))
+    import app
+
+    report = {
+        "commit": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    if not args.skip_micro:
+        report["micro"] = micro(app, n)
+    report["load"] = [load_test_client(app, requests, args.concurrency)]
+    for cfg in filter(None, (c.strip() for c in args.gunicorn.split(","))):
+        asgi = cfg.endswith("async")
+        w, _, t = cfg[:-len("async")].partition("x") if asgi else cfg.partition("x")
+        report["load"].append(load_gunicorn(int(w), int(t or 1), requests, max(args.concurrency, int(w) * int(t or 1) * 2), env,
+                                            asgi, args.slow_clients))
+    report["maxrss_kb"] = maxrss_kb()
+    report["children_maxrss_kb"] = maxrss_kb(resource.RUSAGE_CHILDREN)
+
+    data = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(data + "\n", encoding="utf-8")
+    else:
+        print(data)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import io, os, re, csv, zlib, fcntl, hashlib, datetime
+
+CHUNK_SIZE = 64 * 1024
+
+# ---------- Streaming export helpers for the append-only records file ----------
+def snapshot(path):
+    # (inode, size) of the file at a batch boundary: the shared lock waits out any in-flight group commit.
+    with open(path, "rb") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        try:
+            st = os.fstat(f.fileno())
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return st.st_ino, st.st_size
+
+def snapshot_etag(ino, size, variant=""):
+    # Append-only file: inode + size pin the content exactly.
+    tag = "%x-%x" % (ino, size)
+    if variant:
+        tag += "-" + hashlib.sha1(variant.encode("utf-8")).hexdigest()[:16]
+    return tag
+
+_YEAR_MONTH = re.compile(r"\d{4}(-\d{2})?")
+
+def timestamp_bound(value):
+    """A from/to filter value as a saved timestamp (naive UTC isoformat), so string and numeric comparisons agree.
+
+    Accepts anything datetime.fromisoformat does plus the "2025" and "2025-01" prefixes; an explicit
+    UTC offset is converted. Raises ValueError otherwise."""
+    if value is None: return None
+    v = value.strip()
+    if _YEAR_MONTH.fullmatch(v): v += "-01-01"[len(v) - 4:]
+    d = datetime.datetime.fromisoformat(v)
+    if d.tzinfo is not None: d = d.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return d.isoformat()
+
+class _Bounded(io.RawIOBase):
+    def __init__(self, f, limit):
+        self._f, self._left = f, limit
+    def readable(self):
+        return True
+    def readinto(self, b):
+        if self._left <= 0: return 0
+        n = self._f.readinto(memoryview(b)[:min(len(b), self._left)])
+        self._left -= n
+        return n
+    def close(self):
+        self._f.close()
+        super().close()
+
+def iter_bytes(path, start, stop):
+    # Raw bytes [start, stop) of the file.
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = stop - start
+        while left > 0:
+            chunk = f.read(min(CHUNK_SIZE, left))
+            if not chunk: break
+            left -= len(chunk)
+            yield chunk
+
+def read_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+def iter_rows(path, size, since=None, until=None, categories=None, columns=None):
+    """Rows (lists of str) of the file's first `size` bytes within [since, until) and in `categories`,
+    projected to `columns` ("" for a column this file does not have)."""
+    with io.TextIOWrapper(io.BufferedReader(_Bounded(open(path, "rb"), size)), encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None: return
+        pos = {name: i for i, name in enumerate(header)}
+        proj = [pos.get(c) for c in columns] if columns else list(range(len(header)))
+        ts_i, cat_i = pos.get("timestamp"), pos.get("category")
+        for row in reader:
+            if len(row) < len(header): continue
+            if ts_i is not None:
+                ts = row[ts_i]
+                if since is not None and ts < since: continue
+                if until is not None and ts >= until: continue
+            if categories is not None and cat_i is not None and row[cat_i] not in categories: continue
+            yield [row[i] if i is not None else "" for i in proj]
+
+def encode_rows(header, rows):
+    """Encoded CSV chunks: the header line, then the rows."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if out.tell() >= CHUNK_SIZE:
+            yield out.getvalue().encode("utf-8")
+            out.seek(0); out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+def gzip_chunks(chunks, level=6):
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data: yield data
+    yield comp.flush()
@@ -0,0 +1,87 @@
+import os, sys, time, threading
+from pathlib import Path
+
+DEBUG_TTL = float(os.environ.get("DEBUG_TTL", "10"))
+DEBUG_MAX_ENTRIES = int(os.environ.get("DEBUG_MAX_ENTRIES", "200"))
+DEBUG_MAX_DEPTH = int(os.environ.get("DEBUG_MAX_DEPTH", "2"))
+
+STARTED = time.time()
+
+# ---------- Bounded directory listings ----------
+def list_dir(path, max_entries=DEBUG_MAX_ENTRIES):
+    # Names and sizes of at most max_entries entries; never recurses.
+    path = Path(path)
+    out = {"path": str(path), "exists": path.is_dir(), "entries": [], "truncated": False}
+    if not out["exists"]: return out
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if len(out["entries"]) >= max_entries:
+                    out["truncated"] = True
+                    break
+                out["entries"].append(_entry(entry))
+    except OSError as e:
+        out["error"] = str(e)
+    out["entries"].sort(key=lambda e: e["name"])
+    return out
+
+def tree(root, max_depth=DEBUG_MAX_DEPTH, max_entries=DEBUG_MAX_ENTRIES):
+    # Breadth-first, like os.walk(topdown) cut at max_depth, but stops after max_entries in total.
+    out, budget, pending = [], max_entries, [(Path(root), 0)]
+    while pending and budget > 0:
+        d, depth = pending.pop(0)
+        node = {"root": str(d), "dirs": [], "files": []}
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if budget <= 0:
+                        node["truncated"] = True
+                        break
+                    budget -= 1
+                    if entry.is_dir(follow_symlinks=False):
+                        node["dirs"].append(entry.name)
+                        if depth < max_depth: pending.append((Path(entry.path), depth + 1))
+                    else:
+                        node["files"].append(entry.name)
+        except OSError as e:
+            node["error"] = str(e)
+        out.append(node)
+    return {"nodes": out, "truncated": bool(pending) or budget <= 0}
+
+def _entry(entry):
+    try:
+        if entry.is_dir(follow_symlinks=False): return {"name": entry.name, "dir": True}
+        return {"name": entry.name, "size": entry.stat(follow_symlinks=False).st_size}
+    except OSError:
+        return {"name": entry.name}
+
+def process_info():
+    return {"pid": os.getpid(), "ppid": os.getppid(), "started_at": STARTED,
+            "uptime_seconds": round(time.time() - STARTED, 1), "threads": threading.active_count(),
+            "python": sys.version.split()[0]}
+
+# ---------- TTL-cached snapshot ----------
+class Snapshot:
+    """Result of `build()` reused for `ttl` seconds; one caller rebuilds, the others get the old copy."""
+    def __init__(self, build, ttl=DEBUG_TTL):
+        self.build = build
+        self.ttl = ttl
+        self._value = None
+        self._built = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._value is None or now - self._built >= self.ttl:
+            # the first caller waits; afterwards a concurrent refresh is never waited on
+            if self._lock.acquire(blocking=self._value is None):
+                try:
+                    if self._value is None or time.monotonic() - self._built >= self.ttl:
+                        self._value = self.build()
+                        self._built = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self._value, round(time.monotonic() - self._built, 3)
+
+    def invalidate(self):
+        self._built = 0.0
@@ -0,0 +1,7 @@
+# Read by gunicorn from the working directory (Procfile and bench.py start it from the repo root).
+
+def on_starting(server):
+    # Runs once in the master before any worker: counts from the previous run of this
+    # deployment must not be summed into the new one.
+    import metrics
+    metrics.registry.clear()
@@ -0,0 +1,281 @@
+import os, sys, json, time, fcntl, atexit, bisect, threading
+from pathlib import Path
+
+# per deployment: next to its data unless set; gunicorn.conf.py clears it when the master starts
+METRICS_DIR = Path(os.environ.get("METRICS_DIR") or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+                   or Path(os.environ.get("DATA_DIR", Path(__file__).resolve().parent / "data")) / "metrics")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+# seconds; covers a cached PDF (~50us) up to a slow batch request
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE = "archive.json"
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+# ---------- Metric types (per process; updates take one lock) ----------
+class Counter:
+    __slots__ = ("value", "_lock")
+    def __init__(self, lock):
+        self.value = 0.0
+        self._lock = lock
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+class Gauge:
+    __slots__ = ("value", "fn", "_lock")
+    def __init__(self, lock, fn=None):
+        self.value = 0.0
+        self.fn = fn  # sampled at snapshot time if set
+        self._lock = lock
+    def set(self, v):
+        self.value = v
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+    def dec(self, n=1):
+        with self._lock:
+            self.value -= n
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+    def __init__(self, lock, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = lock
+    def observe(self, v):
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ("h", "t0")
+    def __init__(self, h):
+        self.h = h
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        self.h.observe(time.perf_counter() - self.t0)
+
+# ---------- Registry: per-pid snapshot files, summed across workers at scrape time ----------
+class Registry:
+    """Metrics for this process, written to <dir>/<pid>-<start>.json so any gunicorn worker
+    answering /metrics can sum counters and histograms over all workers (including ones that
+    have exited). Gauges describe live state and are reported per pid for running workers only.
+    """
+    def __init__(self, directory=METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.dir = Path(directory)
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._meta = {}    # name -> (type, help)
+        self._series = {}  # (name, labels key) -> metric
+        self._pid = None
+        self._file = None
+
+    def _get(self, kind, cls, name, help, labels, *args):
+        key = (name, _labels_key(labels))
+        m = self._series.get(key)
+        if m is None:
+            with self._lock:
+                m = self._series.get(key)
+                if m is None:
+                    self._meta.setdefault(name, (kind, help))
+                    m = self._series[key] = cls(self._lock, *args)
+        return m
+
+    def counter(self, name, help="", **labels):
+        return self._get("counter", Counter, name, help, labels)
+
+    def gauge(self, name, help="", fn=None, **labels):
+        return self._get("gauge", Gauge, name, help, labels, fn)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get("histogram", Histogram, name, help, labels, buckets)
+
+    def start(self):
+        # (Re)start the flush thread after fork; cheap enough to call per request.
+        if self._pid == os.getpid(): return
+        with self._lock:
+            if self._pid == os.getpid(): return
+            if self._pid is not None:
+                # forked child: inherited values belong to the parent's file
+                for m in self._series.values():
+                    if isinstance(m, Histogram): m.counts = [0] * len(m.counts); m.sum = 0.0
+                    else: m.value = 0.0
+            self._pid = os.getpid()
+            self._file = self.dir / ("%d-%d.json" % (self._pid, time.time_ns() // 1000000))
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        pid = self._pid
+        tick = threading.Event()  # never set; Event.wait reads as idle to the sampling profiler
+        while self._pid == pid:
+            tick.wait(self.flush_seconds)
+            self.write()
+
+    def snapshot(self):
+        out = {"pid": os.getpid(), "written": time.time(), "counters": [], "gauges": [], "histograms": []}
+        for (name, labels), m in list(self._series.items()):
+            if isinstance(m, Histogram):
+                with self._lock:
+                    counts, total = list(m.counts), m.sum
+                out["histograms"].append([name, labels, m.buckets, counts, total])
+            elif isinstance(m, Gauge):
+                try:
+                    value = m.fn() if m.fn is not None else m.value
+                except Exception as e:
+                    print("[metrics] gauge %s failed: %s" % (name, e), file=sys.stderr)
+                    continue
+                out["gauges"].append([name, labels, value])
+            else:
+                out["counters"].append([name, labels, m.value])
+        return out
+
+    def write(self):
+        if self._file is None: return
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            tmp = self._file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+            os.replace(tmp, self._file)
+        except OSError as e:
+            print("[metrics] snapshot write failed: %s" % e, file=sys.stderr)
+
+    def collect(self):
+        # Sum every worker's snapshot; fold files of exited workers into one archive file.
+        self.start()
+        self.write()
+        counters, hists, gauges = {}, {}, []
+        stale_after = max(30.0, 3 * self.flush_seconds)
+        now = time.time()
+        try:
+            lock_fd = os.open(self.dir / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            print("[metrics] cannot open %s: %s" % (self.dir, e), file=sys.stderr)
+            return _merge([self.snapshot()], counters, hists), gauges
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            archive = _load(self.dir / ARCHIVE) or {"counters": [], "histograms": []}
+            dead = []
+            for p in self.dir.glob("*-*.json"):
+                snap = _load(p)
+                if snap is None: continue
+                if not _alive(snap.get("pid")):
+                    dead.append((p, snap))
+                    continue
+                _merge([snap], counters, hists)
+                # a recycled pid keeps an old file "alive"; its gauges stop updating, so drop them
+                if now - snap.get("written", 0) < stale_after:
+                    gauges += [[name, labels + [["pid", str(snap["pid"])]], v] for name, labels, v in snap["gauges"]]
+            if dead:
+                arch_c, arch_h = {}, {}
+                _merge([archive] + [s for _, s in dead], arch_c, arch_h)
+                archive = _unmerge(arch_c, arch_h)
+                tmp = self.dir / (ARCHIVE + ".tmp")
+                tmp.write_text(json.dumps(archive), encoding="utf-8")
+                os.replace(tmp, self.dir / ARCHIVE)
+                for p, _ in dead: p.unlink(missing_ok=True)
+            _merge([archive], counters, hists)
+        except OSError as e:
+            print("[metrics] collect failed: %s" % e, file=sys.stderr)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+        return (counters, hists), gauges
+
+    def clear(self):
+        # Drop every snapshot and the archive: called by the server's master before workers start,
+        # so a new deployment does not sum counts left by the previous one.
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            lock_fd = os.open(self.dir / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            print("[metrics] cannot open %s: %s" % (self.dir, e), file=sys.stderr)
+            return
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            for p in list(self.dir.glob("*.json")) + list(self.dir.glob("*.tmp")):
+                p.unlink(missing_ok=True)
+        except OSError as e:
+            print("[metrics] clear failed: %s" % e, file=sys.stderr)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def render(self):
+        (counters, hists), gauges = self.collect()
+        by_name = {}
+        for (name, labels), v in counters.items(): by_name.setdefault(name, []).append(("", labels, v))
+        for (name, labels), (buckets, counts, total) in hists.items():
+            acc = 0
+            for le, c in zip(list(buckets) + ["+Inf"], counts):
+                acc += c
+                by_name.setdefault(name, []).append(("_bucket", labels + (("le", _fmt(le)),), acc))
+            by_name[name].append(("_sum", labels, total))
+            by_name[name].append(("_count", labels, acc))
+        for name, labels, v in gauges: by_name.setdefault(name, []).append(("", tuple(map(tuple, labels)), v))
+        lines = []
+        for name in sorted(by_name):
+            kind, help = self._meta.get(name, ("untyped", ""))
+            if help: lines.append("# HELP %s %s" % (name, help))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for suffix, labels, v in by_name[name]:
+                lab = ",".join('%s="%s"' % (k, str(val).replace("\\", "\\\\").replace('"', '\\"')) for k, val in labels)
+                lines.append("%s%s%s %s" % (name, suffix, "{%s}" % lab if lab else "", _fmt(v)))
+        return "\n".join(lines) + "\n"
+
+def _fmt(v):
+    if isinstance(v, str): return v
+    v = float(v)
+    if v != v: return "NaN"
+    if v in (float("inf"), float("-inf")): return "+Inf" if v > 0 else "-Inf"
+    return str(int(v)) if v.is_integer() else repr(v)
+
+def _load(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _alive(pid):
+    if not isinstance(pid, int): return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _merge(snaps, counters, hists):
+    for snap in snaps:
+        for name, labels, v in snap.get("counters", ()):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + v
+        for name, labels, buckets, counts, total in snap.get("histograms", ()):
+            key = (name, tuple(map(tuple, labels)))
+            cur = hists.get(key)
+            if cur is None:
+                hists[key] = (tuple(buckets), list(counts), total)
+            elif cur[0] == tuple(buckets):
+                hists[key] = (cur[0], [a + b for a, b in zip(cur[1], counts)], cur[2] + total)
+    return counters, hists
+
+def _unmerge(counters, hists):
+    return {"counters": [[n, l, v] for (n, l), v in counters.items()],
+            "histograms": [[n, l, b, c, s] for (n, l), (b, c, s) in hists.items()]}
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+@atexit.register
+def _final_write():
+    # keep an exiting worker's counts
+    if registry._pid == os.getpid(): registry.write()
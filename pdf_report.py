@@ -0,0 +1,285 @@
+import io, os, json, time, hashlib, datetime, threading
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit, ImageReader
+from reportlab.lib import colors
+from reportlab import rl_config
+
+import metrics
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+PDF_CACHE_SIZE = int(os.environ.get("PDF_CACHE_SIZE", "128"))
+PDF_CACHE_BYTES = int(os.environ.get("PDF_CACHE_MB", "32")) * 1024 * 1024
+PDF_CACHE_TTL = float(os.environ.get("PDF_CACHE_TTL", "300"))
+LOGO_DPI = int(os.environ.get("PDF_LOGO_DPI", "300"))
+MAX_LAYOUTS = 256
+
+# Binary streams: ASCII85 only makes them 25% bigger, and without ReportLab's C accelerator it
+# is the slowest step of embedding the logo.
+rl_config.useA85 = 0
+
+# (section title, left column, right column); each field is (label, form_data key, format)
+SECTIONS = [
+    ("Identity",
+        [("Full Name", "full_name", None), ("Date of Birth", "dob", None),
+         ("National ID", "national_id", None), ("Phone Number", "phone_number", None)],
+        [("Current Address", "current_address", None)]),
+    ("Employment & Income",
+        [("Employment", "employment", None), ("Employer", "employer", None)],
+        [("Income Level", "income_level", None)]),
+    ("Calculated Metrics",
+        [("Credit Utilization Ratio (%)", "credit_utilization_ratio", "{:.1f}"),
+         ("Payment History Score (%)", "payment_history_score", "{:.1f}")],
+        [("Debt-to-Income Ratio (%)", "debt_to_income_ratio", "{:.1f}")]),
+    ("Credit File Details",
+        [("Open Credit Lines", "open_credit_lines", None), ("Past Due Accounts", "past_due_accounts", None),
+         ("Length of Credit History (years)", "length_credit_history_years", None)],
+        [("Recent Credit Inquiries (12m)", "recent_inquiries_12m", None),
+         ("Collateral Provided", "collateral_provided", None), ("Account Types", "account_types", None)]),
+]
+LAYOUT = SECTIONS + [("Macroeconomic Risk", [("Adjustment", "macroeconomic_risk", None)], [])]
+LAYOUT_FIELDS = tuple(f for _, left, right in LAYOUT for f in left + right)
+REPORT_FIELDS = tuple(key for _, key, _ in LAYOUT_FIELDS)
+LEADING = 13
+
+# ---------- Per-process page template: geometry, colours, the logo and the static layout ----------
+def _load_logo(path, box_w, box_h):
+    # Decoded once per process, scaled down to LOGO_DPI at its printed size, flattened onto the
+    # white page and kept as JPEG: drawImage embeds JPEG data as it is, where any other format
+    # would be zlib-compressed again for every document.
+    img = Image.open(path)
+    img.load()
+    img.thumbnail((max(1, round(box_w / 72 * LOGO_DPI)), max(1, round(box_h / 72 * LOGO_DPI))))
+    img = img.convert("RGBA")
+    flat = Image.new("RGB", img.size, "white")
+    flat.paste(img, mask=img.getchannel("A"))
+    buf = io.BytesIO()
+    flat.save(buf, "JPEG", quality=95)
+    buf.seek(0)
+    return ImageReader(buf)
+
+class PageTemplate:
+    """Everything about a report page that does not depend on the applicant.
+
+    The labels, section titles, rules, title and logo of a page only move when a value wraps
+    onto more lines, so their positions are planned once per process for each shape (lines per
+    value) and drawn into a form XObject that every page of a document with that shape reuses.
+    A page then only draws the score banner, the values and the footer.
+    """
+    def __init__(self, logo_path=None):
+        self.w, self.h = A4
+        self.margin = 18*mm
+        self.x_left = self.margin
+        self.x_right = self.w - self.margin
+        self.top = self.h - self.margin
+        col_gap = 12
+        self.col_w = (self.x_right - self.x_left - col_gap)/2.0
+        self.x_col2 = self.x_left + self.col_w + col_gap
+        self.label_w = 52*mm
+        self.value_w = self.col_w - self.label_w
+        self.accent = colors.HexColor("#2f6fed")
+        self.rule = colors.HexColor("#cbd2e6")
+        self.muted = colors.HexColor("#666666")
+        logo_path = Path(logo_path) if logo_path else STATIC_DIR / "logo.png"
+        self.logo = None
+        self.logo_failed = False
+        if logo_path.exists():
+            try:
+                box_w = 50*mm; box_h = 18*mm
+                self.logo = _load_logo(logo_path, box_w, box_h)
+                iw, ih = self.logo.getSize()
+                ratio = min(box_w/iw, box_h/ih)
+                lw = iw * ratio; lh = ih * ratio
+                self.logo_box = ((self.w - lw)/2, self.top - lh, lw, lh)
+            except Exception:
+                self.logo = None
+                self.logo_failed = True
+        y = self.top
+        if self.logo is not None: y -= self.logo_box[3] + 6*mm
+        elif self.logo_failed: y -= 2*mm
+        self.title_y = y
+        self.banner_y = y - 10*mm
+        self._layouts = {}
+
+    def layout(self, shape):
+        """(form name, value positions) for a page whose values wrap onto `shape` lines each."""
+        plan = self._layouts.get(shape)
+        if plan is not None: return plan
+        y = self.banner_y - 7*mm
+        labels, values = [], []
+        lines = iter(shape)
+        for title, left, right in LAYOUT:
+            labels.append((None, title, y))
+            y -= 6*mm
+            y_r = y
+            for label, _, _ in left:
+                labels.append((self.x_left, label, y))
+                values.append((self.x_left + self.label_w, y))
+                y -= LEADING * next(lines)
+            for label, _, _ in right:
+                labels.append((self.x_col2, label, y_r))
+                values.append((self.x_col2 + self.label_w, y_r))
+                y_r -= LEADING * next(lines)
+            y = min(y, y_r) - 6*mm
+        name = "report-layout-" + hashlib.sha1(repr(shape).encode()).hexdigest()[:12]
+        if len(self._layouts) >= MAX_LAYOUTS: self._layouts.clear()
+        plan = self._layouts[shape] = (name, labels, values)
+        return plan
+
+    def _draw_static(self, c, labels):
+        if self.logo is not None:
+            x, y, lw, lh = self.logo_box
+            c.drawImage(self.logo, x, y, lw, lh, preserveAspectRatio=True, mask="auto")
+        c.setFont("Helvetica-Bold", 16)
+        c.drawCentredString(self.w/2, self.title_y, "Credit Scoring Report")
+        for x, text, y in labels:
+            if x is None:
+                c.setFont("Helvetica-Bold", 12)
+                c.drawString(self.x_left, y, text)
+                c.setStrokeColor(self.rule)
+                c.line(self.x_left, y - 1*mm, self.x_right, y - 1*mm)
+            else:
+                c.setFont("Helvetica-Bold", 11)
+                c.drawString(x, y, f"{text}:")
+
+    def render(self, form_data, score, category, generated):
+        return self.render_pages([(form_data, score, category)], generated)
+
+    def render_pages(self, reports, generated):
+        # One PDF, one page per (form_data, score, category).
+        buf = io.BytesIO()
+        c = canvas.Canvas(buf, pagesize=A4)
+        for form_data, score, category in reports:
+            self.draw_page(c, form_data, score, category, generated)
+            c.showPage()
+        c.save()
+        return buf.getvalue()
+
+    def draw_page(self, c, form_data, score, category, generated):
+        wrapped = []
+        for _, key, fmt in LAYOUT_FIELDS:
+            value = fmt.format(form_data[key]) if fmt else str(form_data[key])
+            wrapped.append(simpleSplit(value, "Helvetica", 11, self.value_w))
+        name, labels, values = self.layout(tuple(map(len, wrapped)))
+        if not c.hasForm(name):
+            c.beginForm(name)
+            self._draw_static(c, labels)
+            c.endForm()
+        c.doForm(name)
+
+        # Score banner
+        c.setFillColor(self.accent)
+        c.setFont("Helvetica-Bold", 13)
+        c.drawString(self.x_left, self.banner_y, f"Score: {score}  ({category})    Range: 300–850")
+        c.setFillColor(colors.black)
+
+        c.setFont("Helvetica", 11)
+        for (x, y), lines in zip(values, wrapped):
+            for line in lines:
+                c.drawString(x, y, line)
+                y -= LEADING
+
+        # Footer / timestamp
+        c.setFont("Helvetica", 9)
+        c.setFillColor(self.muted)
+        c.drawRightString(self.x_right, self.margin, "Generated: " + generated)
+        c.setFillColor(colors.black)
+
+_template = None
+_template_lock = threading.Lock()
+
+def get_template():
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None: _template = PageTemplate()
+    return _template
+
+def template_ready():
+    return _template is not None
+
+def reset_template():
+    # e.g. after replacing static/logo.png
+    global _template
+    with _template_lock:
+        _template = None
+    report_cache.clear()
+
+# ---------- Content-addressed LRU of rendered reports ----------
+class ReportCache:
+    def __init__(self, max_entries=PDF_CACHE_SIZE, max_bytes=PDF_CACHE_BYTES, ttl=PDF_CACHE_TTL):
+        self.max_entries, self.max_bytes, self.ttl = max_entries, max_bytes, ttl
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[1] >= self.ttl:
+                del self._data[key]
+                self._bytes -= len(entry[0])
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, pdf):
+        if self.max_entries <= 0 or len(pdf) > self.max_bytes: return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None: self._bytes -= len(old[0])
+            self._data[key] = (pdf, time.monotonic())
+            self._bytes += len(pdf)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, ev = self._data.popitem(last=False)
+                self._bytes -= len(ev[0])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+report_cache = ReportCache()
+
+def report_key(form_data, score, category):
+    # Normalized: only the fields the report shows, with metrics at their printed precision.
+    norm = {}
+    for k in REPORT_FIELDS:
+        v = form_data.get(k, "")
+        norm[k] = round(v, 1) if isinstance(v, float) else v
+    blob = json.dumps([norm, score, category], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+_RENDER_SECONDS = metrics.histogram("credit_pdf_render_seconds", "ReportLab drawing time per report (cache misses)")
+_CACHE_LOOKUPS = {r: metrics.counter("credit_pdf_cache_total", "PDF report cache lookups", result=r) for r in ("hit", "miss")}
+
+def render_pdf(form_data, score, category):
+    # Keyed on the content only: a cached report keeps the "Generated" stamp of its render,
+    # which is at most PDF_CACHE_TTL seconds old.
+    key = report_key(form_data, score, category)
+    pdf = report_cache.get(key)
+    if pdf is None:
+        _CACHE_LOOKUPS["miss"].inc()
+        generated = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+        with _RENDER_SECONDS.time():
+            pdf = get_template().render(form_data, score, category, generated)
+        report_cache.put(key, pdf)
+    else:
+        _CACHE_LOOKUPS["hit"].inc()
+    return pdf
+
+def generate_pdf(form_data, score, category):
+    return io.BytesIO(render_pdf(form_data, score, category))
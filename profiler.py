@@ -0,0 +1,153 @@
+import os, re, sys, hmac, time, uuid, tempfile, threading
+from collections import Counter
+from pathlib import Path
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", Path(tempfile.gettempdir()) / "credit-profiles"))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+REQUEST_INTERVAL = float(os.environ.get("PROFILE_REQUEST_INTERVAL_MS", "1")) / 1000.0
+MAX_DEPTH = 128
+# GIL switch interval while sampling (default is 5ms)
+SAMPLING_SWITCH_INTERVAL = 0.0005
+# a thread whose innermost frame is in one of these is blocked, not burning CPU
+IDLE_FILES = {"threading.py", "selectors.py", "queue.py", "socket.py", "socketserver.py", "ssl.py"}
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+class ProfilerBusy(Exception):
+    pass
+
+def authorized(token):
+    # Profiling is disabled unless ADMIN_TOKEN is set.
+    if not ADMIN_TOKEN or not token: return False
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+_names = {}
+
+def _name(code):
+    name = _names.get(code)
+    if name is None:
+        name = _names[code] = "%s:%s" % (os.path.basename(code.co_filename), code.co_qualname)
+    return name
+
+def _stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+def _idle(frame):
+    return os.path.basename(frame.f_code.co_filename) in IDLE_FILES
+
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_saved = None
+
+def _fast_switch(on):
+    # The sampler only sees a busy thread when that thread yields the GIL. At the default 5ms
+    # interval it mostly yields inside GIL-releasing C calls (zlib, I/O), which skews profiles
+    # toward them; a short interval makes it yield at ordinary bytecode boundaries too.
+    global _switch_users, _switch_saved
+    with _switch_lock:
+        if on:
+            if _switch_users == 0:
+                _switch_saved = sys.getswitchinterval()
+                sys.setswitchinterval(min(_switch_saved, SAMPLING_SWITCH_INTERVAL))
+            _switch_users += 1
+        else:
+            _switch_users -= 1
+            if _switch_users == 0: sys.setswitchinterval(_switch_saved)
+
+# ---------- Sampling profiler: a thread polling sys._current_frames ----------
+class Sampler:
+    """Samples the Python stacks of live threads every `interval` seconds.
+
+    Nothing is hooked into the profiled code: the cost is one stack walk per thread per
+    sample, plus a shorter GIL switch interval while any sampler is running.
+    """
+    def __init__(self, interval=0.005, thread_ids=None, include_idle=False, exclude=()):
+        self.interval = max(0.0005, interval)
+        self.thread_ids = thread_ids
+        self.exclude = set(exclude)
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = self.stopped = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.monotonic()
+        _fast_switch(True)
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.stopped is not None: return self.stacks
+        self._stop.set()
+        if self._thread is not None: self._thread.join()
+        self.stopped = time.monotonic()
+        _fast_switch(False)
+        return self.stacks
+
+    def _run(self):
+        skip = self.exclude | {threading.get_ident()}
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid in skip: continue
+                if self.thread_ids is not None and tid not in self.thread_ids: continue
+                if not self.include_idle and _idle(frame): continue
+                self.stacks[_stack(frame)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        # Brendan Gregg's folded format: flamegraph.pl, speedscope and inferno read it as is.
+        return "".join("%s %d\n" % (s, n) for s, n in sorted(self.stacks.items()))
+
+    def info(self):
+        return {"pid": os.getpid(), "samples": self.samples, "stacks": len(self.stacks),
+                "interval_ms": self.interval * 1000.0,
+                "seconds": round((self.stopped or time.monotonic()) - (self.started or time.monotonic()), 3)}
+
+# One worker-wide profile at a time; concurrent ones would just sample each other.
+_busy = threading.Lock()
+
+def profile(seconds, interval=0.005, include_idle=False):
+    seconds = max(0.1, min(PROFILE_MAX_SECONDS, seconds))
+    if not _busy.acquire(blocking=False): raise ProfilerBusy("a profile is already running in this worker")
+    try:
+        # the calling (request) thread only sleeps here; leave it out
+        sampler = Sampler(interval, include_idle=include_idle, exclude={threading.get_ident()}).start()
+        time.sleep(seconds)
+        sampler.stop()
+        return sampler
+    finally:
+        _busy.release()
+
+# ---------- Saved profiles (per-request), shared by all workers through PROFILE_DIR ----------
+def save(text):
+    profile_id = uuid.uuid4().hex
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = PROFILE_DIR / (profile_id + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, PROFILE_DIR / (profile_id + ".folded"))
+        _prune()
+    except OSError as e:
+        print("[profiler] could not save profile: %s" % e, file=sys.stderr)
+        return None
+    return profile_id
+
+def load_path(profile_id):
+    if not _PROFILE_ID.match(profile_id or ""): return None
+    path = PROFILE_DIR / (profile_id + ".folded")
+    return path if path.exists() else None
+
+def _prune():
+    files = sorted(PROFILE_DIR.glob("*.folded"), key=lambda p: p.stat().st_mtime)
+    for p in files[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else files:
+        p.unlink(missing_ok=True)
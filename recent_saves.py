@@ -0,0 +1,169 @@
+import os, sys, mmap, time, fcntl, atexit, struct, hashlib, threading
+from pathlib import Path
+
+import metrics
+
+WINDOW = float(os.environ.get("SAVE_DEDUP_WINDOW", "600"))
+SLOTS = int(os.environ.get("SAVE_DEDUP_SLOTS", "65536"))
+PROBES = 8
+PENDING_SECONDS = 60  # a save neither confirmed nor forgotten by then (its worker died) no longer holds its keys
+MAGIC = b"RSV3"
+
+_HEAD = struct.Struct("<4sI")   # magic, slot count
+_SLOT = struct.Struct("<16s16sd")  # key digest, content digest, saved at (unix seconds; negative while pending, 0 = empty)
+
+_DUPLICATES = metrics.counter("credit_store_duplicates_total", "Saves acknowledged without writing (seen within the window)")
+
+def _digest(*parts):
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).digest()
+
+class IdempotencyConflict(Exception):
+    pass
+
+class SavePending(Exception):
+    pass
+
+def save_keys(national_id, content, idempotency_key=None):
+    # content: the saved row without its timestamp. The first key is the content's digest.
+    keys = [_digest("row", national_id or "", *("" if v is None else str(v) for v in content))]
+    if idempotency_key: keys.append(_digest("key", idempotency_key))
+    return keys
+
+# ---------- Recent saves: fixed-size hash table in a shared memory-mapped file ----------
+class RecentSaves:
+    """Keys saved in the last `window` seconds, shared by every worker through one mapped file.
+
+    A lookup probes at most PROBES slots under the file's flock, so it costs the same however
+    many rows have been saved. Entries expire by age; when a probe run is full of live entries
+    the oldest is overwritten, which bounds memory at the price of forgetting early. The map
+    is flushed on exit, so the window also survives restarts.
+    """
+    def __init__(self, path, window=WINDOW, slots=SLOTS):
+        self.path = Path(path)
+        self.window = window
+        self.slots = 1 << max(PROBES, slots - 1).bit_length()  # power of two
+        self._mask = self.slots - 1
+        self._lock = threading.Lock()
+        self._fd = None
+        self._mm = None
+        self._pid = None
+
+    def seen(self, keys, now=None):
+        """When one of `keys` was saved within the window, its save time; otherwise records them all and returns None.
+
+        A returned time is negative while that save is still being written: the caller waits for
+        confirm() or forget() by calling again. Keys recorded here are pending until the caller
+        confirms them. keys[0] identifies the content (see save_keys); any further key is bound
+        to it, so reusing one for other content raises IdempotencyConflict.
+        """
+        if self.window <= 0: return None
+        now = time.time() if now is None else now
+        content = keys[0]
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                saved_at = None
+                for key in keys:
+                    t, stored, _ = self._probe(key, now)
+                    if t is None: continue
+                    if stored != content:
+                        raise IdempotencyConflict("Idempotency-Key was already used for a different submission")
+                    if saved_at is None or t > 0: saved_at = t
+                if saved_at is not None:
+                    if saved_at > 0: _DUPLICATES.inc()
+                    return saved_at
+                for key in keys:
+                    _, _, off = self._probe(key, now)
+                    _SLOT.pack_into(self._mm, off, key, content, -now)
+                return None
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def confirm(self, keys, saved_at):
+        """The save seen() recorded for `keys` at `saved_at` is durable: repeats are acknowledged from now on."""
+        self._settle(keys, saved_at, saved_at)
+
+    def forget(self, keys, saved_at):
+        """Drop the entries seen() recorded for `keys` at `saved_at` (the save did not happen), so a retry is written."""
+        self._settle(keys, saved_at, None)
+
+    def _settle(self, keys, saved_at, value):
+        if self.window <= 0: return
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for key in keys:
+                    t, c, off = self._probe(key, saved_at)
+                    if t is None or abs(t) != saved_at: continue
+                    if value is None: _SLOT.pack_into(self._mm, off, b"", b"", 0.0)
+                    else: _SLOT.pack_into(self._mm, off, key, c, value)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _probe(self, key, now):
+        # (saved_at, content, offset) for a live match, else (None, None, offset of the slot to reuse)
+        mm, window = self._mm, self.window
+        i = int.from_bytes(key[:8], "little") & self._mask
+        free = oldest = oldest_at = None
+        for _ in range(PROBES):
+            off = _HEAD.size + i * _SLOT.size
+            k, c, t = _SLOT.unpack_from(mm, off)
+            age = now - abs(t)
+            if age < window and (t > 0 or age < PENDING_SECONDS):
+                if k == key: return t, c, off
+                if oldest_at is None or abs(t) < oldest_at: oldest, oldest_at = off, abs(t)
+            elif free is None:
+                free = off
+            i = (i + 1) & self._mask
+        return None, None, free if free is not None else oldest
+
+    def _open(self):
+        # Per process: a forked worker must not share the parent's open file (and flock) with it.
+        if self._mm is not None and self._pid == os.getpid(): return
+        size = _HEAD.size + self.slots * _SLOT.size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                head = os.pread(fd, _HEAD.size, 0)
+                if os.fstat(fd).st_size != size or head != _HEAD.pack(MAGIC, self.slots):
+                    if head: print("[dedup] resetting %s (layout or slot count changed)" % self.path, file=sys.stderr)
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _HEAD.pack(MAGIC, self.slots), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            mm = mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd, self._mm, self._pid = fd, mm, os.getpid()
+
+    def close(self):
+        with self._lock:
+            if self._mm is None or self._pid != os.getpid(): return
+            try:
+                self._mm.flush()
+            except OSError as e:
+                print("[dedup] could not flush %s: %s" % (self.path, e), file=sys.stderr)
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = self._fd = None
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_recent_saves(path):
+    key = str(Path(path).resolve())
+    with _instances_lock:
+        r = _instances.get(key)
+        if r is None:
+            r = _instances[key] = RecentSaves(path)
+        return r
+
+@atexit.register
+def close_all():
+    for r in list(_instances.values()): r.close()
@@ -0,0 +1,353 @@
+import os, csv, sys, json, mmap, zlib, struct, fcntl, argparse, datetime
+from pathlib import Path
+
+import numpy as np
+
+from record_store import rotate
+from csv_export import snapshot, timestamp_bound, iter_rows as iter_csv_rows
+
+MAGIC = b"RCA1"
+BLOCK_ROWS = int(os.environ.get("ARCHIVE_BLOCK_ROWS", "65536"))
+SUFFIX = ".rca"
+TEXT_LEVEL = 6
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Column kinds; a block stores a column as text whenever its values don't round-trip exactly.
+TIMESTAMP_COLUMNS = {"timestamp"}
+INT_COLUMNS = {"open_credit_lines", "past_due_accounts", "length_credit_history_years", "recent_inquiries_12m", "score"}
+FLOAT1_COLUMNS = {"credit_utilization_ratio_pct", "payment_history_score_pct", "debt_to_income_ratio_pct"}
+DICT_COLUMNS = {"employment", "income_level", "collateral_provided", "account_types", "macroeconomic_risk",
+                "category", "model_version"}
+STATS_COLUMNS = TIMESTAMP_COLUMNS | INT_COLUMNS | FLOAT1_COLUMNS
+
+# ---------- Encoding ----------
+def _ts_micros(values):
+    # naive datetime.isoformat() strings: 19 chars, or 26 when microseconds are non-zero
+    if not all(len(v) in (19, 26) and v[10:11] == "T" and not v.endswith(".000000") for v in values):
+        raise ValueError("non-canonical timestamp")
+    arr = np.array(values, dtype="datetime64[us]")
+    full = np.datetime_as_string(arr, unit="us").tolist()
+    if any(f != (v if len(v) == 26 else v + ".000000") for f, v in zip(full, values)):
+        raise ValueError("non-canonical timestamp")
+    return arr.astype("<i8")
+
+def _ints(values):
+    out = np.array([int(v) for v in values], dtype="<i8")
+    if any(str(int(v)) != v for v in values): raise ValueError("non-canonical int")
+    lo, hi = (out.min(), out.max()) if len(out) else (0, 0)
+    return out.astype("<i4") if -2**31 <= lo and hi < 2**31 else out
+
+def _floats1(values):
+    out = np.array([float(v) for v in values], dtype="<f8")
+    if any("%.1f" % f != v for f, v in zip(out.tolist(), values)): raise ValueError("non-canonical float")
+    return out
+
+def _dict_codes(values):
+    index, codes = {}, []
+    for v in values:
+        c = index.get(v)
+        if c is None: c = index[v] = len(index)
+        codes.append(c)
+    dtype = "<u1" if len(index) <= 0xFF else "<u2" if len(index) <= 0xFFFF else "<u4"
+    return list(index), np.array(codes, dtype=dtype)
+
+def _text(values):
+    data = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(data) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in data], out=offsets[1:])
+    return offsets, b"".join(data)
+
+class _Writer:
+    def __init__(self, f):
+        self.f = f
+        f.write(MAGIC)
+    def put(self, data):
+        # 8-byte aligned so readers can map arrays in place
+        pad = -self.f.tell() % 8
+        if pad: self.f.write(b"\0" * pad)
+        off = self.f.tell()
+        self.f.write(data)
+        return off
+
+def _encode_block(w, header, rows):
+    cols, stats = {}, {}
+    width = len(header)
+    columns = list(zip(*(r if len(r) == width else (r + [""] * width)[:width] for r in rows)))
+    for name, values in zip(header, columns):
+        desc = None
+        try:
+            if name in TIMESTAMP_COLUMNS: arr, desc = _ts_micros(values), {"enc": "ts"}
+            elif name in INT_COLUMNS: arr = _ints(values); desc = {"enc": "int", "dtype": arr.dtype.str}
+            elif name in FLOAT1_COLUMNS: arr, desc = _floats1(values), {"enc": "float1"}
+        except (ValueError, OverflowError):
+            desc = None
+        if desc is not None:
+            desc["offset"] = w.put(arr.tobytes())
+            if name in STATS_COLUMNS and len(arr): stats[name] = [arr.min().item(), arr.max().item()]
+        elif name in DICT_COLUMNS:
+            words, codes = _dict_codes(values)
+            desc = {"enc": "dict", "dtype": codes.dtype.str, "dict": words, "offset": w.put(codes.tobytes())}
+        else:
+            # free text (names, addresses, ids) is decoded anyway when read, so it is compressed
+            offsets, data = _text(values)
+            blob = zlib.compress(offsets.tobytes() + data, TEXT_LEVEL)
+            desc = {"enc": "text", "offset": w.put(blob), "length": len(blob)}
+        cols[name] = desc
+    return {"rows": len(rows), "columns": cols, "stats": stats}
+
+def write_archive(rows, header, path, source=None, block_rows=BLOCK_ROWS):
+    """Write CSV-shaped rows (lists of strings) to a columnar archive at `path`, atomically."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".%d.tmp" % os.getpid())
+    blocks, n = [], 0
+    try:
+        with open(tmp, "wb") as f:
+            w = _Writer(f)
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= block_rows:
+                    blocks.append(_encode_block(w, header, chunk)); n += len(chunk); chunk = []
+            if chunk: blocks.append(_encode_block(w, header, chunk)); n += len(chunk)
+            footer = json.dumps({"format": "rca", "version": 1, "columns": list(header), "rows": n,
+                                 "source": source, "created": datetime.datetime.utcnow().isoformat(),
+                                 "blocks": blocks}).encode("utf-8")
+            w.put(footer)
+            f.write(struct.pack("<Q", len(footer)) + MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return n
+
+# ---------- Memory-mapped reader ----------
+def _iso_micros(value):
+    # "from"/"to" bounds as /records and /csv take them (a prefix such as 2025-01, or an offset, which is converted to UTC)
+    d = datetime.datetime.fromisoformat(timestamp_bound(value))
+    return (d - EPOCH) // datetime.timedelta(microseconds=1)
+
+class ArchiveReader:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._f.close()
+            raise ValueError("%s: empty file" % self.path)
+        mm = self._mm
+        if len(mm) < 16 or mm[:4] != MAGIC or mm[-4:] != MAGIC:
+            self.close()
+            raise ValueError("%s: not a record archive" % self.path)
+        (flen,) = struct.unpack("<Q", mm[-12:-4])
+        meta = json.loads(mm[len(mm) - 12 - flen:len(mm) - 12].decode("utf-8"))
+        self.columns = meta["columns"]
+        self.rows = meta["rows"]
+        self.blocks = meta["blocks"]
+        self.meta = meta
+
+    def close(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # arrays handed out still view the map; it is unmapped when they are collected
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def block_ids(self, since=None, until=None, min_score=None, max_score=None):
+        # Blocks whose min/max statistics can contain matching rows.
+        lo_ts = _iso_micros(since) if since else None
+        hi_ts = _iso_micros(until) if until else None
+        for i, b in enumerate(self.blocks):
+            st = b["stats"]
+            ts, sc = st.get("timestamp"), st.get("score")
+            if ts is not None:
+                if lo_ts is not None and ts[1] < lo_ts: continue
+                if hi_ts is not None and ts[0] >= hi_ts: continue
+            if sc is not None:
+                if min_score is not None and sc[1] < min_score: continue
+                if max_score is not None and sc[0] > max_score: continue
+            yield i
+
+    def column(self, block, name):
+        # numpy array (zero-copy over the map) for typed/dict columns, list of str for text
+        b = self.blocks[block]
+        d, n = b["columns"][name], b["rows"]
+        enc = d["enc"]
+        if enc == "ts": return np.frombuffer(self._mm, "<i8", n, d["offset"])
+        if enc == "int": return np.frombuffer(self._mm, d["dtype"], n, d["offset"])
+        if enc == "float1": return np.frombuffer(self._mm, "<f8", n, d["offset"])
+        if enc == "dict": return np.frombuffer(self._mm, d["dtype"], n, d["offset"])
+        raw = zlib.decompress(self._mm[d["offset"]:d["offset"] + d["length"]])
+        offsets = np.frombuffer(raw, "<u8", n + 1).tolist()
+        data = raw[(n + 1) * 8:]
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n)]
+
+    def text_column(self, block, name):
+        # Column values exactly as they were in the CSV.
+        b = self.blocks[block]
+        d = b["columns"][name]
+        enc = d["enc"]
+        col = self.column(block, name)
+        if enc == "ts":
+            return [(EPOCH + datetime.timedelta(microseconds=v)).isoformat() for v in col.tolist()]
+        if enc == "int": return [str(v) for v in col.tolist()]
+        if enc == "float1": return ["%.1f" % v for v in col.tolist()]
+        if enc == "dict":
+            words = d["dict"]
+            return [words[c] for c in col.tolist()]
+        return col
+
+    def mask(self, block, since=None, until=None, min_score=None, max_score=None, categories=None):
+        # Row-level filter for one block (None = every row).
+        b = self.blocks[block]
+        m = None
+        def both(x):
+            return x if m is None else (m & x)
+        if (since or until) and "timestamp" in b["columns"]:
+            ts = self.column(block, "timestamp")
+            if b["columns"]["timestamp"]["enc"] == "ts":
+                if since: m = both(ts >= _iso_micros(since))
+                if until: m = both(ts < _iso_micros(until))
+            else:
+                ts = np.array(ts, dtype=object)
+                if since: m = both(ts >= timestamp_bound(since))
+                if until: m = both(ts < timestamp_bound(until))
+        if (min_score is not None or max_score is not None) and "score" in b["columns"]:
+            sc = self.column(block, "score")
+            if b["columns"]["score"]["enc"] != "int": sc = np.array([int(float(v or 0)) for v in sc])
+            if min_score is not None: m = both(sc >= min_score)
+            if max_score is not None: m = both(sc <= max_score)
+        if categories is not None and "category" in b["columns"]:
+            cats = np.array(self.text_column(block, "category"), dtype=object)
+            m = both(np.isin(cats, list(categories)))
+        return m
+
+    def iter_rows(self, columns=None, since=None, until=None, min_score=None, max_score=None, categories=None):
+        """Yield CSV-shaped rows (lists of str) in file order, skipping blocks by their statistics."""
+        columns = list(columns or self.columns)
+        for i in self.block_ids(since, until, min_score, max_score):
+            m = self.mask(i, since, until, min_score, max_score, categories)
+            if m is not None and not m.any(): continue
+            cols = [self.text_column(i, c) if c in self.blocks[i]["columns"] else [""] * self.blocks[i]["rows"]
+                    for c in columns]
+            keep = range(self.blocks[i]["rows"]) if m is None else np.flatnonzero(m).tolist()
+            for r in keep:
+                yield [c[r] for c in cols]
+
+# ---------- Rollover: closed CSV segments -> archives ----------
+def closed_segments(csv_path):
+    csv_path = Path(csv_path)
+    return sorted(p for p in csv_path.parent.glob("%s.*.csv" % csv_path.stem))
+
+def archives(csv_path):
+    csv_path = Path(csv_path)
+    return sorted(csv_path.parent.glob("%s.*%s" % (csv_path.stem, SUFFIX)))
+
+def history(csv_path):
+    """Closed sources of csv_path, oldest first: one per segment, its archive when both exist
+    (compact --keep-csv, or a compaction that has not removed the CSV yet)."""
+    by_stem = {p.stem: p for p in closed_segments(csv_path)}
+    by_stem.update((p.stem, p) for p in archives(csv_path))
+    return [by_stem[s] for s in sorted(by_stem)]
+
+def iter_history(csv_path, columns, since=None, until=None, categories=None, live_size=None):
+    """Every saved row of csv_path: closed sources (see history), then the first live_size bytes of the
+    live file (a fresh snapshot when None). Rows are lists of str in `columns` order, "" where a source
+    predates a column."""
+    for p in history(csv_path):
+        if p.suffix == ".csv":
+            try:
+                yield from iter_csv_rows(p, p.stat().st_size, since, until, categories, columns)
+                continue
+            except FileNotFoundError:
+                p = p.with_suffix(SUFFIX)  # compacted since it was listed
+        with ArchiveReader(p) as r:
+            yield from r.iter_rows(columns, since, until, categories=categories)
+    try:
+        if live_size is None: live_size = snapshot(csv_path)[1]
+        yield from iter_csv_rows(csv_path, live_size, since, until, categories, columns)
+    except FileNotFoundError:
+        pass  # rotated and not written to since
+
+def compact_segment(segment, keep_csv=False, block_rows=BLOCK_ROWS):
+    segment = Path(segment)
+    target = segment.with_suffix(SUFFIX)
+    with open(segment, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            if not keep_csv: segment.unlink()
+            return None, 0
+        n = write_archive(reader, header, target, source=segment.name, block_rows=block_rows)
+    with ArchiveReader(target) as r:
+        if r.rows != n: raise RuntimeError("%s: wrote %d rows, archive has %d" % (target, n, r.rows))
+    if not keep_csv: segment.unlink()
+    return target, n
+
+def compact(csv_path, rotate_live=False, keep_csv=False, block_rows=BLOCK_ROWS):
+    """Archive every closed segment next to csv_path (optionally closing the live file first)."""
+    csv_path = Path(csv_path)
+    if rotate_live and csv_path.exists() and csv_path.stat().st_size: rotate(csv_path)
+    done = []
+    lock = os.open(csv_path.with_name(csv_path.stem + ".compact.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # one compactor at a time
+        for seg in closed_segments(csv_path):
+            target, n = compact_segment(seg, keep_csv, block_rows)
+            if target is not None: done.append((seg.name, target.name, n))
+    finally:
+        os.close(lock)
+    return done
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Columnar archives of saved records.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    data_dir = Path(os.environ.get("DATA_DIR", Path(__file__).resolve().parent / "data"))
+    c = sub.add_parser("compact", help="archive closed records.<stamp>.csv segments")
+    c.add_argument("--csv", default=str(data_dir / "records.csv"))
+    c.add_argument("--rotate", action="store_true", help="close the live records.csv first")
+    c.add_argument("--keep-csv", action="store_true")
+    s = sub.add_parser("scan", help="print archived rows as CSV")
+    s.add_argument("archive")
+    s.add_argument("--from", dest="since")
+    s.add_argument("--to", dest="until")
+    s.add_argument("--min-score", type=int)
+    s.add_argument("--max-score", type=int)
+    s.add_argument("--category", help="comma-separated categories")
+    s.add_argument("--columns", help="comma-separated columns")
+    i = sub.add_parser("info", help="archive metadata and block statistics")
+    i.add_argument("archive")
+    args = ap.parse_args(argv)
+    if args.cmd == "compact":
+        for seg, target, n in compact(args.csv, args.rotate, args.keep_csv):
+            print("archived %s -> %s (%d rows)" % (seg, target, n), file=sys.stderr)
+    elif args.cmd == "scan":
+        try:
+            since, until = timestamp_bound(args.since), timestamp_bound(args.until)
+        except ValueError as e:
+            ap.error("invalid --from/--to: %s" % e)
+        cats = {c.strip() for c in args.category.split(",") if c.strip()} if args.category else None
+        with ArchiveReader(args.archive) as r:
+            cols = [c.strip() for c in args.columns.split(",")] if args.columns else r.columns
+            w = csv.writer(sys.stdout)
+            w.writerow(cols)
+            w.writerows(r.iter_rows(cols, since, until, args.min_score, args.max_score, cats))
+    else:
+        with ArchiveReader(args.archive) as r:
+            json.dump({k: v for k, v in r.meta.items() if k != "blocks"} | {
+                "size_bytes": r.path.stat().st_size,
+                "blocks": [{"rows": b["rows"], "stats": b["stats"],
+                            "encodings": {c: d["enc"] for c, d in b["columns"].items()}} for b in r.blocks]},
+                sys.stdout, indent=2)
+            print()
+
+if __name__ == "__main__":
+    main()
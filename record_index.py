@@ -0,0 +1,135 @@
+import os, sys, csv, hashlib, sqlite3, argparse, threading
+from pathlib import Path
+
+from record_store import CSV_HEADER
+
+REAL_COLUMNS = {"credit_utilization_ratio_pct", "payment_history_score_pct", "debt_to_income_ratio_pct"}
+INT_COLUMNS = {"open_credit_lines", "past_due_accounts", "length_credit_history_years", "recent_inquiries_12m", "score"}
+MAX_LIMIT = 1000
+SCHEMA_VERSION = 1  # 1: empty text stored as "" (was NULL)
+
+def _coltype(name):
+    if name in REAL_COLUMNS: return "REAL"
+    if name in INT_COLUMNS: return "INTEGER"
+    return "TEXT"
+
+def _convert(name, value):
+    # Text is stored as written, "" included, so lookups agree with the CSV; an empty or unparseable
+    # number is NULL (a '' in a numeric column would compare above every number).
+    if name in REAL_COLUMNS or name in INT_COLUMNS:
+        try:
+            return float(value) if name in REAL_COLUMNS else int(float(value))
+        except (TypeError, ValueError):
+            return None
+    return "" if value is None else str(value)
+
+def row_hash(row):
+    # Content hash of a CSV-shaped row; makes imports and re-imports idempotent.
+    return hashlib.sha1("\x1f".join("" if v is None else str(v) for v in row).encode("utf-8")).hexdigest()
+
+# ---------- SQLite (WAL) index over saved assessments ----------
+class RecordIndex:
+    def __init__(self, path, columns=CSV_HEADER):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        if self._schema_ready: return
+        with self._schema_lock:
+            cols = ", ".join('"%s" %s' % (c, _coltype(c)) for c in self.columns)
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, row_hash TEXT UNIQUE, %s)" % cols)
+                existing = {r["name"] for r in conn.execute("PRAGMA table_info(records)")}
+                for c in self.columns:
+                    if c not in existing:
+                        conn.execute('ALTER TABLE records ADD COLUMN "%s" %s' % (c, _coltype(c)))
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_records_ts ON records(timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_records_nid_ts ON records(national_id, timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_records_cat_ts ON records(category, timestamp)")
+                if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                    # empty text used to be stored as NULL; columns added later are NULL for older rows too
+                    for c in self.columns:
+                        if _coltype(c) == "TEXT":
+                            conn.execute('UPDATE records SET "%s" = \'\' WHERE "%s" IS NULL' % (c, c))
+                    conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+            self._schema_ready = True
+
+    def insert_rows(self, rows, columns=None):
+        # rows: sequences in `columns` order (CSV layout by default). Duplicates are ignored.
+        columns = list(columns or self.columns)
+        names = ", ".join('"%s"' % c for c in columns)
+        sql = "INSERT OR IGNORE INTO records (row_hash, %s) VALUES (?, %s)" % (names, ", ".join("?" * len(columns)))
+        conn = self._conn()
+        with conn:
+            cur = conn.executemany(sql, (
+                [row_hash(r)] + [_convert(c, v) for c, v in zip(columns, r)] for r in rows
+            ))
+        return cur.rowcount
+
+    def import_csv(self, csv_path, batch=5000):
+        added = 0
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            columns = next(reader, None)
+            if not columns: return 0
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= batch:
+                    added += self.insert_rows(chunk, columns); chunk = []
+            if chunk: added += self.insert_rows(chunk, columns)
+        return added
+
+    def query(self, national_id=None, category=None, since=None, until=None,
+              min_score=None, max_score=None, cursor=None, limit=100, descending=False):
+        # Keyset pagination on (timestamp, id); cursor is the opaque "next_cursor" of the previous page.
+        where, args = [], []
+        if national_id is not None: where.append("national_id = ?"); args.append(national_id)
+        if category is not None: where.append("category = ?"); args.append(category)
+        if since is not None: where.append("timestamp >= ?"); args.append(since)
+        if until is not None: where.append("timestamp < ?"); args.append(until)
+        if min_score is not None: where.append("score >= ?"); args.append(min_score)
+        if max_score is not None: where.append("score <= ?"); args.append(max_score)
+        if cursor:
+            ts, _, rid = cursor.rpartition("|")
+            where.append("(timestamp, id) %s (?, ?)" % ("<" if descending else ">"))
+            args += [ts, int(rid)]
+        limit = max(1, min(MAX_LIMIT, int(limit)))
+        order = "DESC" if descending else "ASC"
+        sql = "SELECT * FROM records %s ORDER BY timestamp %s, id %s LIMIT ?" % (
+            ("WHERE " + " AND ".join(where)) if where else "", order, order)
+        rows = [dict(r) for r in self._conn().execute(sql, args + [limit])]
+        for r in rows: r.pop("row_hash", None)
+        next_cursor = "%s|%d" % (rows[-1]["timestamp"], rows[-1]["id"]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Import records.csv into the indexed SQLite store.")
+    ap.add_argument("csv", help="CSV written by the app (records.csv layout)")
+    data_dir = Path(os.environ.get("DATA_DIR", Path(__file__).resolve().parent / "data"))
+    ap.add_argument("--db", default=os.environ.get("RECORDS_DB", str(data_dir / "records.db")))
+    args = ap.parse_args(argv)
+    idx = RecordIndex(args.db)
+    added = idx.import_csv(args.csv)
+    print("imported %d new rows into %s (total %d)" % (added, args.db, idx.count()), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
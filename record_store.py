@@ -0,0 +1,261 @@
+import os, io, csv, sys, time, queue, atexit, fcntl, datetime, threading
+from concurrent.futures import Future
+from pathlib import Path
+
+import metrics
+
+CSV_HEADER = [
+    "timestamp","full_name","dob","national_id","current_address","phone_number",
+    "employment","employer","income_level",
+    "credit_utilization_ratio_pct","payment_history_score_pct","debt_to_income_ratio_pct",
+    "open_credit_lines","past_due_accounts","length_credit_history_years","recent_inquiries_12m",
+    "collateral_provided","account_types","macroeconomic_risk",
+    "score","category","model_version"
+]
+
+FLUSH_ROWS = int(os.environ.get("RECORD_FLUSH_ROWS", "256"))
+FLUSH_INTERVAL = float(os.environ.get("RECORD_FLUSH_MS", "0")) / 1000.0  # linger for more rows; 0 = commit when the queue drains
+FSYNC = os.environ.get("RECORD_FSYNC", "1") not in {"0", "false", "no"}
+MAX_PENDING = int(os.environ.get("RECORD_MAX_PENDING", "100000"))
+WRITE_ATTEMPTS = max(1, int(os.environ.get("RECORD_WRITE_ATTEMPTS", "3")))
+RETRY_DELAY = 0.1
+
+_FLUSH = object()
+
+_WRITE_SECONDS = metrics.histogram("credit_store_write_seconds", "CSV group-commit time (lock, write, fsync)")
+_ROWS_WRITTEN = metrics.counter("credit_store_rows_written_total", "Rows durably appended to record files")
+
+# ---------- Append-only CSV store: one writer thread per process, group commit ----------
+class RecordStore:
+    def __init__(self, path, header=CSV_HEADER, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 fsync=FSYNC, max_pending=MAX_PENDING):
+        self.path = Path(path)
+        self.header = list(header)
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._q = queue.Queue(maxsize=max_pending)
+        self._events = None  # (rows, flush waiters, ok) for the listener thread
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._header_ok = False
+        # callables(rows) run on the listener thread after each durable batch, in commit order
+        self.listeners = []
+
+    def append(self, row):
+        """Enqueue one row; the writer thread does the I/O. Blocks if MAX_PENDING rows are waiting.
+
+        Returns a Future that resolves to None once the row is durable, or fails with the write
+        error after WRITE_ATTEMPTS tries. A save cancelled before its batch starts is not written.
+        """
+        if self._closed: raise RuntimeError("record store is closed")
+        self._ensure_writer()
+        fut = Future()
+        self._q.put((list(row), fut))
+        return fut
+
+    def flush(self, timeout=None):
+        # Durable flush of everything enqueued so far, with the listeners caught up; False on timeout
+        # or if a batch failed since the last flush.
+        if self._thread is None or self._pid != os.getpid(): return True
+        done = Future()
+        self._q.put((_FLUSH, done))
+        try:
+            return done.result(timeout)
+        except TimeoutError:
+            return False
+
+    def pending(self):
+        # rows enqueued in this process and not yet written
+        return self._q.qsize() if self._pid == os.getpid() else 0
+
+    def close(self, timeout=30):
+        if self._closed: return
+        ok = self.flush(timeout)
+        self._closed = True
+        if not ok: print("[store] close: flush timed out or a batch failed for %s" % self.path, file=sys.stderr)
+
+    def _ensure_writer(self):
+        # (Re)start the writer after fork: threads don't survive into gunicorn workers.
+        if self._thread is not None and self._pid == os.getpid(): return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid(): return
+            self._q = queue.Queue(maxsize=self._q.maxsize)
+            self._events = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="record-store-writer", daemon=True)
+            self._thread.start()
+            threading.Thread(target=self._run_listeners, name="record-store-listeners", daemon=True).start()
+
+    def _run(self):
+        # Group commit: the rows that queued up while the previous batch was being written go out
+        # together as soon as the queue is drained (after lingering up to flush_interval, if set).
+        failed = False
+        while True:
+            item = self._q.get()
+            pending, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item[0] is _FLUSH: waiters.append(item[1])
+                else: pending.append(item)
+                if waiters or len(pending) >= self.flush_rows: break
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    left = deadline - time.monotonic()
+                    if left <= 0: break
+                    try:
+                        item = self._q.get(timeout=left)
+                    except queue.Empty:
+                        break
+            if pending and not self._commit(pending): failed = True
+            if waiters:
+                # resolved by the listener thread, once the listeners have seen every row before them
+                self._events.put((None, waiters, not failed))
+                failed = False
+
+    def _run_listeners(self):
+        # Listeners (index, analytics) run here in commit order, so a slow one never delays a save.
+        while True:
+            rows, waiters, ok = self._events.get()
+            if rows is not None:
+                for fn in self.listeners:
+                    try:
+                        fn(rows)
+                    except Exception as e:
+                        print("[store] listener %r failed: %s" % (fn, e), file=sys.stderr)
+            for w in waiters: w.set_result(ok)
+
+    def _commit(self, batch):
+        # batch: [(row, future)]. Resolves every future; False if the rows could not be written.
+        batch = [(row, fut) for row, fut in batch if fut.set_running_or_notify_cancel()]
+        if not batch: return True
+        rows = [row for row, _ in batch]
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                with _WRITE_SECONDS.time():
+                    self._write(rows)
+            except Exception as e:
+                print("[store] write failed for %s (attempt %d of %d): %s" % (self.path, attempt, WRITE_ATTEMPTS, e),
+                      file=sys.stderr)
+                error = e
+                if attempt < WRITE_ATTEMPTS: time.sleep(RETRY_DELAY * attempt)
+            else:
+                _ROWS_WRITTEN.inc(len(rows))
+                for _, fut in batch: fut.set_result(None)
+                self._events.put((rows, (), True))
+                return True
+        for _, fut in batch: fut.set_exception(error)
+        return False
+
+    def _write(self, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerows(rows)
+        data = buf.getvalue().encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Cross-process lock: one batch at a time, header written exactly once.
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    st = os.fstat(fd)
+                    if not _same_file(self.path, st):
+                        continue  # rotated by another process while we waited
+                    if st.st_size and not self._header_ok:
+                        if _read_header(self.path) != self.header:
+                            self._rotate()
+                            continue
+                        self._header_ok = True
+                    out = data
+                    if st.st_size == 0:
+                        hbuf = io.StringIO()
+                        csv.writer(hbuf).writerow(self.header)
+                        out = hbuf.getvalue().encode("utf-8") + data
+                    try:
+                        _write_all(fd, out)
+                        if self.fsync: os.fsync(fd)
+                    except BaseException:
+                        # cut a partial batch back off, so a retry cannot tear or duplicate rows
+                        _truncate(fd, st.st_size, self.path)
+                        raise
+                    self._header_ok = True
+                    return
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+    def _rotate(self):
+        # Column layout changed: close the old file as a segment rather than mixing layouts.
+        target = _rename_segment(self.path)
+        print("[store] header changed; rotated %s -> %s" % (self.path, target.name), file=sys.stderr)
+
+def _rename_segment(path):
+    # caller holds the file's flock
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    target = path.with_name("%s.%s.csv" % (path.stem, stamp))
+    n = 1
+    while target.exists():
+        target = path.with_name("%s.%s-%d.csv" % (path.stem, stamp, n)); n += 1
+    os.rename(path, target)
+    return target
+
+def rotate(path):
+    """Close the live file as records.<stamp>.csv; writers start a fresh file on their next batch."""
+    path = Path(path)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if not _same_file(path, os.fstat(fd)): return None
+            return _rename_segment(path)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def _same_file(path, st):
+    try:
+        cur = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return (cur.st_dev, cur.st_ino) == (st.st_dev, st.st_ino)
+
+def _read_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+def _truncate(fd, size, path):
+    try:
+        os.ftruncate(fd, size)
+    except OSError as e:
+        print("[store] could not truncate %s back to %d bytes: %s" % (path, size, e), file=sys.stderr)
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(path, header=CSV_HEADER):
+    key = str(Path(path).resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = RecordStore(path, header)
+        return store
+
+@atexit.register
+def close_all():
+    for store in list(_stores.values()):
+        store.close()
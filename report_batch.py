@@ -0,0 +1,220 @@
+import io, os, re, sys, csv, time, zlib, atexit, struct, datetime, itertools, tempfile, argparse, threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from pdf_report import get_template
+from applicant import parse_record, record_number
+from record_store import CSV_HEADER
+from record_archive import iter_history
+from csv_export import timestamp_bound
+
+CSV_PATH = Path(os.environ.get("DATA_DIR", Path(__file__).resolve().parent / "data")) / "records.csv"
+MAX_MERGED_PAGES = int(os.environ.get("REPORT_MAX_MERGED_PAGES", "2000"))
+WORKERS = max(1, int(os.environ.get("REPORT_WORKERS", "2")))
+ZIP_SPOOL_BYTES = 1024 * 1024
+
+def record_to_report(row):
+    # records.csv row (dict) -> (form_data, score, category) as generate_pdf expects;
+    # saved rows were validated when scored, so a damaged field just shows its default
+    fd, _ = parse_record(row)
+    return fd, record_number(row.get("score"), int), row.get("category") or ""
+
+def iter_saved_records(path=CSV_PATH, since=None, until=None, categories=None, national_id=None, live_size=None):
+    # closed segments and archives first, then the live file, all read as the current columns
+    for values in iter_history(path, CSV_HEADER, since, until, categories, live_size):
+        row = dict(zip(CSV_HEADER, values))
+        if national_id is not None and row["national_id"] != national_id: continue
+        yield row
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+def _render_chunk(rows, generated):
+    # Runs in a pool process; the page template (decoded logo, planned layouts) is built once per process.
+    return get_template().render_pages([record_to_report(r) for r in rows], generated)
+
+def _safe(s):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", s or "")[:40] or "unknown"
+
+# ---------- Render pool: one per process, started on first use ----------
+_pool = None
+_pool_pid = None
+_pool_size = WORKERS
+_pool_lock = threading.Lock()
+
+def get_pool(workers=None):
+    """The process's render pool, created on first use with `workers` (default REPORT_WORKERS) processes."""
+    global _pool, _pool_pid, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool_size = workers or WORKERS
+            # spawn: safe to start from inside a multi-threaded web worker
+            _pool = ProcessPoolExecutor(max_workers=_pool_size, mp_context=mp.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _discard_pool(pool):
+    # a render process died: the executor is unusable, so the next job starts a new one
+    global _pool
+    with _pool_lock:
+        if _pool is pool: _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+@atexit.register
+def shutdown_pool():
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid(): _pool.shutdown(wait=False, cancel_futures=True)
+
+def render_parallel(rows, pages_per_file=1, generated=None):
+    """Yield (entry name, pdf bytes) in input order, rendering on the shared process pool.
+
+    At most 2 * pool size chunks are in flight, so memory stays bounded for any input size.
+    """
+    pool = get_pool()
+    window = 2 * _pool_size
+    generated = generated or datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+    inflight = deque()
+    try:
+        n = 0
+        for chunk in _chunks(rows, pages_per_file):
+            n += 1
+            first = chunk[0]
+            name = ("%06d_%s.pdf" % (n, _safe(first.get("national_id"))) if pages_per_file == 1
+                    else "reports_%06d.pdf" % n)
+            inflight.append((name, pool.submit(_render_chunk, chunk, generated)))
+            if len(inflight) >= window:
+                name, fut = inflight.popleft()
+                yield name, fut.result()
+        while inflight:
+            name, fut = inflight.popleft()
+            yield name, fut.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # a client that disconnects mid-download must not leave its chunks queued for the next job
+        for _, fut in inflight: fut.cancel()
+
+# ---------- Streamed ZIP (stored entries, ZIP64 past 65535 entries or 4 GiB) ----------
+_LOCAL = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL = struct.Struct("<IHHHHHHIIIHHHHHII")
+_ZIP64_OFFSET = struct.Struct("<HHQ")
+_END64 = struct.Struct("<IQHHIIQQQQ")
+_LOCATOR64 = struct.Struct("<IIQI")
+_END = struct.Struct("<IHHHHIIH")
+_MAX16, _MAX32 = 0xFFFF, 0xFFFFFFFF
+
+def stream_zip(rows, pages_per_file=1):
+    """Yield a ZIP of the rendered reports, entry by entry, as the pool produces them.
+
+    Besides the in-flight chunks, only the central directory outlives an entry; it is written
+    to a temporary file (in memory up to ZIP_SPOOL_BYTES) and streamed at the end, so memory
+    does not grow with the number of records.
+    """
+    t = time.localtime()
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    offset = count = 0
+    with tempfile.SpooledTemporaryFile(ZIP_SPOOL_BYTES) as directory:
+        for name, pdf in render_parallel(rows, pages_per_file):
+            fname = name.encode("utf-8")
+            crc, size = zlib.crc32(pdf), len(pdf)
+            extra = _ZIP64_OFFSET.pack(1, 8, offset) if offset >= _MAX32 else b""
+            directory.write(_CENTRAL.pack(0x02014B50, 45, 45 if extra else 20, 0, 0, dos_time, dos_date, crc, size, size,
+                                          len(fname), len(extra), 0, 0, 0, 0, min(offset, _MAX32)) + fname + extra)
+            yield _LOCAL.pack(0x04034B50, 20, 0, 0, dos_time, dos_date, crc, size, size, len(fname), 0) + fname
+            yield pdf
+            offset += _LOCAL.size + len(fname) + size
+            count += 1
+        dir_size = directory.tell()
+        directory.seek(0)
+        while True:
+            data = directory.read(ZIP_SPOOL_BYTES)
+            if not data: break
+            yield data
+    end = b""
+    if count >= _MAX16 or offset >= _MAX32 or dir_size >= _MAX32:
+        end = (_END64.pack(0x06064B50, _END64.size - 12, 45, 45, 0, 0, count, count, dir_size, offset)
+               + _LOCATOR64.pack(0x07064B50, 0, offset + dir_size, 1))
+    yield end + _END.pack(0x06054B50, 0, 0, min(count, _MAX16), min(count, _MAX16),
+                          min(dir_size, _MAX32), min(offset, _MAX32), 0)
+
+def merged_pdf(rows):
+    """Render rows into one PDF on the shared process pool; returns the document bytes.
+
+    A single document is assembled by one ReportLab canvas, so its memory grows with the page
+    count: callers go through batch_report, which keeps it to MAX_MERGED_PAGES records.
+    """
+    pool = get_pool()
+    generated = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+    try:
+        return pool.submit(_render_chunk, list(rows), generated).result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+def _merged_chunks(rows):
+    # rendering starts when the response body is first read, not on the request thread
+    pdf = merged_pdf(rows)
+    for i in range(0, len(pdf), ZIP_SPOOL_BYTES):
+        yield pdf[i:i + ZIP_SPOOL_BYTES]
+
+def batch_report(rows, fmt="zip", pages_per_file=1, max_pages=MAX_MERGED_PAGES):
+    """Return (format, body chunks) for a batch download.
+
+    format "pdf" is one merged document while the selection has at most max_pages records;
+    a larger selection is answered with the ZIP instead (pages_per_file records per entry),
+    so nothing is refused and no single canvas grows past max_pages.
+    """
+    if fmt == "pdf":
+        head = list(itertools.islice(rows, max_pages + 1))
+        if len(head) <= max_pages:
+            return "pdf", _merged_chunks(head)
+        rows = itertools.chain(head, rows)
+    return "zip", stream_zip(rows, pages_per_file)
+
+# One batch job per web worker process at a time.
+job_slot = threading.BoundedSemaphore(1)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Render PDF reports for saved records.")
+    ap.add_argument("--csv", default=str(CSV_PATH))
+    ap.add_argument("--out", default="-", help="output file, '-' for stdout")
+    ap.add_argument("--format", choices=["zip", "pdf"], default="zip",
+                    help="pdf: one merged document, or a zip past REPORT_MAX_MERGED_PAGES records")
+    ap.add_argument("--from", dest="since")
+    ap.add_argument("--to", dest="until")
+    ap.add_argument("--category", help="comma-separated categories")
+    ap.add_argument("--national-id")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="render processes")
+    ap.add_argument("--pages-per-file", type=int, default=1, help="zip only: records per PDF entry")
+    args = ap.parse_args(argv)
+    try:
+        since, until = timestamp_bound(args.since), timestamp_bound(args.until)
+    except ValueError as e:
+        ap.error("invalid --from/--to: %s" % e)
+    cats = {c.strip() for c in args.category.split(",") if c.strip()} if args.category else None
+    rows = iter_saved_records(args.csv, since, until, cats, args.national_id)
+    get_pool(max(1, args.workers))
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        fmt, body = batch_report(rows, args.format, max(1, args.pages_per_file))
+        if fmt != args.format:
+            print("[report_batch] more than %d records: writing a zip instead of one pdf" % MAX_MERGED_PAGES,
+                  file=sys.stderr)
+        for data in body:
+            out.write(data)
+    finally:
+        if out is not sys.stdout.buffer: out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os, re, sys, json, time, uuid, queue, tempfile, threading
+from pathlib import Path
+
+SPOOL_DIR = Path(os.environ.get("REPORT_SPOOL_DIR", Path(tempfile.gettempdir()) / "credit-reports"))
+JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", "2"))
+JOB_QUEUE = int(os.environ.get("REPORT_JOB_QUEUE", "32"))
+JOB_TTL = int(os.environ.get("REPORT_JOB_TTL", "600"))
+SWEEP_EVERY = 30
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+class QueueFull(Exception):
+    pass
+
+def _write_atomic(path, data):
+    tmp = path.with_name(path.name + ".%d.tmp" % os.getpid())
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+# ---------- Local job queue for PDF renders, spooled to disk so any worker can serve results ----------
+class JobQueue:
+    def __init__(self, spool_dir=SPOOL_DIR, workers=JOB_WORKERS, max_queue=JOB_QUEUE, ttl=JOB_TTL):
+        self.spool = Path(spool_dir)
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.ttl = ttl
+        self._q = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._events = {}
+        self._busy = 0
+        self._last_sweep = 0.0
+
+    def _ensure_workers(self):
+        if self._pid == os.getpid(): return
+        with self._lock:
+            if self._pid == os.getpid(): return
+            self.spool.mkdir(parents=True, exist_ok=True)
+            self._q = queue.Queue(maxsize=self.max_queue)
+            self._events = {}
+            self._busy = 0
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name="report-job-%d" % i, daemon=True).start()
+            # expired results go even when nobody submits or polls
+            threading.Thread(target=self._sweeper, name="report-job-sweeper", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _paths(self, job_id):
+        return self.spool / (job_id + ".json"), self.spool / (job_id + ".pdf")
+
+    def _set_status(self, job_id, **status):
+        _write_atomic(self._paths(job_id)[0], json.dumps(status).encode("utf-8"))
+
+    def submit(self, fn, *args):
+        # fn(*args) -> bytes; raises QueueFull when the worker backlog is at capacity.
+        self._ensure_workers()
+        self._sweep()
+        job_id = uuid.uuid4().hex
+        created = time.time()
+        self._set_status(job_id, status="queued", created=created)
+        with self._lock:
+            self._events[job_id] = threading.Event()
+        try:
+            self._q.put_nowait((job_id, created, fn, args))
+        except queue.Full:
+            with self._lock: self._events.pop(job_id, None)
+            self._paths(job_id)[0].unlink(missing_ok=True)
+            raise QueueFull("report queue is full (%d pending)" % self.max_queue)
+        return job_id
+
+    def _run(self):
+        while True:
+            job_id, created, fn, args = self._q.get()
+            with self._lock: self._busy += 1
+            try:
+                self._set_status(job_id, status="running", created=created)
+                try:
+                    pdf = fn(*args)
+                except Exception as e:
+                    print("[jobs] %s failed: %s" % (job_id, e), file=sys.stderr)
+                    self._set_status(job_id, status="failed", created=created, error=str(e))
+                else:
+                    _write_atomic(self._paths(job_id)[1], pdf)
+                    self._set_status(job_id, status="done", created=created, finished=time.time(), size=len(pdf))
+            except Exception as e:
+                print("[jobs] %s: spool write failed: %s" % (job_id, e), file=sys.stderr)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    ev = self._events.pop(job_id, None)
+                if ev is not None: ev.set()
+
+    def status(self, job_id):
+        # None for unknown or expired jobs.
+        if not _JOB_ID.match(job_id or ""): return None
+        self._sweep()
+        status_p, _ = self._paths(job_id)
+        try:
+            st = json.loads(status_p.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if time.time() - st.get("finished", st["created"]) > self.ttl: return None
+        return st
+
+    def result_path(self, job_id):
+        return self._paths(job_id)[1]
+
+    def wait(self, job_id, timeout):
+        # Long-poll: returns the final status, or the current one when the timeout passes.
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._lock:
+            ev = self._events.get(job_id) if self._pid == os.getpid() else None
+        if ev is not None:
+            ev.wait(timeout)
+            return self.status(job_id)
+        # queued on another worker process: poll the spool
+        while True:
+            st = self.status(job_id)
+            if st is None or st["status"] in {"done", "failed"} or time.monotonic() >= deadline: return st
+            time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+
+    def stats(self):
+        with self._lock:
+            return {"queued": self._q.qsize() if self._q else 0, "running": self._busy,
+                    "workers": self.workers, "max_queue": self.max_queue}
+
+    def _sweeper(self):
+        while True:
+            time.sleep(SWEEP_EVERY)
+            self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < SWEEP_EVERY: return
+        self._last_sweep = now
+        try:
+            for p in self.spool.iterdir():
+                try:
+                    if now - p.stat().st_mtime > self.ttl: p.unlink()
+                except OSError:
+                    pass
+        except OSError as e:
+            print("[jobs] sweep failed: %s" % e, file=sys.stderr)
@@ -0,0 +1,259 @@
+"""Re-score saved records with the current (or a given) scoring model.
+
+    python rescore.py [--model scoring_model.json] [--macro-risk High] [--workers N]
+
+Reads the compacted archives, closed CSV segments and the live records.csv, in that order.
+Only rows whose scoring inputs or model version differ from the last run are scored. Each
+row's last result is kept in a SQLite state file, together with per-source checkpoints, so an
+interrupted run resumes where it stopped and a nightly run with an unchanged model only reads
+rows saved since the previous one. Rows whose score or category differs from the saved record
+go to a deltas CSV; category migrations are summarized on stderr (and --summary).
+"""
+import os, csv, io, sys, json, time, sqlite3, hashlib, argparse, datetime
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from scoring import SCORE_FIELDS, get_model, ModelRegistry
+from record_index import row_hash
+from applicant import parse_record, record_number, RECORD_COLUMNS
+from record_archive import ArchiveReader, closed_segments, archives
+from csv_export import snapshot
+
+ROOT_DIR = Path(__file__).resolve().parent
+DATA_DIR = Path(os.environ.get("DATA_DIR", ROOT_DIR / "data"))
+CHUNK_BYTES = 4 * 1024 * 1024
+LOOKUP_BATCH = 500
+
+# saved CSV column for each scoring input
+INPUT_COLUMNS = tuple(RECORD_COLUMNS.get(f, f) for f in SCORE_FIELDS)
+DELTA_HEADER = ["timestamp", "national_id", "full_name", "old_score", "new_score", "delta",
+                "old_category", "new_category", "old_model_version", "new_model_version"]
+
+def _int64(hexdigest):
+    # 63-bit key from a hex digest (SQLite INTEGER PRIMARY KEY)
+    return int(hexdigest[:16], 16) >> 1
+
+def input_hash(row, pos, overrides):
+    vals = [overrides.get(c, row[pos[c]] if c in pos else "") for c in INPUT_COLUMNS]
+    return _int64(hashlib.sha1("\x1f".join(vals).encode("utf-8")).hexdigest())
+
+# ---------- State: last result per row + per-source checkpoints ----------
+def open_state(path, readonly=False):
+    path = Path(path)
+    if readonly:
+        conn = sqlite3.connect("file:%s?mode=ro" % path, uri=True, timeout=30)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key INTEGER PRIMARY KEY, input_hash INTEGER, "
+                         "model_version TEXT, score INTEGER, category TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS progress (source TEXT PRIMARY KEY, kind TEXT, pos INTEGER, "
+                         "rows INTEGER, done INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+# ---------- Worker side (spawned processes) ----------
+_worker = {}
+
+def _init_worker(state_path, version, overrides):
+    _worker.update(state=open_state(state_path, readonly=True), version=version, overrides=overrides)
+
+def _rows_for(task):
+    kind, path = task["kind"], task["path"]
+    if kind == "csv":
+        with open(path, "rb") as f:
+            f.seek(task["start"])
+            data = f.read(task["end"] - task["start"])
+        return list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+    with ArchiveReader(path) as r:
+        b = task["block"]
+        cols = [r.text_column(b, c) for c in task["header"]]
+        return [list(t) for t in zip(*cols)]
+
+def _process(task):
+    header = task["header"]
+    pos = {c: i for i, c in enumerate(header)}
+    rows = [r for r in _rows_for(task) if len(r) >= len(header)]
+    if task.get("skip_rows"): rows = rows[task["skip_rows"]:]
+    version, overrides = _worker["version"], _worker["overrides"]
+    keyed = [(_int64(row_hash(r)), input_hash(r, pos, overrides), r) for r in rows]
+    seen = {}
+    for i in range(0, len(keyed), LOOKUP_BATCH):
+        part = [k for k, _, _ in keyed[i:i + LOOKUP_BATCH]]
+        q = "SELECT key, input_hash, model_version FROM results WHERE key IN (%s)" % ",".join("?" * len(part))
+        for k, ih, v in _worker["state"].execute(q, part): seen[k] = (ih, v)
+    model = get_model()
+    if model.version != version:
+        raise RuntimeError("scoring model changed during the run (%s -> %s)" % (version, model.version))
+    results, deltas, migrations, invalid = [], [], {}, 0
+    for key, ih, r in keyed:
+        if seen.get(key) == (ih, version): continue
+        rec = dict(zip(header, r))
+        rec.update(overrides)
+        fd, errors = parse_record(rec)
+        if errors:
+            invalid += 1  # counted in the summary, not scored
+            continue
+        old_score, old_cat = record_number(rec.get("score"), int), rec.get("category") or ""
+        score, category = model.score(fd)
+        results.append((key, ih, version, score, category))
+        pair = "%s -> %s" % (old_cat or "?", category)
+        migrations[pair] = migrations.get(pair, 0) + 1
+        if score != old_score or category != old_cat:
+            deltas.append([rec.get("timestamp", ""), rec.get("national_id", ""), rec.get("full_name", ""),
+                           old_score, score, score - old_score, old_cat, category, rec.get("model_version", ""), version])
+    return {"rows": len(rows), "results": results, "deltas": deltas, "migrations": migrations, "invalid": invalid}
+
+# ---------- Main side: sources, chunking, ordered commit ----------
+def _source_id(first_row):
+    # content-based, so a live file, its rotated segment and its archive share one checkpoint
+    return row_hash(first_row)
+
+def _csv_tasks(path, progress, live):
+    if live:
+        try:
+            _, size = snapshot(path)
+        except FileNotFoundError:
+            return
+    else:
+        size = path.stat().st_size
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]), None)
+        if not header: return
+        first = f.readline()
+        if not first: return
+        source = _source_id(next(csv.reader(io.StringIO(first.decode("utf-8"), newline=""))))
+        p = progress.get(source)
+        start = len(header_line)
+        if p is not None:
+            if p["done"] and not live: return
+            if p["kind"] == "csv": start = max(start, p["pos"])
+        while start < size:
+            end = _row_boundary(f, start, min(size, start + CHUNK_BYTES), size)
+            yield source, {"kind": "csv", "path": str(path), "start": start, "end": end, "header": header}, ("csv", end, 0)
+            start = end
+    # the live file keeps growing: its checkpoint stays a position, never "done"
+    yield source, None, ("csv", size, int(not live))
+
+def _row_boundary(f, start, want, size):
+    # Last newline before `want` that ends a row: the quote count since `start` must be even.
+    if want >= size: return size
+    f.seek(start)
+    data = f.read(want - start)
+    i = len(data)
+    while True:
+        i = data.rfind(b"\n", 0, i)
+        if i < 0:
+            # a single row longer than the chunk: extend
+            return _row_boundary(f, start, min(size, want + CHUNK_BYTES), size)
+        if data.count(b'"', 0, i) % 2 == 0: return start + i + 1
+
+def _archive_tasks(path, progress):
+    with ArchiveReader(path) as r:
+        if not r.rows: return
+        first = [r.text_column(0, c)[0] for c in r.columns]
+        source = _source_id(first)
+        p = progress.get(source)
+        if p is not None and p["done"]: return
+        done_rows = p["rows"] if p is not None else 0
+        row = 0
+        for b, blk in enumerate(r.blocks):
+            n = blk["rows"]
+            if p is not None and p["kind"] == "rca" and b < p["pos"]: row += n; continue
+            if row + n <= done_rows: row += n; continue
+            task = {"kind": "rca", "path": str(path), "block": b, "header": r.columns,
+                    "skip_rows": max(0, done_rows - row)}
+            row += n
+            yield source, task, ("rca", b + 1, 0)
+    yield source, None, ("rca", len(r.blocks), 1)
+
+def iter_tasks(csv_path, progress):
+    for p in archives(csv_path): yield from _archive_tasks(p, progress)
+    for p in closed_segments(csv_path): yield from _csv_tasks(p, progress, live=False)
+    yield from _csv_tasks(Path(csv_path), progress, live=True)
+
+def run(csv_path, state_path, deltas_path, model_path=None, overrides=None, workers=None, log=sys.stderr):
+    overrides = dict(overrides or {})
+    if model_path: os.environ["SCORING_MODEL"] = str(model_path)  # inherited by spawned workers
+    reg = ModelRegistry(model_path) if model_path else None
+    model = reg.current if reg else get_model()
+    if reg is not None and reg.last_error: raise ValueError(reg.last_error)
+    version = model.version
+    conn = open_state(state_path)
+    config = json.dumps({"model_version": version, "overrides": overrides}, sort_keys=True)
+    prev = conn.execute("SELECT value FROM meta WHERE name='config'").fetchone()
+    with conn:
+        if prev is None or prev[0] != config:
+            # different model or overrides: every row is compared again (and re-scored if changed)
+            conn.execute("DELETE FROM progress")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (config,))
+    progress = {s: {"kind": k, "pos": p, "rows": n, "done": d}
+                for s, k, p, n, d in conn.execute("SELECT source, kind, pos, rows, done FROM progress")}
+    totals = {"rows_read": 0, "rescored": 0, "changed": 0, "invalid": 0, "migrations": {}}
+    workers = workers or os.cpu_count() or 1
+    Path(deltas_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(deltas_path, "w", newline="", encoding="utf-8") as out, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(str(state_path), version, overrides)) as pool:
+        writer = csv.writer(out)
+        writer.writerow(DELTA_HEADER)
+        inflight = deque()
+        def commit(source, fut, mark):
+            res = fut.result() if fut is not None else None
+            kind, pos, done = mark
+            p = progress.setdefault(source, {"kind": kind, "pos": 0, "rows": 0, "done": 0})
+            if res is not None:
+                writer.writerows(res["deltas"])
+                out.flush()
+                p["rows"] += res["rows"]
+                totals["rows_read"] += res["rows"]
+                totals["rescored"] += len(res["results"])
+                totals["changed"] += len(res["deltas"])
+                totals["invalid"] += res["invalid"]
+                for k, n in res["migrations"].items(): totals["migrations"][k] = totals["migrations"].get(k, 0) + n
+            p["kind"], p["pos"], p["done"] = kind, pos, done
+            with conn:
+                if res is not None and res["results"]:
+                    conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", res["results"])
+                conn.execute("INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?)",
+                             (source, p["kind"], p["pos"], p["rows"], p["done"]))
+        for source, task, mark in iter_tasks(csv_path, progress):
+            fut = pool.submit(_process, task) if task is not None else None
+            inflight.append((source, fut, mark))
+            while len(inflight) > 2 * workers or (inflight and inflight[0][1] is None):
+                commit(*inflight.popleft())
+        while inflight:
+            commit(*inflight.popleft())
+    conn.close()
+    totals["model_version"] = version
+    return totals
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Re-score saved records incrementally.")
+    ap.add_argument("--csv", default=str(DATA_DIR / "records.csv"))
+    ap.add_argument("--state", default=str(DATA_DIR / "rescore" / "state.db"))
+    ap.add_argument("--out", help="deltas CSV (default data/rescore/deltas-<stamp>.csv)")
+    ap.add_argument("--summary", help="also write the JSON summary here")
+    ap.add_argument("--model", help="scoring model JSON (default: the app's current model)")
+    ap.add_argument("--macro-risk", help="score every row with this macroeconomic risk instead of the saved one")
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    args = ap.parse_args(argv)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    out = args.out or str(Path(args.state).parent / ("deltas-%s.csv" % stamp))
+    overrides = {"macroeconomic_risk": args.macro_risk} if args.macro_risk else {}
+    t0 = time.monotonic()
+    totals = run(args.csv, args.state, out, args.model, overrides, args.workers)
+    totals["seconds"] = round(time.monotonic() - t0, 2)
+    totals["deltas"] = out
+    text = json.dumps(totals, indent=2, sort_keys=True)
+    print(text, file=sys.stderr)
+    if args.summary: Path(args.summary).write_text(text + "\n", encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os, time, threading
+from collections import OrderedDict
+
+SCORE_CACHE_SIZE = int(os.environ.get("SCORE_CACHE_SIZE", "4096"))
+SCORE_CACHE_TTL = float(os.environ.get("SCORE_CACHE_TTL", "600"))
+
+# Raw inputs that determine the ratios and the score (fd keys, after parsing).
+SCORE_INPUTS = (
+    "total_credit_limit", "total_credit_balance", "on_time_payments", "total_payments",
+    "monthly_debt_payments", "gross_monthly_income",
+    "credit_utilization_ratio", "payment_history_score", "debt_to_income_ratio",
+    "open_credit_lines", "past_due_accounts", "length_credit_history_years", "recent_inquiries_12m",
+    "collateral_provided", "employment", "income_level", "macroeconomic_risk",
+)
+
+# ---------- Bounded LRU + TTL memo of scoring results ----------
+class ScoreCache:
+    def __init__(self, max_entries=SCORE_CACHE_SIZE, ttl=SCORE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = self.invalidations = 0
+
+    @staticmethod
+    def key(fd, model_version):
+        # Canonical: parsed values (so "1000" and "1000.0" match) plus the model version.
+        return (model_version,) + tuple(fd[k] for k in SCORE_INPUTS)
+
+    def get(self, key):
+        if self.max_entries <= 0: return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < now:
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_entries <= 0: return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, *_):
+        # also used as a model-registry listener: a new rule set invalidates everything
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._data), "max_entries": self.max_entries, "ttl_seconds": self.ttl,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else None,
+                    "evictions": self.evictions, "expired": self.expired, "invalidations": self.invalidations}
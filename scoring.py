@@ -0,0 +1,293 @@
+import os, sys, json, math, time, threading
+from pathlib import Path
+
+MODEL_PATH = Path(os.environ.get("SCORING_MODEL", Path(__file__).resolve().parent / "scoring_model.json"))
+MODEL_CHECK_SECONDS = float(os.environ.get("SCORING_MODEL_CHECK_SECONDS", "2"))
+MEMO_LIMIT = 4096
+
+# ---------- Scoring rule table (shared by scalar and batch paths) ----------
+# Built-in defaults; scoring_model.json normally supersedes them.
+BUILTIN_VERSION = "builtin"
+RULES = {
+    "base": 300,
+    "weights": {"payment_history": 185, "utilization": 165, "dti": 55},
+    # (min years, points), first match wins
+    "history_tiers": [(10, 80), (5, 55), (2, 35), (0, 15)],
+    "inquiries": {"per": 12, "cap": 60},
+    "past_due": {"per": 20, "cap": 80},
+    # (lo, hi, points), inclusive; hi None = open-ended; unmatched = 0
+    "open_lines": [(0, 0, -20), (1, 8, 20), (13, None, -10)],
+    "collateral": {"none_values": {"none", "n/a", "na"}, "points": 15},
+    "employment": {"values": {"self-employed", "contract", "informal"}, "points": -10},
+    # (substrings, points), first match wins
+    "income": [(("high", "upper", ">$", "above"), 10), (("low", "minimum", "<$"), -10)],
+    "macro": [(("high",), -25), (("medium",), -10)],
+    "bounds": (300, 850),
+    # (upper bound exclusive, category); last entry catches the rest
+    "categories": [(580, "Poor"), (670, "Fair"), (740, "Good"), (None, "Excellent")],
+}
+
+SCORE_FIELDS = (
+    "payment_history_score", "credit_utilization_ratio", "length_credit_history_years",
+    "recent_inquiries_12m", "debt_to_income_ratio", "past_due_accounts", "open_credit_lines",
+    "collateral_provided", "employment", "income_level", "macroeconomic_risk",
+)
+
+def _norm(s):
+    return (s or "").strip().lower()
+
+def history_points(years, rules=RULES):
+    for min_years, pts in rules["history_tiers"]:
+        if years >= min_years: return pts
+    return rules["history_tiers"][-1][1]
+
+def open_lines_points(lines, rules=RULES):
+    for lo, hi, pts in rules["open_lines"]:
+        if lines >= lo and (hi is None or lines <= hi): return pts
+    return 0
+
+def collateral_points(value, rules=RULES):
+    collat = _norm(value)
+    if collat and collat not in rules["collateral"]["none_values"]: return rules["collateral"]["points"]
+    return 0
+
+def employment_points(value, rules=RULES):
+    return rules["employment"]["points"] if _norm(value) in rules["employment"]["values"] else 0
+
+def _keyword_points(value, table):
+    value = _norm(value)
+    for keys, pts in table:
+        if any(k in value for k in keys): return pts
+    return 0
+
+def income_points(value, rules=RULES):
+    return _keyword_points(value, rules["income"])
+
+def macro_points(value, rules=RULES):
+    return _keyword_points(value, rules["macro"])
+
+def categorize(score, rules=RULES):
+    for upper, category in rules["categories"]:
+        if upper is None or score < upper: return category
+
+def evaluate_rules(data, rules=RULES):
+    # Reference interpreter over a rule table; CompiledModel.score must agree with it exactly.
+    w = rules["weights"]
+    score = rules["base"]
+    score += (data["payment_history_score"]/100.0)*w["payment_history"]
+    util_good = max(0.0, 100.0 - data["credit_utilization_ratio"])
+    score += (util_good/100.0)*w["utilization"]
+    score += history_points(data["length_credit_history_years"], rules)
+    inq = rules["inquiries"]
+    inquiries = max(0, data["recent_inquiries_12m"])
+    score += max(0, inq["cap"] - min(inq["cap"], inquiries*inq["per"]))
+    dti_good = max(0.0, 100.0 - data["debt_to_income_ratio"])
+    score += (dti_good/100.0)*w["dti"]
+    pd = rules["past_due"]
+    past_due = max(0, data["past_due_accounts"])
+    score -= min(pd["cap"], past_due*pd["per"])
+    score += open_lines_points(max(0, data["open_credit_lines"]), rules)
+    score += collateral_points(data["collateral_provided"], rules)
+    score += employment_points(data["employment"], rules)
+    score += income_points(data["income_level"], rules)
+    score += macro_points(data["macroeconomic_risk"], rules)
+    lo, hi = rules["bounds"]
+    score = int(max(lo, min(hi, round(score))))
+    return score, categorize(score, rules)
+
+def _num(v):
+    # a numeric leaf of the config: "185" is accepted, true/NaN/"abc" are not
+    if isinstance(v, bool): raise ValueError("not a number: %r" % v)
+    v = float(v)
+    if not math.isfinite(v): raise ValueError("not a finite number: %r" % v)
+    return v
+
+def rules_from_config(cfg):
+    # JSON config -> rule table in the RULES shape; raises ValueError on anything malformed.
+    try:
+        version = str(cfg["version"])
+        rules = {
+            "base": _num(cfg["base"]),
+            "weights": {k: _num(cfg["weights"][k]) for k in ("payment_history", "utilization", "dti")},
+            "history_tiers": sorted(((int(lo), _num(pts)) for lo, pts in cfg["history_tiers"]), reverse=True),
+            "inquiries": {"per": int(cfg["inquiries"]["per"]), "cap": int(cfg["inquiries"]["cap"])},
+            "past_due": {"per": int(cfg["past_due"]["per"]), "cap": int(cfg["past_due"]["cap"])},
+            "open_lines": [(int(lo), None if hi is None else int(hi), _num(pts)) for lo, hi, pts in cfg["open_lines"]],
+            "collateral": {"none_values": frozenset(v.lower() for v in cfg["collateral"]["none_values"]),
+                           "points": _num(cfg["collateral"]["points"])},
+            "employment": {"values": frozenset(v.lower() for v in cfg["employment"]["values"]),
+                           "points": _num(cfg["employment"]["points"])},
+            "income": [(tuple(k.lower() for k in keys), _num(pts)) for keys, pts in cfg["income"]],
+            "macro": [(tuple(k.lower() for k in keys), _num(pts)) for keys, pts in cfg["macro"]],
+            "bounds": (int(cfg["bounds"][0]), int(cfg["bounds"][1])),
+            "categories": [(None if up is None else int(up), str(name)) for up, name in cfg["categories"]],
+        }
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError("invalid scoring model: %r" % e)
+    if not rules["history_tiers"] or not rules["categories"] or rules["categories"][-1][0] is not None:
+        raise ValueError("invalid scoring model: history_tiers/categories incomplete")
+    if rules["bounds"][0] > rules["bounds"][1]:
+        raise ValueError("invalid scoring model: bounds")
+    return version, rules
+
+# ---------- Compiled evaluator ----------
+class CompiledModel:
+    """A rule table compiled into lookup tables and memoized keyword results.
+
+    Evaluation order matches evaluate_rules step for step, so scores are identical.
+    """
+    def __init__(self, rules, version):
+        self.rules = rules
+        self.version = version
+        self.base = rules["base"]
+        w = rules["weights"]
+        self.w_ph, self.w_util, self.w_dti = w["payment_history"], w["utilization"], w["dti"]
+        inq, pd = rules["inquiries"], rules["past_due"]
+        self._inq_fn = lambda n: max(0, inq["cap"] - min(inq["cap"], n*inq["per"]))
+        self._pd_fn = lambda n: min(pd["cap"], n*pd["per"])
+        # tables cover 0..saturation; anything beyond falls back to the formula
+        self._hist = tuple(history_points(y, rules) for y in range(max(lo for lo, _ in rules["history_tiers"]) + 1))
+        self._hist_floor = history_points(-1, rules)
+        self._inq = tuple(self._inq_fn(n) for n in range(_saturation(inq) + 1))
+        self._pd = tuple(self._pd_fn(n) for n in range(_saturation(pd) + 1))
+        top = max(max(lo, hi if hi is not None else lo) for lo, hi, _ in rules["open_lines"]) if rules["open_lines"] else 0
+        self._lines = tuple(open_lines_points(n, rules) for n in range(top + 2))
+        self.lo, self.hi = rules["bounds"]
+        self._cat = tuple(categorize(s, rules) for s in range(self.lo, self.hi + 1))
+        # raw field value -> points, so each distinct string is normalized and matched once
+        self._m_collat, self._m_emp, self._m_inc, self._m_macro = {}, {}, {}, {}
+
+    def _miss(self, memo, fn, raw):
+        pts = fn(raw, self.rules)
+        if len(memo) < MEMO_LIMIT: memo[raw] = pts
+        return pts
+
+    def score(self, data):
+        score = self.base
+        score += (data["payment_history_score"]/100.0)*self.w_ph
+        util_good = max(0.0, 100.0 - data["credit_utilization_ratio"])
+        score += (util_good/100.0)*self.w_util
+        years = data["length_credit_history_years"]
+        t = self._hist
+        if years.__class__ is int and years >= 0: score += t[years] if years < len(t) else t[-1]
+        elif years < 0: score += self._hist_floor
+        else: score += history_points(years, self.rules)
+        inquiries = max(0, data["recent_inquiries_12m"])
+        t = self._inq
+        score += t[inquiries] if inquiries.__class__ is int and inquiries < len(t) else self._inq_fn(inquiries)
+        dti_good = max(0.0, 100.0 - data["debt_to_income_ratio"])
+        score += (dti_good/100.0)*self.w_dti
+        past_due = max(0, data["past_due_accounts"])
+        t = self._pd
+        score -= t[past_due] if past_due.__class__ is int and past_due < len(t) else self._pd_fn(past_due)
+        lines = max(0, data["open_credit_lines"])
+        t = self._lines
+        score += t[lines] if lines.__class__ is int and lines < len(t) else open_lines_points(lines, self.rules)
+        v = data["collateral_provided"]; pts = self._m_collat.get(v)
+        score += pts if pts is not None else self._miss(self._m_collat, collateral_points, v)
+        v = data["employment"]; pts = self._m_emp.get(v)
+        score += pts if pts is not None else self._miss(self._m_emp, employment_points, v)
+        v = data["income_level"]; pts = self._m_inc.get(v)
+        score += pts if pts is not None else self._miss(self._m_inc, income_points, v)
+        v = data["macroeconomic_risk"]; pts = self._m_macro.get(v)
+        score += pts if pts is not None else self._miss(self._m_macro, macro_points, v)
+        score = int(max(self.lo, min(self.hi, round(score))))
+        return score, self._cat[score - self.lo]
+
+def _saturation(rule):
+    # smallest n at which n*per reaches cap (table length bound)
+    return -(-rule["cap"] // rule["per"]) if rule["per"] > 0 else 0
+
+# Scored by every model before it goes live: a typical applicant, an empty one and one past
+# every table's end.
+SAMPLE_RECORDS = (
+    {"payment_history_score": 92.5, "credit_utilization_ratio": 31.0, "length_credit_history_years": 6,
+     "recent_inquiries_12m": 2, "debt_to_income_ratio": 28.4, "past_due_accounts": 1, "open_credit_lines": 4,
+     "collateral_provided": "Vehicle", "employment": "Full-time", "income_level": "Medium", "macroeconomic_risk": "High"},
+    {"payment_history_score": 0.0, "credit_utilization_ratio": 0.0, "length_credit_history_years": 0,
+     "recent_inquiries_12m": 0, "debt_to_income_ratio": 0.0, "past_due_accounts": 0, "open_credit_lines": 0,
+     "collateral_provided": "", "employment": "", "income_level": "", "macroeconomic_risk": ""},
+    {"payment_history_score": 100.0, "credit_utilization_ratio": 250.0, "length_credit_history_years": 60,
+     "recent_inquiries_12m": 40, "debt_to_income_ratio": 400.0, "past_due_accounts": 30, "open_credit_lines": 90,
+     "collateral_provided": "None", "employment": "Informal", "income_level": "Low", "macroeconomic_risk": "Low"},
+)
+
+def check_model(model):
+    # Raises ValueError unless the model scores SAMPLE_RECORDS like the reference interpreter.
+    for data in SAMPLE_RECORDS:
+        try:
+            got = model.score(data)
+            want = evaluate_rules(data, model.rules)
+        except Exception as e:
+            raise ValueError("scoring model %s fails on a sample record: %r" % (model.version, e))
+        if got != want or not isinstance(got[0], int) or not isinstance(got[1], str):
+            raise ValueError("scoring model %s: sample scored %r, expected %r" % (model.version, got, want))
+
+# ---------- Model registry: versioned config file, hot-swapped on change ----------
+class ModelRegistry:
+    def __init__(self, path=MODEL_PATH, check_seconds=MODEL_CHECK_SECONDS):
+        self.path = Path(path)
+        self.check_seconds = check_seconds
+        self.current = CompiledModel(RULES, BUILTIN_VERSION)
+        self.loaded_at = None
+        self.last_error = None
+        self._sig = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.listeners = []  # callables(model) run after a swap
+        self.reload()
+
+    def get(self):
+        if time.monotonic() >= self._next_check and self._lock.acquire(blocking=False):
+            try:
+                self._next_check = time.monotonic() + self.check_seconds
+                self._reload_if_changed()
+            finally:
+                self._lock.release()
+        return self.current
+
+    def reload(self):
+        with self._lock:
+            self._sig = None
+            return self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return False
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if sig == self._sig: return False
+        self._sig = sig
+        try:
+            version, rules = rules_from_config(json.loads(self.path.read_text(encoding="utf-8")))
+            model = CompiledModel(rules, version)
+            check_model(model)
+        except (OSError, ValueError, ArithmeticError) as e:
+            # keep serving the previous model
+            self.last_error = str(e)
+            print("[model] failed to load %s: %s" % (self.path, e), file=sys.stderr)
+            return False
+        # In-flight requests keep the model object they already hold.
+        self.current = model
+        self.loaded_at = time.time()
+        self.last_error = None
+        print("[model] loaded scoring model %s from %s" % (version, self.path), file=sys.stderr)
+        for fn in self.listeners:
+            try:
+                fn(model)
+            except Exception as e:
+                print("[model] listener %r failed: %s" % (fn, e), file=sys.stderr)
+        return True
+
+    def info(self):
+        return {"version": self.current.version, "path": str(self.path), "loaded_at": self.loaded_at,
+                "last_error": self.last_error}
+
+registry = ModelRegistry()
+
+def get_model():
+    return registry.get()
+
+def calculate_credit_score(data):
+    return get_model().score(data)
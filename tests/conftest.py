@@ -0,0 +1,34 @@
+import os, sys, atexit, shutil, tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# app reads DATA_DIR and friends at import: point them at a throwaway directory first. Registered
+# before app is imported, so the removal runs after app's own exit hooks (store, metrics, analytics).
+DATA_DIR = tempfile.mkdtemp(prefix="credit-tests-")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+os.environ.update(DATA_DIR=DATA_DIR, REPORT_SPOOL_DIR=os.path.join(DATA_DIR, "spool"),
+                  METRICS_DIR=os.path.join(DATA_DIR, "metrics"))
+
+@pytest.fixture(scope="session")
+def client():
+    import app
+    return app.app.test_client()
+
+def form(**fields):
+    # a complete, valid form submission; fields override the defaults
+    data = {
+        "full_name": "Test Applicant", "dob": "1990-01-01", "national_id": "T-0001",
+        "current_address": "1 Test St", "phone_number": "555-0100", "employment": "Full-time",
+        "employer": "Acme", "income_level": "Medium", "total_credit_limit": "1000",
+        "total_credit_balance": "300", "on_time_payments": "58", "total_payments": "60",
+        "monthly_debt_payments": "500", "gross_monthly_income": "4000", "open_credit_lines": "4",
+        "past_due_accounts": "0", "length_credit_history": "6", "recent_inquiries": "1",
+        "collateral_provided": "Vehicle", "account_types": "Credit card", "macroeconomic_risk": "Medium",
+        "action": "score",
+    }
+    data.update(fields)
+    return data
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from app import _JsonRecords
+
+def parse(*chunks):
+    # feeds chunks the way api_score does: the last, empty read carries eof
+    parser = _JsonRecords()
+    out = []
+    for chunk in chunks:
+        out += parser.feed(chunk)
+    out += parser.feed("", eof=True)
+    return out
+
+def test_array_split_across_chunks():
+    assert parse('[{"a": 1}, {"a"', ': 2}', "]") == [{"a": 1}, {"a": 2}]
+
+def test_ndjson():
+    assert parse('{"a": 1}\n{"a": 2}\n', '{"a": 3}') == [{"a": 1}, {"a": 2}, {"a": 3}]
+
+def test_number_at_chunk_edge_waits_for_delimiter():
+    assert parse("[1", "2]") == [12]
+
+def test_whitespace_after_array():
+    assert parse("[{}] \n", "\t") == [{}]
+    assert parse("[]") == []
+
+@pytest.mark.parametrize("chunks, message", [
+    (("{bad",), "malformed JSON"),
+    (("[{}", "{}]"), "missing ','"),
+    (("[{},]",), "trailing ','"),
+    (("[,{}]",), "unexpected ','"),
+])
+def test_malformed(chunks, message):
+    with pytest.raises(ValueError, match=message):
+        parse(*chunks)
+
+@pytest.mark.parametrize("chunks, message", [
+    (("[{}",), "unterminated JSON array"),
+    (('[{"a": 1',), "malformed JSON"),
+    (('{"a": ',), "malformed JSON"),
+])
+def test_truncated(chunks, message):
+    with pytest.raises(ValueError, match=message):
+        parse(*chunks)
+
+@pytest.mark.parametrize("chunks", [("[{}]garbage",), ("[{}]", "[{}]"), ("[{}]\n", "x")])
+def test_data_after_closing_bracket(chunks):
+    with pytest.raises(ValueError, match="after the closing"):
+        parse(*chunks)
+
+@pytest.mark.parametrize("body", ["{bad", "[{}", "[{}]garbage", "[{}][{}]", "[{},]"])
+def test_endpoint_rejects_bad_body(client, body):
+    r = client.post("/api/score", data=body, content_type="application/json")
+    assert r.status_code == 400
+    assert "error" in r.get_json()
+
+def test_endpoint_scores_each_record(client):
+    body = json.dumps([{"national_id": "A", "payment_history_score": 90}, {"national_id": "B", "open_credit_lines": -1}])
+    r = client.post("/api/score", data=body, content_type="application/json")
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert [line["national_id"] for line in lines] == ["A", "B"]
+    assert isinstance(lines[0]["score"], int)
+    assert "open_credit_lines" in lines[1]["errors"]
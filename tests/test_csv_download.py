@@ -0,0 +1,47 @@
+from conftest import form
+
+def save(client, national_id):
+    r = client.post("/", data=form(national_id=national_id, action="save_csv"))
+    assert r.status_code == 200
+
+def test_range_requests_are_byte_exact(client):
+    save(client, "CSV-1")
+    full = client.get("/csv")
+    assert full.status_code == 200 and full.headers["Accept-Ranges"] == "bytes"
+    body = full.data
+    assert body.startswith(b"timestamp,")
+
+    part = client.get("/csv", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.data == body[10:20]
+    assert part.headers["Content-Range"] == "bytes 10-19/%d" % len(body)
+
+    tail = client.get("/csv", headers={"Range": "bytes=-5"})
+    assert tail.status_code == 206 and tail.data == body[-5:]
+
+    assert client.get("/csv", headers={"Range": "bytes=%d-" % (len(body) + 10)}).status_code == 416
+
+def test_etag_and_not_modified(client):
+    save(client, "CSV-2")
+    r = client.get("/csv")
+    etag = r.headers["ETag"]
+    assert client.get("/csv", headers={"If-None-Match": etag}).status_code == 304
+    # a filtered download is a different representation of the same file
+    filtered = client.get("/csv?category=Good")
+    assert filtered.headers["ETag"] != etag
+    assert client.get("/csv?category=Good", headers={"If-None-Match": filtered.headers["ETag"]}).status_code == 304
+
+    save(client, "CSV-3")
+    r = client.get("/csv", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+
+def test_stale_if_range_sends_the_whole_file(client):
+    save(client, "CSV-4")
+    etag = client.get("/csv").headers["ETag"]
+    save(client, "CSV-5")
+    r = client.get("/csv", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert r.status_code == 200 and len(r.data) > 10
+
+def test_invalid_bounds(client):
+    save(client, "CSV-6")
+    assert client.get("/csv?from=garbage").status_code == 400
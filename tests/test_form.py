@@ -0,0 +1,23 @@
+import app
+from conftest import ROOT_DIR, form
+
+def test_shipped_templates_match_the_fallbacks():
+    # ensure_templates writes the fallbacks when templates/ is missing; both must behave the same
+    assert (ROOT_DIR / "templates" / "form.html").read_text(encoding="utf-8").strip() == app.FALLBACK_FORM.strip()
+    assert (ROOT_DIR / "templates" / "result.html").read_text(encoding="utf-8").strip() == app.FALLBACK_RESULT.strip()
+
+def test_rejected_form_comes_back_filled_in(client):
+    r = client.post("/", data=form(full_name="Ada <Lovelace>", open_credit_lines="-2", recent_inquiries="1.5"))
+    assert r.status_code == 400
+    html = r.get_data(as_text=True)
+    assert '<div class="errors">' in html
+    assert "open_credit_lines" in html and "recent_inquiries" in html
+    assert 'value="Ada &lt;Lovelace&gt;"' in html
+    assert 'name="open_credit_lines"' in html and 'value="-2" class="invalid" aria-invalid="true"' in html
+    assert 'value="1.5" class="invalid"' in html
+    assert "<option selected>Full-time</option>" in html and 'value="Vehicle"' in html
+
+def test_valid_form_scores(client):
+    r = client.post("/", data=form())
+    assert r.status_code == 200
+    assert "errors" not in r.get_data(as_text=True)
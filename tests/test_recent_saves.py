@@ -0,0 +1,77 @@
+import pytest
+
+from recent_saves import RecentSaves, IdempotencyConflict, save_keys
+from conftest import form
+
+@pytest.fixture
+def saves(tmp_path):
+    r = RecentSaves(tmp_path / "recent.idx", window=600, slots=64)
+    yield r
+    r.close()
+
+def test_repeat_is_pending_until_confirmed(saves):
+    keys = save_keys("N1", ["row"])
+    assert saves.seen(keys, 1000.0) is None
+    assert saves.seen(keys, 1000.5) == -1000.0
+    saves.confirm(keys, 1000.0)
+    assert saves.seen(keys, 1001.0) == 1000.0
+
+def test_forget_lets_a_retry_write(saves):
+    keys = save_keys("N1", ["row"], "key-1")
+    assert saves.seen(keys, 1000.0) is None
+    saves.forget(keys, 1000.0)
+    assert saves.seen(keys, 1001.0) is None
+
+def test_entries_expire(saves):
+    keys = save_keys("N1", ["row"])
+    saves.seen(keys, 1000.0)
+    saves.confirm(keys, 1000.0)
+    assert saves.seen(keys, 1000.0 + 600) is None
+
+def test_idempotency_key_is_bound_to_its_content(saves):
+    saves.seen(save_keys("N1", ["row"], "key-1"), 1000.0)
+    with pytest.raises(IdempotencyConflict):
+        saves.seen(save_keys("N1", ["other row"], "key-1"), 1001.0)
+    # the same content under a new key is still a repeat
+    assert saves.seen(save_keys("N1", ["row"], "key-2"), 1002.0) == -1000.0
+
+def test_shared_between_instances(tmp_path):
+    a = RecentSaves(tmp_path / "recent.idx", window=600, slots=64)
+    b = RecentSaves(tmp_path / "recent.idx", window=600, slots=64)
+    keys = save_keys("N1", ["row"])
+    a.seen(keys, 1000.0)
+    a.confirm(keys, 1000.0)
+    assert b.seen(keys, 1001.0) == 1000.0
+    a.close(); b.close()
+
+def test_disabled_window(tmp_path):
+    r = RecentSaves(tmp_path / "recent.idx", window=0)
+    keys = save_keys("N1", ["row"])
+    assert r.seen(keys) is None and r.seen(keys) is None
+
+def test_form_save_is_acknowledged_once(client):
+    data = form(national_id="DEDUP-1", action="save_csv")
+    first = client.post("/", data=data)
+    again = client.post("/", data=data)
+    assert first.status_code == again.status_code == 200
+    assert "Saved to CSV" in first.get_data(as_text=True)
+    assert "Already saved" in again.get_data(as_text=True)
+
+def test_reused_idempotency_key_is_a_conflict(client):
+    headers = {"Idempotency-Key": "dedup-conflict"}
+    assert client.post("/", data=form(national_id="DEDUP-2", action="save_csv"), headers=headers).status_code == 200
+    r = client.post("/", data=form(national_id="DEDUP-2", full_name="Someone Else", action="save_csv"), headers=headers)
+    assert r.status_code == 409
+
+def test_failed_save_releases_its_keys(client, monkeypatch):
+    import app, record_store
+    store = app.get_store(app.CSV_PATH, app.CSV_HEADER)
+    monkeypatch.setattr(record_store, "RETRY_DELAY", 0)
+    def fail(rows): raise OSError("disk full")
+    data = form(national_id="DEDUP-3", action="save_csv")
+    with monkeypatch.context() as m:
+        m.setattr(store, "_write", fail)
+        assert client.post("/", data=data).status_code == 500
+        assert store.flush(timeout=5) is False  # reports the failed batch once
+    r = client.post("/", data=data)
+    assert r.status_code == 200 and "Saved to CSV" in r.get_data(as_text=True)
@@ -0,0 +1,75 @@
+import csv
+
+import pytest
+
+from record_store import CSV_HEADER
+from record_archive import ArchiveReader, write_archive, compact, history, iter_history
+
+def make_rows(n):
+    rows = []
+    for i in range(n):
+        row = dict.fromkeys(CSV_HEADER, "")
+        row.update(timestamp="2025-01-%02dT10:00:%02d" % (1 + i % 28, i % 60), full_name="Name %d, Jr." % i,
+                   national_id="N%04d" % i, employment=("Full-time", "Contract", "")[i % 3],
+                   credit_utilization_ratio_pct="%.1f" % (i % 100), payment_history_score_pct="97.5",
+                   debt_to_income_ratio_pct="12.3", open_credit_lines=str(i % 9), past_due_accounts="0",
+                   length_credit_history_years="6", recent_inquiries_12m="1", score=str(500 + i * 3),
+                   category=("Poor", "Fair", "Good")[i % 3], model_version="2025.08.1")
+        rows.append([row[c] for c in CSV_HEADER])
+    return rows
+
+def test_round_trip_is_exact(tmp_path):
+    rows = make_rows(50)
+    # values that do not fit the typed encodings fall back to text within their block
+    rows[3][CSV_HEADER.index("score")] = "007"
+    rows[4][CSV_HEADER.index("timestamp")] = "2025-01-05 10:00:00"
+    rows[5][CSV_HEADER.index("credit_utilization_ratio_pct")] = "31.25"
+    rows[6][CSV_HEADER.index("current_address")] = 'quote " comma , newline \n é'
+    path = tmp_path / "records.20250101T000000.rca"
+    assert write_archive(rows, CSV_HEADER, path, block_rows=16) == 50
+    with ArchiveReader(path) as r:
+        assert r.rows == 50 and len(r.blocks) == 4
+        assert list(r.iter_rows()) == rows
+
+@pytest.fixture
+def archive(tmp_path):
+    rows = make_rows(60)
+    path = tmp_path / "records.20250101T000000.rca"
+    write_archive(rows, CSV_HEADER, path, block_rows=16)
+    with ArchiveReader(path) as r:
+        yield rows, r
+
+def col(name):
+    return CSV_HEADER.index(name)
+
+def test_time_filter(archive):
+    rows, r = archive
+    want = [row for row in rows if "2025-01-10" <= row[col("timestamp")] < "2025-01-20"]
+    assert list(r.iter_rows(since="2025-01-10", until="2025-01-20")) == want
+    # bounds take the same forms as /csv: a month prefix, an offset converted to UTC
+    assert list(r.iter_rows(since="2025-01-10T12:00:00+02:00", until="2025-01-20")) == want
+    assert list(r.iter_rows(since="2025-02")) == []
+
+def test_score_category_and_column_filters(archive):
+    rows, r = archive
+    got = list(r.iter_rows(["national_id", "score"], min_score=560, max_score=600, categories={"Fair"}))
+    want = [[row[col("national_id")], row[col("score")]] for row in rows
+            if 560 <= int(row[col("score")]) <= 600 and row[col("category")] == "Fair"]
+    assert got == want and want
+
+def test_score_filter_skips_blocks(archive):
+    _, r = archive
+    assert list(r.block_ids(min_score=500 + 48 * 3)) == [3]
+
+def test_compact_and_history(tmp_path):
+    live = tmp_path / "records.csv"
+    old, mid, new = make_rows(30)[:10], make_rows(30)[10:20], make_rows(30)[20:]
+    for name, rows in (("records.20250101T000000.csv", old), ("records.20250102T000000.csv", mid), ("records.csv", new)):
+        with open(tmp_path / name, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows([CSV_HEADER] + rows)
+    done = compact(live, block_rows=4)
+    assert [(seg, n) for seg, _, n in done] == [("records.20250101T000000.csv", 10), ("records.20250102T000000.csv", 10)]
+    assert [p.name for p in history(live)] == ["records.20250101T000000.rca", "records.20250102T000000.rca"]
+    assert list(iter_history(live, CSV_HEADER)) == old + mid + new
+    only = list(iter_history(live, ["national_id"], categories={"Good"}))
+    assert only == [[row[col("national_id")]] for row in old + mid + new if row[col("category")] == "Good"]
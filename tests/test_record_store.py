@@ -0,0 +1,89 @@
+import csv, os, threading
+
+import pytest
+
+import record_store
+from record_store import RecordStore
+
+HEADER = ["timestamp", "national_id", "score"]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(record_store, "RETRY_DELAY", 0)
+    s = RecordStore(tmp_path / "records.csv", HEADER, fsync=False)
+    yield s
+    s.close(timeout=5)
+
+def rows_of(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def test_rows_are_durable_when_the_future_resolves(store):
+    futs = [store.append(["2025-01-01T00:00:00", "N%d" % i, "600"]) for i in range(5)]
+    assert [f.result(5) for f in futs] == [None] * 5
+    assert rows_of(store.path) == [HEADER] + [["2025-01-01T00:00:00", "N%d" % i, "600"] for i in range(5)]
+
+def test_failed_write_fails_the_future_and_the_next_flush(store, monkeypatch):
+    calls = []
+    def fail(rows):
+        calls.append(rows)
+        raise OSError("disk full")
+    monkeypatch.setattr(store, "_write", fail)
+    fut = store.append(["t", "N1", "600"])
+    with pytest.raises(OSError, match="disk full"):
+        fut.result(5)
+    assert len(calls) == record_store.WRITE_ATTEMPTS
+    assert store.flush(timeout=5) is False
+    assert store.flush(timeout=5) is True  # reported once
+
+def test_torn_write_is_cut_back_before_the_retry(store, monkeypatch):
+    store.append(["t", "N0", "600"]).result(5)
+    real = record_store._write_all
+    def torn(fd, data):
+        monkeypatch.setattr(record_store, "_write_all", real)
+        os.write(fd, data[: len(data) // 2])
+        raise OSError("short write")
+    monkeypatch.setattr(record_store, "_write_all", torn)
+    store.append(["t", "N1", "600"]).result(5)
+    assert rows_of(store.path) == [HEADER, ["t", "N0", "600"], ["t", "N1", "600"]]
+
+def test_flush_times_out_while_the_writer_is_blocked(store, monkeypatch):
+    release = threading.Event()
+    real = store._write
+    def blocked(rows):
+        release.wait(5)
+        real(rows)
+    monkeypatch.setattr(store, "_write", blocked)
+    first = store.append(["t", "N1", "600"])
+    assert store.flush(timeout=0.05) is False
+    assert not first.done()
+    release.set()
+    assert first.result(5) is None
+    assert store.flush(timeout=5) is True
+
+def test_cancelled_save_is_not_written(store, monkeypatch):
+    release = threading.Event()
+    real = store._write
+    def blocked(rows):
+        release.wait(5)
+        real(rows)
+    monkeypatch.setattr(store, "_write", blocked)
+    first = store.append(["t", "N1", "600"])
+    second = store.append(["t", "N2", "600"])
+    assert second.cancel()
+    release.set()
+    first.result(5)
+    assert store.flush(timeout=5) is True
+    assert [r[1] for r in rows_of(store.path)[1:]] == ["N1"]
+
+def test_listeners_see_each_committed_batch(store):
+    seen = []
+    store.listeners.append(seen.extend)
+    store.append(["t", "N1", "600"]).result(5)
+    assert store.flush(timeout=5) is True  # waits for the listeners too
+    assert seen == [["t", "N1", "600"]]
+
+def test_append_after_close(store):
+    store.close(timeout=5)
+    with pytest.raises(RuntimeError):
+        store.append(["t", "N1", "600"])
@@ -0,0 +1,33 @@
+import io, zipfile
+
+import report_batch
+
+def fake_render(rows, pages_per_file=1, generated=None):
+    # stands in for the process pool: one small entry per chunk
+    for n, chunk in enumerate(report_batch._chunks(rows, pages_per_file), 1):
+        yield "%06d.pdf" % n, b"%PDF-" + str(len(chunk)).encode()
+
+def test_zip64_past_65535_entries(monkeypatch):
+    monkeypatch.setattr(report_batch, "render_parallel", fake_render)
+    n = 0xFFFF + 10
+    data = b"".join(report_batch.stream_zip(({"national_id": str(i)} for i in range(n))))
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        names = z.namelist()
+        assert len(names) == n
+        assert names[-1] == "%06d.pdf" % n
+        assert z.read(names[-1]) == b"%PDF-1"
+        assert z.testzip() is None
+
+def test_small_zip_has_no_zip64_records(monkeypatch):
+    monkeypatch.setattr(report_batch, "render_parallel", fake_render)
+    data = b"".join(report_batch.stream_zip([{"national_id": "A"}, {"national_id": "B"}, {"national_id": "C"}], 2))
+    assert b"PK\x06\x06" not in data
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert [z.read(name) for name in z.namelist()] == [b"%PDF-2", b"%PDF-1"]
+
+def test_large_pdf_selection_is_answered_with_a_zip(monkeypatch):
+    monkeypatch.setattr(report_batch, "render_parallel", fake_render)
+    fmt, body = report_batch.batch_report(iter([{"national_id": str(i)} for i in range(5)]), "pdf", max_pages=3)
+    assert fmt == "zip"
+    with zipfile.ZipFile(io.BytesIO(b"".join(body))) as z:
+        assert len(z.namelist()) == 5
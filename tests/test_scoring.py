@@ -0,0 +1,40 @@
+import json, random
+
+import pytest
+
+from scoring import RULES, MODEL_PATH, SAMPLE_RECORDS, CompiledModel, evaluate_rules, rules_from_config
+
+def random_records(n, seed=7):
+    rnd = random.Random(seed)
+    words = ["", " ", "None", "n/a", "Vehicle", "Full-time", "self-employed", " Contract ", "Informal",
+             "High", "upper middle", ">$100k", "Low", "minimum wage", "<$20k", "Medium", "MEDIUM risk", "é"]
+    def count():
+        # table hits, saturation edges, negatives and floats (the compiled model falls back to the formula)
+        return rnd.choice([0, 1, 2, 5, 9, 12, 13, 40, 10**6, -1, -3, 2.5, 7.0, rnd.randint(0, 100)])
+    def pct():
+        return rnd.choice([0.0, 100.0, 250.0, -5.0, 33.3, round(rnd.uniform(0, 120), 1), rnd.uniform(0, 100)])
+    for _ in range(n):
+        yield {"payment_history_score": pct(), "credit_utilization_ratio": pct(), "debt_to_income_ratio": pct(),
+               "length_credit_history_years": count(), "recent_inquiries_12m": count(),
+               "past_due_accounts": count(), "open_credit_lines": count(),
+               "collateral_provided": rnd.choice(words), "employment": rnd.choice(words),
+               "income_level": rnd.choice(words), "macroeconomic_risk": rnd.choice(words)}
+
+def shipped_rules():
+    return rules_from_config(json.loads(MODEL_PATH.read_text(encoding="utf-8")))
+
+@pytest.mark.parametrize("load", [lambda: ("builtin", RULES), shipped_rules], ids=["builtin", "scoring_model.json"])
+def test_compiled_model_matches_the_rule_interpreter(load):
+    version, rules = load()
+    model = CompiledModel(rules, version)
+    for data in list(SAMPLE_RECORDS) + list(random_records(20000)):
+        got = model.score(data)
+        assert got == evaluate_rules(data, rules), data
+        assert got[0].__class__ is int
+
+def test_memoized_keywords_stay_exact():
+    version, rules = shipped_rules()
+    model = CompiledModel(rules, version)
+    records = list(random_records(500, seed=11))
+    first = [model.score(r) for r in records]
+    assert [model.score(r) for r in records] == first == [evaluate_rules(r, rules) for r in records]